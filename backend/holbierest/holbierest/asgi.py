@@ -12,5 +12,7 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'holbierest.settings')
+# Serve the public catalog and review reads from async views, see REST_API_ASYNC_READS in settings
+os.environ.setdefault('REST_API_ASYNC_READS', '1')
 
 application = get_asgi_application()
@@ -10,8 +10,11 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.1/ref/settings/
 """
 
+import os
 from pathlib import Path
 
+from corsheaders.defaults import default_headers
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -30,6 +33,7 @@ ALLOWED_HOSTS = []
 CORS_ALLOWED_ORIGINS = [
     "http://localhost:5173",  # Replace with your frontend URL
 ]
+CORS_ALLOW_HEADERS = (*default_headers, 'idempotency-key')
 
 
 # Application definition
@@ -50,6 +54,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'rest_api.middleware.RequestProfilingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -61,6 +66,55 @@ MIDDLEWARE = [
     'django.middleware.common.CommonMiddleware'
 ]
 
+# Per-request profiling (Server-Timing header and sampled log lines), off by default.
+# The middleware sits first in MIDDLEWARE so its total covers the whole stack.
+REQUEST_PROFILING = {
+    'ENABLED': os.environ.get('REQUEST_PROFILING', '') == '1',
+    'SAMPLE_RATE': 0.01,
+    'SLOW_REQUEST_MS': 500,
+    'SLOWEST_QUERIES': 3,
+}
+
+# Order status streaming (/api/orders/events). The in-process broker only reaches streams
+# served by the same process; with several workers use the SQLite file broker instead:
+# 'BROKER': 'rest_api.events.SQLiteBroker', 'OPTIONS': {'path': BASE_DIR / 'order-events.sqlite3'}
+ORDER_EVENTS = {
+    'BROKER': 'rest_api.events.InProcessBroker',
+    'OPTIONS': {},
+    'KEEPALIVE_SECONDS': 15,
+}
+
+# Anonymous GETs of categories, menu items and reviews handled by async views (rest_api.async_reads)
+# when served over ASGI. holbierest/asgi.py turns this on unless the variable is set to something else.
+REST_API_ASYNC_READS = os.environ.get('REST_API_ASYNC_READS', '') == '1'
+
+# Resolved API tokens, kept per process (LOCAL_SIZE tokens) and in the shared cache.
+# Entries are dropped in every worker on logout and whenever the user row changes.
+TOKEN_CACHE = {
+    'TIMEOUT': 300,
+    'LOCAL_SIZE': 1024,
+}
+
+# Finished orders older than this are moved to the archive tables by the archive_orders command
+ORDER_ARCHIVE = {
+    'AFTER_DAYS': 90,
+}
+
+# Idempotency-Key handling for checkout and cart POSTs: responses are replayed to retries for
+# TTL_SECONDS, and a retry waits up to WAIT_SECONDS for the first request to finish. A request
+# still unfinished after LEASE_SECONDS is taken to have died, and a retry may run it again.
+IDEMPOTENCY = {
+    'TTL_SECONDS': 24 * 60 * 60,
+    'LEASE_SECONDS': 60,
+    'WAIT_SECONDS': 10,
+    'PURGE_INTERVAL_SECONDS': 60,
+}
+
+# Token buckets of the throttles, in a file shared by every worker on the host
+THROTTLE_STORE = {
+    'PATH': os.environ.get('THROTTLE_STORE_PATH', BASE_DIR / 'throttle.sqlite3'),
+}
+
 ROOT_URLCONF = 'holbierest.urls'
 
 TEMPLATES = [
@@ -89,9 +143,33 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'OPTIONS': {
+            # Take the write lock when a transaction starts, so concurrent checkouts wait
+            # for it instead of failing with "database is locked" when upgrading a read
+            'transaction_mode': 'IMMEDIATE',
+            'timeout': 20,
+        },
+    }
+}
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.1/topics/cache/
+# Holds the catalog, site settings, role and token versions and the rendered menu pages.
+# It is a file every worker on the host shares, so a write in one worker invalidates
+# all of them. Workers on several hosts need a networked backend such as Redis.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'rest_api.caching.SQLiteCache',
+        'LOCATION': os.environ.get('CACHE_PATH', BASE_DIR / 'cache.sqlite3'),
+        'OPTIONS': {'MAX_ENTRIES': 10000},
     }
 }
 
+# Runs the tests with the cache and throttle files in a temporary directory
+TEST_RUNNER = 'rest_api.testing.TestRunner'
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
@@ -132,6 +210,10 @@ STATIC_URL = 'static/'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Menu image thumbnails/WebP variants are built in a process pool of this size
+MENU_IMAGE_WORKERS = 2
+MENU_IMAGE_ASYNC = True
+
 AUTH_USER_MODEL = 'rest_api.CustomUser'
 
 # Default primary key field type
@@ -141,7 +223,7 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES':(
-        'rest_framework.authentication.TokenAuthentication',
+        'rest_api.authentication.CachedTokenAuthentication',
         'rest_framework.authentication.SessionAuthentication',
     ),
     'DEFAULT_FILTER_BACKENDS': [
@@ -154,13 +236,16 @@ REST_FRAMEWORK = {
     'PAGE_SIZE': 6,
 
     'DEFAULT_THROTTLE_CLASSES': [
-        'rest_framework.throttling.AnonRateThrottle',
-        'rest_framework.throttling.UserRateThrottle'
+        'rest_api.throttling.SharedAnonRateThrottle',
+        'rest_api.throttling.SharedUserRateThrottle',
+        'rest_api.throttling.SharedScopedRateThrottle',
     ],
     
     'DEFAULT_THROTTLE_RATES': {
         'anon': '1000/minute',
-        'user': '2000/minute'
+        'user': '2000/minute',
+        'checkout': '30/minute',  # POST /api/orders, per user
+        'menu': '600/minute',  # Category and menu item reads, per user or IP
     },
 }
 
@@ -171,4 +256,15 @@ DJOSER = {
         'current_user': 'rest_api.serializers.CustomUserSerializer',
     },
     
-}
\ No newline at end of file
+}
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'rest_api': {'handlers': ['console'], 'level': 'INFO'},
+    },
+}
@@ -0,0 +1,164 @@
+from collections import defaultdict
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import Case, DecimalField, F, IntegerField, Sum, Value, When, Window
+from django.db.models.functions import RowNumber
+from django.utils import timezone
+
+from .money import cents
+from .models import ArchivedOrder, ArchivedOrderItem, Category, DailyItemSales, DailySales, MenuItem, Order, OrderItem
+
+PERIODS = ('day', 'week', 'month')
+
+
+def period_start(date, period):
+    if period == 'week':
+        return date - timedelta(days=date.weekday())
+    if period == 'month':
+        return date.replace(day=1)
+    return date
+
+
+def _periods(day):
+    return {'date': day, 'week': period_start(day, 'week'), 'month': period_start(day, 'month')}
+
+
+def _apply(day, total, lines, sign):
+    if not DailySales.objects.filter(date=day).update(
+            order_count=F('order_count') + sign, revenue=F('revenue') + sign * total) and sign > 0:
+        DailySales.objects.create(**_periods(day), order_count=1, revenue=total)
+
+    existing = set(DailyItemSales.objects.filter(date=day, menuitem_id__in=lines)
+                   .values_list('menuitem_id', flat=True))
+    if existing:
+        quantity = Case(*[When(menuitem_id=i, then=Value(sign * lines[i][1])) for i in existing],
+                        output_field=IntegerField())
+        revenue = Case(*[When(menuitem_id=i, then=Value(sign * lines[i][2])) for i in existing],
+                       output_field=DecimalField(max_digits=12, decimal_places=2))
+        DailyItemSales.objects.filter(date=day, menuitem_id__in=existing).update(
+            quantity=F('quantity') + quantity, revenue=F('revenue') + revenue)
+    if sign > 0:
+        DailyItemSales.objects.bulk_create([
+            DailyItemSales(**_periods(day), menuitem_id=menuitem_id, category_id=category_id,
+                           quantity=quantity, revenue=revenue)
+            for menuitem_id, (category_id, quantity, revenue) in lines.items() if menuitem_id not in existing
+        ])
+
+
+def record_order(date, total, items, sign=1, attempts=3):
+    """
+    Adds an order to the daily rollups, or takes it out again with sign=-1
+    (e.g. when it is cancelled). items are (menuitem_id, quantity, price)
+    rows. Call it inside the transaction that creates or changes the order.
+    """
+    day = timezone.localdate(date)
+    categories = dict(MenuItem.objects.filter(pk__in=[row[0] for row in items]).values_list('id', 'category_id'))
+    lines = {menuitem_id: (categories[menuitem_id], quantity, price)
+             for menuitem_id, quantity, price in items if menuitem_id in categories}
+    for attempt in range(attempts):
+        try:
+            with transaction.atomic():
+                return _apply(day, total, lines, sign)
+        except IntegrityError:
+            # A concurrent checkout created the same day's rows first
+            if attempt == attempts - 1:
+                raise
+
+
+def rebuild_sales_rollups(chunk_size=1000, stdout=None):
+    """
+    Recomputes the rollups from the order history, reading orders and their
+    items chunk by chunk. Returns the number of day and item rows written.
+    """
+    days = defaultdict(lambda: [0, Decimal(0)])
+    lines = {}
+    # Archived orders still count towards their day
+    for order_model, item_model in ((Order, OrderItem), (ArchivedOrder, ArchivedOrderItem)):
+        last_id = 0
+        while True:
+            orders = list(order_model.objects.exclude(status='CANCELLED').filter(id__gt=last_id)
+                          .order_by('id').values_list('id', 'date', 'total')[:chunk_size])
+            if not orders:
+                break
+            last_id = orders[-1][0]
+            order_days = {}
+            for order_id, date, total in orders:
+                order_days[order_id] = day = timezone.localdate(date)
+                days[day][0] += 1
+                days[day][1] += total
+            items = item_model.objects.filter(order_id__in=order_days).values_list(
+                'order_id', 'menuitem_id', 'menuitem__category_id', 'quantity', 'price')
+            for order_id, menuitem_id, category_id, quantity, price in items:
+                line = lines.setdefault((order_days[order_id], menuitem_id), [category_id, 0, Decimal(0)])
+                line[1] += quantity
+                line[2] += price
+            if stdout:
+                stdout.write(f'Read {order_model._meta.verbose_name_plural} up to id {last_id}\n')
+
+    DailySales.objects.all().delete()
+    DailyItemSales.objects.all().delete()
+    DailySales.objects.bulk_create(
+        (DailySales(**_periods(day), order_count=count, revenue=revenue) for day, (count, revenue) in days.items()),
+        batch_size=chunk_size)
+    DailyItemSales.objects.bulk_create(
+        (DailyItemSales(**_periods(day), menuitem_id=menuitem_id, category_id=category_id,
+                        quantity=quantity, revenue=revenue)
+         for (day, menuitem_id), (category_id, quantity, revenue) in lines.items()),
+        batch_size=chunk_size)
+    return len(days), len(lines)
+
+
+def _top(sold, bucket, key, model, top):
+    # Ranked per bucket inside the database, so only the top rows come back
+    rank = Window(RowNumber(), partition_by=[F(bucket)],
+                  order_by=[F('revenue').desc(), F('quantity').desc(), F(key).asc()])
+    rows = list(sold.values(bucket, key).annotate(quantity=Sum('quantity'), revenue=Sum('revenue'))
+                .annotate(rank=rank).filter(rank__lte=top).values_list(bucket, key, 'quantity', 'revenue'))
+    titles = dict(model.objects.filter(pk__in={row[1] for row in rows}).values_list('id', 'title'))
+    ranked = defaultdict(list)
+    for start, pk, quantity, revenue in sorted(rows, key=lambda row: (row[0], -row[3], -row[2], row[1])):
+        ranked[start].append({'id': pk, 'title': titles.get(pk), 'quantity': quantity, 'revenue': cents(revenue)})
+    return ranked
+
+
+def sales_report(period, date_from, date_to, top=5):
+    """
+    Revenue, order count, average ticket and the top menu items and
+    categories per day, week or month between date_from and date_to, read
+    from the daily rollups.
+    """
+    bucket = 'date' if period == 'day' else period
+    date_from = period_start(date_from, period)
+    days = DailySales.objects.filter(date__range=(date_from, date_to))
+    sold = DailyItemSales.objects.filter(date__range=(date_from, date_to))
+
+    totals = (days.values(bucket).annotate(orders=Sum('order_count'), revenue=Sum('revenue'))
+              .order_by(bucket).values_list(bucket, 'orders', 'revenue'))
+    items = _top(sold, bucket, 'menuitem_id', MenuItem, top)
+    categories = _top(sold, bucket, 'category_id', Category, top)
+
+    periods = []
+    all_orders, all_revenue = 0, Decimal(0)
+    for start, orders, revenue in totals:
+        revenue = cents(revenue)
+        all_orders += orders
+        all_revenue += revenue
+        periods.append({
+            'start': start,
+            'orders': orders,
+            'revenue': revenue,
+            'average_ticket': cents(revenue / orders) if orders else Decimal('0.00'),
+            'top_menu_items': items.get(start, []),
+            'top_categories': categories.get(start, []),
+        })
+    return {
+        'period': period,
+        'date_from': date_from,
+        'date_to': date_to,
+        'orders': all_orders,
+        'revenue': all_revenue,
+        'average_ticket': cents(all_revenue / all_orders) if all_orders else Decimal('0.00'),
+        'periods': periods,
+    }
@@ -0,0 +1,127 @@
+import datetime
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Max, Prefetch, Value
+from django.utils import timezone
+
+from .models import ArchivedOrder, ArchivedOrderItem, Order, OrderItem
+
+# Orders that won't change any more
+FINISHED_STATUSES = ('DELIVERED', 'CANCELLED')
+
+ORDER_FIELDS = ('id', 'user_id', 'delivery_crew_id', 'status', 'total', 'date')
+ARCHIVED_PREFETCH = (
+    'user__groups',
+    Prefetch('order', queryset=ArchivedOrderItem.objects.select_related('menuitem')),
+)
+
+
+def archive_after_days():
+    return getattr(settings, 'ORDER_ARCHIVE', {}).get('AFTER_DAYS', 90)
+
+
+def archive_orders(older_than, chunk_size=500, stdout=None):
+    """
+    Moves finished orders placed before older_than, with their items, into
+    the archive tables, chunk_size orders per transaction so the hot tables
+    are never locked for long. Returns the number of orders moved.
+    """
+    moved = 0
+    while True:
+        with transaction.atomic():
+            orders = list(Order.objects.select_for_update()
+                          .filter(status__in=FINISHED_STATUSES, date__lt=older_than)
+                          .order_by('id').values_list(*ORDER_FIELDS)[:chunk_size])
+            if not orders:
+                break
+            ids = [row[0] for row in orders]
+            ArchivedOrder.objects.bulk_create(ArchivedOrder(**dict(zip(ORDER_FIELDS, row))) for row in orders)
+            ArchivedOrderItem.objects.bulk_create(
+                ArchivedOrderItem(order_id=order_id, menuitem_id=menuitem_id, quantity=quantity, price=price)
+                for order_id, menuitem_id, quantity, price in OrderItem.objects.filter(order_id__in=ids)
+                .values_list('order_id', 'menuitem_id', 'quantity', 'price'))
+            OrderItem.objects.filter(order_id__in=ids).delete()
+            Order.objects.filter(pk__in=ids).delete()
+        moved += len(ids)
+        if stdout:
+            stdout.write(f'Archived orders up to id {ids[-1]}\n')
+    return moved
+
+
+def archive_horizon():
+    """The date of the newest archived order, None while nothing is archived."""
+    return ArchivedOrder.objects.aggregate(newest=Max('date'))['newest']
+
+
+class OrderHistory:
+    """
+    Hot and archived orders as one list for the paginators: ordering and
+    filters apply to both tables, a slice pages over the union of their ids
+    and ordering columns and then loads just that page's orders from each
+    table.
+    """
+    model = Order
+    ordered = True
+
+    def __init__(self, orders, archived, ordering=('-date', '-id')):
+        self.orders = orders
+        self.archived = archived
+        self.ordering = tuple(ordering)
+
+    def order_by(self, *ordering):
+        return OrderHistory(self.orders, self.archived, ordering)
+
+    def filter(self, *args, **kwargs):
+        return OrderHistory(self.orders.filter(*args, **kwargs), self.archived.filter(*args, **kwargs), self.ordering)
+
+    def count(self):
+        # An order is in exactly one of the tables
+        return self.orders.count() + self.archived.count()
+
+    def __getitem__(self, page):
+        if not isinstance(page, slice):
+            return self[page:page + 1][0]
+        # SQLite allows no ORDER BY or prefetching in the parts of a compound select
+        hot_keys = self.orders.order_by().prefetch_related(None).annotate(archived=Value(False))
+        archived_keys = self.archived.order_by().prefetch_related(None).annotate(archived=Value(True))
+        # The ORDER BY of a compound select can only name its columns, so every ordering field is selected
+        fields = list(dict.fromkeys(['id', *(field.lstrip('-') for field in self.ordering), 'archived']))
+        keys = list(hot_keys.values_list(*fields)
+                    .union(archived_keys.values_list(*fields), all=True)
+                    .order_by(*self.ordering)[page])
+        hot = self.orders.in_bulk([key[0] for key in keys if not key[-1]])
+        archived = self.archived.in_bulk([key[0] for key in keys if key[-1]])
+        return [archived[key[0]] if key[-1] else hot[key[0]] for key in keys]
+
+    def __iter__(self):
+        return iter(self[:])
+
+    def __len__(self):
+        return self.count()
+
+
+def order_history(orders, archived, date_from, date_to):
+    """
+    Orders placed from date_from through date_to (local dates, either may be
+    None for an open end). The archive is only read when the range reaches
+    back to the newest archived order; otherwise this stays a plain queryset
+    over Order. The ordering of orders carries over to the combined list.
+    """
+    start = None
+    if date_from is not None:
+        start = timezone.make_aware(datetime.datetime.combine(date_from, datetime.time.min))
+        orders = orders.filter(date__gte=start)
+        archived = archived.filter(date__gte=start)
+    if date_to is not None:
+        end = timezone.make_aware(datetime.datetime.combine(date_to + datetime.timedelta(days=1), datetime.time.min))
+        orders = orders.filter(date__lt=end)
+        archived = archived.filter(date__lt=end)
+    horizon = archive_horizon()
+    if horizon is None or (start is not None and horizon < start):
+        return orders
+    ordering = list(orders.query.order_by) or ['-date']
+    if not {'id', '-id', 'pk', '-pk'} & set(ordering):
+        # Pages need a unique key, break ties on id in the leading direction
+        ordering.append('-id' if ordering[0].startswith('-') else 'id')
+    return OrderHistory(orders, archived, ordering)
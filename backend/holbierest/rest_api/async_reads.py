@@ -0,0 +1,127 @@
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.handlers.asgi import ASGIRequest
+from django.http import Http404
+from django.shortcuts import aget_object_or_404
+from django.views.decorators.csrf import csrf_exempt
+from django_filters.filters import QuerySetRequestMixin
+from rest_framework import mixins
+from rest_framework.response import Response
+
+from .paginations import apaginate_queryset
+
+READ_METHODS = ('GET', 'HEAD')
+
+
+def async_reads_enabled():
+    return getattr(settings, 'REST_API_ASYNC_READS', False)
+
+
+class AsyncReadMixin:
+    """
+    Serves anonymous GETs of a generic list or detail view from a coroutine
+    when the app runs under ASGI and settings.REST_API_ASYNC_READS is on,
+    so they don't each hold a worker thread. The view's own filter backends,
+    pagination and serializer are reused; only the queries go through the
+    async ORM. Writes and authenticated requests go to the regular view.
+    """
+
+    @classmethod
+    def as_view(cls, **initkwargs):
+        if async_reads_enabled():
+            return cls.as_async_view(**initkwargs)
+        return super().as_view(**initkwargs)
+
+    @classmethod
+    def as_async_view(cls, **initkwargs):
+        sync_view = super().as_view(**initkwargs)
+
+        async def view(request, *args, **kwargs):
+            if not cls.reads_async(request):
+                return await sync_to_async(sync_view)(request, *args, **kwargs)
+            self = cls(**initkwargs)
+            self.setup(request, *args, **kwargs)
+            return await self.adispatch(request, *args, **kwargs)
+
+        view.cls = cls
+        view.initkwargs = initkwargs
+        return csrf_exempt(view)
+
+    @classmethod
+    def reads_async(cls, request):
+        # A token or session has to be checked against the database, those requests stay sync
+        return (request.method in READ_METHODS and isinstance(request, ASGIRequest)
+                and 'Authorization' not in request.headers
+                and settings.SESSION_COOKIE_NAME not in request.COOKIES)
+
+    async def adispatch(self, request, *args, **kwargs):
+        # APIView.dispatch for a read
+        self.args = args
+        self.kwargs = kwargs
+        request = self.initialize_request(request, *args, **kwargs)
+        self.request = request
+        self.headers = self.default_response_headers
+
+        try:
+            self.format_kwarg = self.get_format_suffix(**kwargs)
+            request.accepted_renderer, request.accepted_media_type = self.perform_content_negotiation(request)
+            request.version, request.versioning_scheme = self.determine_version(request, *args, **kwargs)
+            self.perform_authentication(request)
+            self.check_permissions(request)
+            # The shared throttle store is a blocking SQLite write
+            await sync_to_async(self.check_throttles, thread_sensitive=False)(request)
+
+            if isinstance(self, mixins.ListModelMixin):
+                response = await self.alist(request, *args, **kwargs)
+            else:
+                response = await self.aretrieve(request, *args, **kwargs)
+        except Exception as exc:
+            response = self.handle_exception(exc)
+
+        self.response = self.finalize_response(request, response, *args, **kwargs)
+        return self.response
+
+    async def alist(self, request, *args, **kwargs):
+        queryset = await self.afilter_queryset(self.get_queryset())
+
+        page = await self.apaginate_queryset(queryset)
+        if page is not None:
+            serializer = self.get_serializer(page, many=True)
+            return self.get_paginated_response(serializer.data)
+
+        serializer = self.get_serializer([obj async for obj in queryset], many=True)
+        return Response(serializer.data)
+
+    async def aretrieve(self, request, *args, **kwargs):
+        instance = await self.aget_object()
+        serializer = self.get_serializer(instance)
+        return Response(serializer.data)
+
+    async def aget_object(self):
+        queryset = await self.afilter_queryset(self.get_queryset())
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        try:
+            obj = await aget_object_or_404(queryset, **{self.lookup_field: self.kwargs[lookup_url_kwarg]})
+        except (TypeError, ValueError, ValidationError):
+            raise Http404
+        self.check_object_permissions(self.request, obj)
+        return obj
+
+    async def afilter_queryset(self, queryset):
+        # Validating a model choice filter (e.g. ?category=) looks the choice up with a sync query
+        if self.filters_query_database():
+            return await sync_to_async(self.filter_queryset)(queryset)
+        return self.filter_queryset(queryset)
+
+    def filters_query_database(self):
+        filterset_class = getattr(self, 'filterset_class', None)
+        if filterset_class is None:
+            return False
+        return any(isinstance(filter_, QuerySetRequestMixin) and self.request.query_params.get(name)
+                   for name, filter_ in filterset_class.base_filters.items())
+
+    async def apaginate_queryset(self, queryset):
+        if self.paginator is None:
+            return None
+        return await apaginate_queryset(self.paginator, queryset, self.request, view=self)
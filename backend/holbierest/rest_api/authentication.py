@@ -0,0 +1,140 @@
+import hashlib
+import threading
+import time
+from collections import Counter, OrderedDict
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+from django.utils.translation import gettext_lazy as _
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+
+from .caching import get_version
+
+TOKEN_CACHE_PREFIX = 'rest_api:auth:token:v2:'
+TOKEN_VERSION_PREFIX = 'rest_api:auth:version:'
+
+
+def _config():
+    return {'TIMEOUT': 300, 'LOCAL_SIZE': 1024, **getattr(settings, 'TOKEN_CACHE', {})}
+
+
+def _user_fields():
+    # The password hash stays out of the cache, it's loaded on access for the few views that check it
+    return [field.attname for field in get_user_model()._meta.concrete_fields if field.attname != 'password']
+
+
+def _cache_key(key):
+    # Token keys are credentials, only their digest goes into the shared cache
+    return TOKEN_CACHE_PREFIX + hashlib.sha256(key.encode()).hexdigest()
+
+
+def _version_key(key):
+    return TOKEN_VERSION_PREFIX + hashlib.sha256(key.encode()).hexdigest()
+
+
+class TokenCache:
+    """
+    Resolved tokens, as the field values of their user, in a bounded
+    process-local LRU in front of the shared cache. Both expire after
+    TOKEN_CACHE['TIMEOUT'] seconds. Every token has its own version in the
+    shared cache, which each lookup compares its entry against. Invalidating
+    a token deletes its version and shared entry, so every process reads
+    just that token again and all other cached tokens stay valid.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self.stats = Counter()
+
+    def get(self, key):
+        """Returns (entry or None, version), the version to pass to set() after a miss."""
+        version = get_version(_version_key(key), _config()['TIMEOUT'])
+        now = time.monotonic()
+        with self._lock:
+            local = self._entries.get(key)
+            if local is not None:
+                expires, local_version, entry = local
+                if expires > now and local_version == version:
+                    self._entries.move_to_end(key)
+                    self.stats['local_hits'] += 1
+                    return entry, version
+                del self._entries[key]
+        shared = cache.get(_cache_key(key))
+        if shared is None or shared[0] != version:
+            self.stats['misses'] += 1
+            return None, version
+        self.stats['shared_hits'] += 1
+        self._remember(key, shared[1], version)
+        return shared[1], version
+
+    def set(self, key, entry, version):
+        timeout = _config()['TIMEOUT']
+        if get_version(_version_key(key), timeout) != version:
+            # Invalidated while the entry was read from the DB, it may be stale already
+            return
+        cache.set(_cache_key(key), (version, entry), timeout)
+        self._remember(key, entry, version)
+
+    def _remember(self, key, entry, version):
+        config = _config()
+        with self._lock:
+            self._entries[key] = (time.monotonic() + config['TIMEOUT'], version, entry)
+            self._entries.move_to_end(key)
+            while len(self._entries) > config['LOCAL_SIZE']:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, keys):
+        keys = list(keys)
+        if not keys:
+            return
+        # The next lookup seeds a new version, so entries stored under the old one are never used again
+        cache.delete_many([_version_key(key) for key in keys] + [_cache_key(key) for key in keys])
+        with self._lock:
+            for key in keys:
+                self._entries.pop(key, None)
+
+
+token_cache = TokenCache()
+
+
+def invalidate_user_tokens(user_ids):
+    """Drops the cached tokens of these users, after a change to their row."""
+    token_cache.invalidate(Token.objects.filter(user_id__in=user_ids).values_list('key', flat=True))
+
+
+def token_cache_stats():
+    stats = dict(token_cache.stats)
+    lookups = sum(stats.values())
+    hits = stats.get('local_hits', 0) + stats.get('shared_hits', 0)
+    return {**stats, 'lookups': lookups, 'hit_rate': hits / lookups if lookups else None}
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+    TokenAuthentication without the token/user query on every request.
+    The cached user is rebuilt per request, so nothing memoized on one
+    request's user (like its roles) leaks into another.
+    """
+
+    def authenticate_credentials(self, key):
+        User = get_user_model()
+        fields = _user_fields()
+        entry, version = token_cache.get(key)
+        if entry is None:
+            try:
+                token = self.get_model().objects.select_related('user').get(key=key)
+            except self.get_model().DoesNotExist:
+                raise exceptions.AuthenticationFailed(_('Invalid token.'))
+            if not token.user.is_active:
+                raise exceptions.AuthenticationFailed(_('User inactive or deleted.'))
+            entry = (token.created, tuple(getattr(token.user, field) for field in fields))
+            token_cache.set(key, entry, version)
+
+        created, values = entry
+        user = User.from_db(DEFAULT_DB_ALIAS, fields, values)
+        return user, self.get_model()(key=key, user=user, created=created)
@@ -0,0 +1,546 @@
+"""
+Local load and latency benchmark for the rest_api and djoser routes.
+
+seed() fills a throwaway database with a configurable dataset, run() drives
+every route with concurrent in-process clients and collects latency, status
+codes and SQL query counts per endpoint, and compare() checks a results file
+against a stored baseline. See the benchmark_api management command.
+The /api/orders/events stream never completes a request and is left out.
+run_async_reads() compares the sync and async public read views over HTTP
+under uvicorn, see the benchmark_async_reads command.
+"""
+import contextlib
+import datetime
+import itertools
+import json
+import multiprocessing
+import os
+import random
+import secrets
+import socket
+import statistics
+import tempfile
+import threading
+import time
+import types
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+from decimal import Decimal
+
+import django
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import Group
+from django.core.asgi import get_asgi_application
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import close_old_connections, connection, transaction
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import path
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+
+from . import loadgen
+from .analytics import rebuild_sales_rollups
+from .models import Category, MenuItem, Order, OrderItem, Reservation, Review
+from .ratings import rebuild_rating_stats
+from .reservations import book as book_slot
+
+User = get_user_model()
+
+PASSWORD = 'benchmark-pass-1'
+ROLES = ('customer', 'manager', 'crew', 'admin')
+
+
+class Dataset:
+    """Ids and tokens of the seeded rows, shared read-only by the client threads."""
+
+    def __init__(self):
+        self.category_ids = []
+        self.menu_item_ids = []
+        self.order_ids = []
+        self.reservation_ids = []
+        self.users = {role: [] for role in ROLES}  # role -> [(user_id, username, token)]
+        self.counter = itertools.count()
+        self.lock = threading.Lock()
+
+    def unique(self):
+        with self.lock:
+            return next(self.counter)
+
+
+def _batches(iterable, size):
+    iterator = iter(iterable)
+    while batch := list(itertools.islice(iterator, size)):
+        yield batch
+
+
+def seed(menu_items=2000, categories=20, users=2000, orders=5000, items_per_order=4,
+         reviews=5000, reservations=2000, batch_size=5000, stdout=None):
+    """Bulk-inserts the benchmark dataset and returns its Dataset."""
+    rng = random.Random(42)
+    data = Dataset()
+    password = make_password(PASSWORD)  # Hash once, every seeded user shares it
+    log = stdout.write if stdout else (lambda message: None)
+
+    with transaction.atomic():
+        groups = {name: Group.objects.get_or_create(name=name)[0] for name in ('Manager', 'Delivery Crew')}
+
+        Category.objects.bulk_create(
+            Category(slug=f'category-{i}', title=f'Category {i}') for i in range(categories))
+        data.category_ids = list(Category.objects.values_list('id', flat=True))
+
+        words = ['Kebab', 'Pide', 'Salad', 'Soup', 'Burger', 'Pizza', 'Lahmacun', 'Dolma', 'Cake', 'Tea']
+        for batch in _batches(range(menu_items), batch_size):
+            MenuItem.objects.bulk_create(
+                MenuItem(title=f'{rng.choice(words)} {rng.choice(words)} {i}',
+                         price=Decimal(rng.randint(100, 3000)) / 100, featured=i % 10 == 0,
+                         category_id=rng.choice(data.category_ids))
+                for i in batch)
+        data.menu_item_ids = list(MenuItem.objects.values_list('id', flat=True))
+        log(f'Seeded {len(data.menu_item_ids)} menu items in {categories} categories\n')
+
+        # A few staff per role, everyone else is a customer
+        staff = max(4, users // 50)
+        roles = ['manager'] * staff + ['crew'] * staff + ['admin'] * 2
+        roles += ['customer'] * max(users - len(roles), 1)
+        for batch in _batches(enumerate(roles), batch_size):
+            User.objects.bulk_create(
+                User(username=f'bench-{role}-{i}', email=f'bench{i}@example.com', password=password,
+                     is_staff=role == 'admin', is_superuser=role == 'admin')
+                for i, role in batch)
+        seeded = User.objects.filter(username__startswith='bench-').values_list('id', 'username')
+        tokens = []
+        memberships = []
+        for user_id, username in seeded:
+            role = username.split('-')[1]
+            key = secrets.token_hex(20)
+            tokens.append(Token(key=key, user_id=user_id))
+            data.users[role].append((user_id, username, key))
+            if role in ('manager', 'crew'):
+                group = groups['Manager' if role == 'manager' else 'Delivery Crew']
+                memberships.append(User.groups.through(customuser_id=user_id, group_id=group.id))
+        Token.objects.bulk_create(tokens, batch_size=batch_size)
+        User.groups.through.objects.bulk_create(memberships, batch_size=batch_size)
+        log(f'Seeded {len(tokens)} users with tokens\n')
+
+        customers = [user_id for user_id, _, _ in data.users['customer']]
+        crew = [user_id for user_id, _, _ in data.users['crew']]
+        statuses = [status for status, _ in Order.STATUS_CHOICES]
+        now = timezone.now()
+        for batch in _batches(range(orders), batch_size):
+            Order.objects.bulk_create(
+                Order(user_id=rng.choice(customers), delivery_crew_id=rng.choice(crew + [None]),
+                      status=rng.choice(statuses), total=Decimal(rng.randint(500, 10000)) / 100)
+                for _ in batch)
+        # date is auto_now_add, spread it over the last year afterwards
+        order_ids = list(Order.objects.values_list('id', flat=True))
+        for batch in _batches(order_ids, batch_size):
+            Order.objects.bulk_update(
+                [Order(id=order_id, date=now - datetime.timedelta(minutes=rng.randint(0, 525600)))
+                 for order_id in batch], ['date'])
+        data.order_ids = order_ids
+
+        per_order = min(items_per_order, len(data.menu_item_ids))
+        lines = (
+            OrderItem(order_id=order_id, menuitem_id=menuitem_id, quantity=1, price=Decimal('10.00'))
+            for order_id in order_ids
+            for menuitem_id in rng.sample(data.menu_item_ids, per_order)
+        )
+        for batch in _batches(lines, batch_size):
+            OrderItem.objects.bulk_create(batch)
+        rebuild_sales_rollups(chunk_size=batch_size)  # bulk_create skips the checkout bookkeeping
+        log(f'Seeded {len(order_ids)} orders with {len(order_ids) * per_order} order items\n')
+
+        for batch in _batches(range(reviews), batch_size):
+            Review.objects.bulk_create(
+                Review(user_id=rng.choice(customers), menu_item_id=rng.choice(data.menu_item_ids),
+                       rating=rng.randint(1, 5), comment='Benchmark review')
+                for _ in batch)
+        rebuild_rating_stats()  # bulk_create skips the review signals
+        for batch in _batches(range(reservations), batch_size):
+            Reservation.objects.bulk_create(
+                Reservation(user_id=rng.choice(customers), phone_number='0500000000',
+                            date=now.date() + datetime.timedelta(days=rng.randint(0, 60)),
+                            time=datetime.time(rng.randint(10, 21), rng.choice([0, 30])),
+                            number_of_guests=rng.randint(1, 8))
+                for _ in batch)
+        data.reservation_ids = list(Reservation.objects.values_list('id', flat=True))
+        log(f'Seeded {reviews} reviews and {reservations} reservations\n')
+    return data
+
+
+class Route:
+    """One benchmarked endpoint: who calls it and how each request is built."""
+
+    def __init__(self, name, role, call, prepare=None):
+        self.name = name
+        self.role = role  # None for anonymous requests
+        self.call = call
+        self.prepare = prepare  # Unmeasured setup run before every request, e.g. filling the cart
+
+
+def _menu_item(data, rng):
+    return rng.choice(data.menu_item_ids)
+
+
+def _fill_cart(client, data, rng, ctx):
+    client.post('/api/cart/menu-items/batch',
+                {'items': [{'menuitem_id': _menu_item(data, rng), 'quantity': 1} for _ in range(3)]},
+                format='json')
+
+
+def _add_one(client, data, rng, ctx):
+    ctx['menuitem_id'] = _menu_item(data, rng)
+    client.post('/api/cart/menu-items', {'menuitem_id': ctx['menuitem_id']})
+
+
+def _login(client, data, rng, ctx):
+    client.credentials()  # The previous iteration's token was logged out
+    response = client.post('/auth/token/login/', {'username': ctx['username'], 'password': PASSWORD})
+    client.credentials(HTTP_AUTHORIZATION=f"Token {response.json()['auth_token']}")
+
+
+def _crew_username(data, rng):
+    return rng.choice(data.users['crew'])[1]
+
+
+def _import_menu(client, data, rng, ctx):
+    # The same titles every time, so after the first request each import updates rows instead of adding them
+    lines = ['title,price,category'] + [f'Bench import {i},{rng.randint(1, 40)}.50,bench-import' for i in range(50)]
+    upload = SimpleUploadedFile('menu.csv', '\n'.join(lines).encode(), content_type='text/csv')
+    return client.post('/api/menu-items/import', {'file': upload})
+
+
+def _export_menu(client, data, rng, ctx):
+    response = client.get('/api/menu-items/export')
+    b''.join(response.streaming_content)  # The rows are only queried as the body is read
+    return response
+
+
+def _book_table(client, data, rng, ctx):
+    date = datetime.date(2031, 1, 1) + datetime.timedelta(days=rng.randint(0, 364))
+    start = datetime.time(rng.randint(10, 21))
+    with transaction.atomic():
+        slot = book_slot(date, start, 2)
+        ctx['reservation_id'] = Reservation.objects.create(
+            user_id=rng.choice(data.users['customer'])[0], slot=slot, date=date, time=start,
+            phone_number='0500000000', number_of_guests=2).pk
+
+
+ROUTES = [
+    Route('categories.list', None, lambda c, d, r, x: c.get('/api/categories')),
+    Route('categories.create', 'customer', lambda c, d, r, x: c.post(
+        '/api/categories', {'title': f'Bench {d.unique()}', 'slug': f'bench-{d.unique()}'})),
+    Route('menu_items.list', None, lambda c, d, r, x: c.get(
+        '/api/menu-items', {'category': r.choice(d.category_ids), 'page': 1})),
+    Route('menu_items.list_deep', None, lambda c, d, r, x: c.get(
+        '/api/menu-items', {'page': r.randint(1, max(1, len(d.menu_item_ids) // 6))})),
+    Route('menu_items.search', None, lambda c, d, r, x: c.get(
+        '/api/menu-items', {'search': r.choice(['keb', 'pizza', 'sou', 'cake tea'])})),
+    Route('menu_items.cursor', None, lambda c, d, r, x: c.get('/api/menu-items', {'pagination': 'cursor'})),
+    Route('menu_items.create', 'customer', lambda c, d, r, x: c.post(
+        '/api/menu-items', {'title': f'Bench dish {d.unique()}', 'price': '9.99', 'featured': False,
+                            'category': r.choice(d.category_ids)})),
+    Route('menu_items.import', 'manager', _import_menu),
+    Route('menu_items.export', 'manager', _export_menu),
+    Route('menu_item.detail', None, lambda c, d, r, x: c.get(f'/api/menu-items/{_menu_item(d, r)}')),
+    Route('menu_item.update', 'customer', lambda c, d, r, x: c.patch(
+        f'/api/menu-items/{_menu_item(d, r)}', {'price': '12.50'})),
+    Route('cart.list', 'customer', lambda c, d, r, x: c.get('/api/cart/menu-items'), prepare=_fill_cart),
+    Route('cart.add', 'customer', lambda c, d, r, x: c.post(
+        '/api/cart/menu-items', {'menuitem_id': _menu_item(d, r), 'quantity': 1})),
+    Route('cart.batch', 'customer', lambda c, d, r, x: c.post(
+        '/api/cart/menu-items/batch',
+        {'items': [{'menuitem_id': _menu_item(d, r), 'quantity': 2} for _ in range(10)]}, format='json')),
+    Route('cart.clear', 'customer', lambda c, d, r, x: c.delete('/api/cart/menu-items'), prepare=_fill_cart),
+    Route('cart_item.update', 'customer', lambda c, d, r, x: c.put(
+        f"/api/cart/menu-items/{x['menuitem_id']}/", {'quantity': 3}), prepare=_add_one),
+    Route('cart_item.delete', 'customer', lambda c, d, r, x: c.delete(
+        f"/api/cart/menu-items/{x['menuitem_id']}/"), prepare=_add_one),
+    Route('orders.list', 'customer', lambda c, d, r, x: c.get('/api/orders', {'ordering': '-date'})),
+    Route('orders.list_manager', 'manager', lambda c, d, r, x: c.get(
+        '/api/orders', {'ordering': '-date', 'page': r.randint(1, 50)})),
+    Route('orders.list_manager_cursor', 'manager', lambda c, d, r, x: c.get(
+        '/api/orders', {'ordering': '-date', 'pagination': 'cursor'})),
+    Route('orders.checkout', 'customer', lambda c, d, r, x: c.post('/api/orders', {'tip': '1.00'}),
+          prepare=_fill_cart),
+    Route('order.detail', 'customer', lambda c, d, r, x: c.get(f'/api/orders/{r.choice(d.order_ids)}')),
+    Route('order.update', 'manager', lambda c, d, r, x: c.patch(
+        f'/api/orders/{r.choice(d.order_ids)}', {'status': 'PENDING'})),
+    Route('orders.dispatch', 'manager', lambda c, d, r, x: c.post('/api/orders/dispatch', {'limit': 20})),
+    Route('reservations.list', 'manager', lambda c, d, r, x: c.get('/api/reservations')),
+    Route('reservations.create', 'customer', lambda c, d, r, x: c.post(
+        '/api/reservations', {'date': f'2030-{r.randint(1, 12):02}-{r.randint(1, 28):02}',
+                              'time': f'{r.randint(10, 21)}:00', 'phone_number': '0500000000',
+                              'number_of_guests': 2})),
+    Route('reservations.availability', None, lambda c, d, r, x: c.get(
+        '/api/reservations/availability', {'date_from': '2030-01-01', 'date_to': '2030-01-31'})),
+    Route('reservation.detail', 'manager', lambda c, d, r, x: c.get(
+        f'/api/reservations/{r.choice(d.reservation_ids)}')),
+    Route('reservation.update', 'manager', lambda c, d, r, x: c.patch(
+        f'/api/reservations/{r.choice(d.reservation_ids)}', {'number_of_guests': 3})),
+    Route('reservation.delete', 'manager', lambda c, d, r, x: c.delete(
+        f"/api/reservations/{x['reservation_id']}"), prepare=_book_table),
+    Route('reviews.list', None, lambda c, d, r, x: c.get(f'/api/menu-items/{_menu_item(d, r)}/reviews')),
+    Route('reviews.create', 'customer', lambda c, d, r, x: c.post(
+        f'/api/menu-items/{_menu_item(d, r)}/reviews',
+        {'menu_item': _menu_item(d, r), 'rating': r.randint(1, 5), 'comment': 'Bench'})),
+    Route('analytics.sales', 'manager', lambda c, d, r, x: c.get(
+        '/api/analytics/sales', {'period': r.choice(['day', 'week', 'month']),
+                                 'date_from': (timezone.localdate() - datetime.timedelta(days=90)).isoformat()})),
+    Route('groups.manager.list', 'admin', lambda c, d, r, x: c.get('/api/groups/manager/users')),
+    Route('groups.manager.add', 'admin', lambda c, d, r, x: c.post(
+        '/api/groups/manager/users', {'username': r.choice(d.users['manager'])[1]})),
+    Route('groups.manager.remove', 'admin', lambda c, d, r, x: c.delete(
+        '/api/groups/manager/users', {'username': r.choice(d.users['customer'])[1]})),
+    Route('groups.delivery_crew.list', 'manager', lambda c, d, r, x: c.get('/api/groups/delivery-crew/users')),
+    Route('groups.delivery_crew.add', 'manager', lambda c, d, r, x: c.post(
+        '/api/groups/delivery-crew/users', {'username': _crew_username(d, r)})),
+    Route('groups.delivery_crew.remove', 'manager', lambda c, d, r, x: c.delete(
+        '/api/groups/delivery-crew/users', {'username': r.choice(d.users['customer'])[1]})),
+    Route('auth.users.create', None, lambda c, d, r, x: c.post(
+        '/auth/users/', {'username': f'bench-new-{d.unique()}', 'password': 'Xq7!benchmark-pass'})),
+    Route('auth.users.me', 'customer', lambda c, d, r, x: c.get('/auth/users/me/')),
+    Route('auth.token.login', None, lambda c, d, r, x: c.post(
+        '/auth/token/login/', {'username': r.choice(d.users['customer'])[1], 'password': PASSWORD})),
+    Route('auth.token.logout', 'login', lambda c, d, r, x: c.post('/auth/token/logout/'), prepare=_login),
+]
+
+
+def percentile(values, fraction):
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(fraction * len(ordered)) - 1))
+    return ordered[index]
+
+
+def _client_for(route, data, worker):
+    from rest_framework.test import APIClient
+
+    # Each (route, worker) pair gets its own address and user so the per-client throttles don't kick in
+    offset = zlib.crc32(route.name.encode())
+    # Server errors (e.g. SQLite lock timeouts) are counted, not raised
+    client = APIClient(raise_request_exception=False, REMOTE_ADDR=f'10.{worker // 250}.{worker % 250}.{offset % 250}')
+    ctx = {}
+    if route.role == 'login':
+        ctx['username'] = data.users['customer'][worker % len(data.users['customer'])][1]
+    elif route.role is not None:
+        pool = data.users[route.role]
+        _, username, token = pool[(worker + offset) % len(pool)]
+        client.credentials(HTTP_AUTHORIZATION=f'Token {token}')
+        ctx['username'] = username
+    return client, ctx
+
+
+def run_route(route, data, requests, concurrency, seed=0):
+    """Sends requests to one route from concurrency threads. Returns that endpoint's stats."""
+    latencies = []
+    queries = []
+    statuses = {}
+    lock = threading.Lock()
+    per_worker = [requests // concurrency + (i < requests % concurrency) for i in range(concurrency)]
+
+    def work(worker):
+        rng = random.Random(seed * 1000 + worker)
+        client, ctx = _client_for(route, data, worker)
+        try:
+            for _ in range(per_worker[worker]):
+                if route.prepare:
+                    route.prepare(client, data, rng, ctx)
+                with CaptureQueriesContext(connection) as captured:
+                    started = time.perf_counter()
+                    response = route.call(client, data, rng, ctx)
+                    elapsed = time.perf_counter() - started
+                with lock:
+                    latencies.append(elapsed * 1000)
+                    queries.append(len(captured))
+                    statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+        finally:
+            close_old_connections()
+            connection.close()
+
+    threads = [threading.Thread(target=work, args=(worker,)) for worker in range(concurrency)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - started
+
+    stats = summarize(latencies, statuses, wall)
+    stats['queries_per_request'] = {
+        'mean': round(statistics.fmean(queries), 2) if queries else None,
+        'max': max(queries) if queries else None,
+    }
+    return stats
+
+
+def summarize(latencies, statuses, wall):
+    # Status 0 is a request that got no response at all
+    errors = sum(count for status, count in statuses.items() if status >= 500 or status == 0)
+    return {
+        'requests': len(latencies),
+        'errors': errors,
+        'status_codes': {str(status): count for status, count in sorted(statuses.items())},
+        'throughput_rps': round(len(latencies) / wall, 2) if wall else None,
+        'latency_ms': {
+            'mean': round(statistics.fmean(latencies), 3) if latencies else None,
+            'p50': round(percentile(latencies, 0.50), 3) if latencies else None,
+            'p95': round(percentile(latencies, 0.95), 3) if latencies else None,
+            'p99': round(percentile(latencies, 0.99), 3) if latencies else None,
+        },
+    }
+
+
+def run(data, requests=200, concurrency=8, only=None, stdout=None):
+    """Benchmarks every route (or the names in only) and returns the results document."""
+    results = {}
+    for route in ROUTES:
+        if only and route.name not in only:
+            continue
+        results[route.name] = stats = run_route(route, data, requests, concurrency)
+        if stdout:
+            latency = stats['latency_ms']
+            stdout.write(f"{route.name:32} {stats['throughput_rps']!s:>9} rps  p50 {latency['p50']!s:>8} ms  "
+                         f"p95 {latency['p95']!s:>8} ms  p99 {latency['p99']!s:>8} ms  "
+                         f"queries {stats['queries_per_request']['mean']!s:>6}  errors {stats['errors']}\n")
+    return {
+        'meta': {
+            'created': timezone.now().isoformat(),
+            'django': django.get_version(),
+            'database': connection.vendor,
+            'requests_per_endpoint': requests,
+            'concurrency': concurrency,
+        },
+        'endpoints': results,
+    }
+
+
+@contextlib.contextmanager
+def unthrottled():
+    """The throttles still run, but with their own buckets and budgets no endpoint can use up."""
+    rates = {scope: '1000000/minute' for scope in settings.REST_FRAMEWORK['DEFAULT_THROTTLE_RATES']}
+    with tempfile.TemporaryDirectory() as throttle_dir, override_settings(
+            THROTTLE_STORE={'PATH': os.path.join(throttle_dir, 'throttle.sqlite3')},
+            REST_FRAMEWORK={**settings.REST_FRAMEWORK, 'DEFAULT_THROTTLE_RATES': rates}):
+        yield
+
+
+# The public reads AsyncReadMixin serves, as anonymous GET paths
+READ_PATHS = {
+    'categories.list': lambda d, r: '/api/categories',
+    'menu_items.list': lambda d, r: f'/api/menu-items?category={r.choice(d.category_ids)}&page=1',
+    'menu_items.list_deep': lambda d, r: f'/api/menu-items?page={r.randint(1, max(1, len(d.menu_item_ids) // 6))}',
+    'menu_items.search': lambda d, r: f"/api/menu-items?search={r.choice(['keb', 'pizza', 'sou', 'cake+tea'])}",
+    'menu_item.detail': lambda d, r: f'/api/menu-items/{_menu_item(d, r)}',
+    'reviews.list': lambda d, r: f'/api/menu-items/{_menu_item(d, r)}/reviews',
+}
+
+
+def _read_urlconf(async_reads):
+    from . import views
+
+    urlconf = types.ModuleType('rest_api.benchmark_read_urls')
+    with override_settings(REST_API_ASYNC_READS=async_reads):
+        urlconf.urlpatterns = [
+            path('api/categories', views.CategoriesView.as_view()),
+            path('api/menu-items', views.MenuItemsView.as_view()),
+            path('api/menu-items/<int:pk>', views.SingleMenuItemView.as_view()),
+            path('api/menu-items/<int:menu_item_id>/reviews', views.ReviewListCreateView.as_view()),
+        ]
+    return urlconf
+
+
+@contextlib.contextmanager
+def _uvicorn_server():
+    """Serves the ASGI application with uvicorn from a background thread, yields its port."""
+    import uvicorn
+
+    sock = socket.socket()
+    sock.bind(('127.0.0.1', 0))
+    config = uvicorn.Config(get_asgi_application(), lifespan='off', log_level='warning', access_log=False)
+    server = uvicorn.Server(config)
+    thread = threading.Thread(target=server.run, kwargs={'sockets': [sock]}, daemon=True)
+    thread.start()
+    try:
+        while not server.started:
+            if not thread.is_alive():
+                raise RuntimeError('uvicorn did not start')
+            time.sleep(0.01)
+        yield sock.getsockname()[1]
+    finally:
+        server.should_exit = True
+        thread.join()
+        sock.close()
+
+
+def run_async_reads(data, requests=1000, concurrency=64, only=None, stdout=None):
+    """
+    Benchmarks the public reads under uvicorn, first served by the sync views
+    and then by the async ones, with the same requests from concurrency
+    anonymous clients in a separate process. Returns the results document,
+    endpoints named "<route>.sync" and "<route>.async".
+    """
+    names = [name for name in READ_PATHS if not only or name in only]
+    rng = random.Random(0)
+    paths = {name: [READ_PATHS[name](data, rng) for _ in range(requests)] for name in names}
+    results = {}
+    spawn = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=1, mp_context=spawn) as clients, unthrottled(), \
+            override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, '127.0.0.1']):
+        for mode in ('sync', 'async'):
+            with override_settings(ROOT_URLCONF=_read_urlconf(mode == 'async')), _uvicorn_server() as port:
+                for name in names:
+                    cache.clear()
+                    clients.submit(loadgen.drive, '127.0.0.1', port, paths[name][:concurrency], concurrency).result()
+                    latencies, statuses, wall = clients.submit(
+                        loadgen.drive, '127.0.0.1', port, paths[name], concurrency).result()
+                    results[f'{name}.{mode}'] = stats = summarize(latencies, statuses, wall)
+                    if stdout:
+                        latency = stats['latency_ms']
+                        stdout.write(f"{name + '.' + mode:32} {stats['throughput_rps']!s:>9} rps  "
+                                     f"p50 {latency['p50']!s:>8} ms  p95 {latency['p95']!s:>8} ms  "
+                                     f"p99 {latency['p99']!s:>8} ms  errors {stats['errors']}\n")
+    return {
+        'meta': {
+            'created': timezone.now().isoformat(),
+            'django': django.get_version(),
+            'database': connection.vendor,
+            'server': 'uvicorn',
+            'requests_per_endpoint': requests,
+            'concurrency': concurrency,
+        },
+        'endpoints': results,
+    }
+
+
+def compare(results, baseline, max_regression=0.2):
+    """
+    Lists the endpoints whose p95 latency grew by more than max_regression
+    (a fraction) or whose mean query count grew, compared to baseline.
+    """
+    regressions = []
+    for name, current in results['endpoints'].items():
+        previous = baseline.get('endpoints', {}).get(name)
+        if previous is None:
+            continue
+        before, after = previous['latency_ms']['p95'], current['latency_ms']['p95']
+        if before and after and after > before * (1 + max_regression):
+            regressions.append(f'{name}: p95 {before} ms -> {after} ms')
+        before, after = previous['queries_per_request']['mean'], current['queries_per_request']['mean']
+        if before is not None and after is not None and after > before:
+            regressions.append(f'{name}: queries per request {before} -> {after}')
+    return regressions
+
+
+def load(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def save(results, path):
+    with open(path, 'w') as f:
+        json.dump(results, f, indent=2, sort_keys=True)
@@ -0,0 +1,151 @@
+import pickle
+import sqlite3
+import threading
+import time
+
+from django.core.cache import cache
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+_local = threading.local()
+_purged = {}
+
+LIVE = '(expires IS NULL OR expires > :now)'
+
+SET = '''
+INSERT INTO entries (key, value, expires) VALUES (:key, :value, :expires)
+ON CONFLICT (key) DO UPDATE SET value = excluded.value, expires = excluded.expires
+'''
+
+# Only replaces an entry that has expired, RETURNING tells whether a row was written
+ADD = '''
+INSERT INTO entries (key, value, expires) VALUES (:key, :value, :expires)
+ON CONFLICT (key) DO UPDATE SET value = excluded.value, expires = excluded.expires
+WHERE entries.expires IS NOT NULL AND entries.expires <= :now
+RETURNING 1
+'''
+
+INCR = f'''
+UPDATE entries SET value = value + :delta
+WHERE key = :key AND {LIVE} AND typeof(value) = 'integer'
+RETURNING value
+'''
+
+
+def get_version(key, timeout=None):
+    """
+    The version number under key in the default cache. A missing one is
+    seeded from the clock, so a cold or evicted key never brings back a
+    number that was handed out before, and add() lets concurrent seeds agree.
+    """
+    version = cache.get(key)
+    if version is None:
+        version = time.time_ns()
+        if not cache.add(key, version, timeout):
+            version = cache.get(key, version)
+    return version
+
+
+async def aget_version(key, timeout=None):
+    version = await cache.aget(key)
+    if version is None:
+        version = time.time_ns()
+        if not await cache.aadd(key, version, timeout):
+            version = await cache.aget(key, version)
+    return version
+
+
+def _encode(value):
+    # Integers stay SQL integers so incr() can add to them in place
+    if type(value) is int and -2 ** 63 <= value < 2 ** 63:
+        return value
+    return pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+
+
+def _decode(value):
+    return pickle.loads(value) if isinstance(value, bytes) else value
+
+
+class SQLiteCache(BaseCache):
+    """
+    A cache in a SQLite file, so every worker on the host sees the same
+    entries: a version bump or a deleted entry in one worker reaches all of
+    them. incr() and add() are single statements, so concurrent increments
+    from several processes each get their own value. Expired entries are
+    deleted now and then, and the ones closest to expiring once there are
+    more than MAX_ENTRIES; entries without a timeout are never culled.
+    """
+    purge_interval = 60
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        self.path = str(location)
+
+    def _connection(self):
+        connections = getattr(_local, 'connections', None)
+        if connections is None:
+            connections = _local.connections = {}
+        connection = connections.get(self.path)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            connection.execute('PRAGMA journal_mode=WAL')
+            # A cache may lose its last writes in a power cut
+            connection.execute('PRAGMA synchronous=OFF')
+            connection.execute('CREATE TABLE IF NOT EXISTS entries (key TEXT PRIMARY KEY, value BLOB, '
+                               'expires REAL) WITHOUT ROWID')
+            connections[self.path] = connection
+        return connection
+
+    def _write(self, sql, key, value, timeout):
+        now = time.time()
+        connection = self._connection()
+        rows = connection.execute(sql, {
+            'key': key, 'value': _encode(value), 'expires': self.get_backend_timeout(timeout), 'now': now,
+        }).fetchall()
+        if now - _purged.get(self.path, 0) > self.purge_interval:
+            _purged[self.path] = now
+            self._cull(connection, now)
+        return rows
+
+    def _cull(self, connection, now):
+        connection.execute('DELETE FROM entries WHERE expires <= ?', (now,))
+        count = connection.execute('SELECT COUNT(*) FROM entries').fetchone()[0]
+        if count > self._max_entries:
+            if self._cull_frequency == 0:
+                connection.execute('DELETE FROM entries WHERE expires IS NOT NULL')
+            else:
+                connection.execute('DELETE FROM entries WHERE key IN (SELECT key FROM entries WHERE expires IS NOT NULL '
+                                   'ORDER BY expires LIMIT ?)', (count // self._cull_frequency,))
+
+    def get(self, key, default=None, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        row = self._connection().execute(f'SELECT value FROM entries WHERE key = :key AND {LIVE}',
+                                         {'key': key, 'now': time.time()}).fetchone()
+        return default if row is None else _decode(row[0])
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self._write(SET, self.make_and_validate_key(key, version=version), value, timeout)
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        return bool(self._write(ADD, self.make_and_validate_key(key, version=version), value, timeout))
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        cursor = self._connection().execute(f'UPDATE entries SET expires = :expires WHERE key = :key AND {LIVE}', {
+            'key': key, 'expires': self.get_backend_timeout(timeout), 'now': time.time(),
+        })
+        return cursor.rowcount > 0
+
+    def incr(self, key, delta=1, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        # fetchall() steps the statement to its end, which commits the update
+        rows = self._connection().execute(INCR, {'key': key, 'delta': delta, 'now': time.time()}).fetchall()
+        if not rows:
+            raise ValueError(f"Key '{key}' not found")
+        return rows[0][0]
+
+    def delete(self, key, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        return self._connection().execute('DELETE FROM entries WHERE key = ?', (key,)).rowcount > 0
+
+    def clear(self):
+        self._connection().execute('DELETE FROM entries')
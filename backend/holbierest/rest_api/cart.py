@@ -0,0 +1,71 @@
+from collections import Counter
+
+from django.db import IntegrityError, transaction
+from django.db.models import Case, F, IntegerField, Value, When
+
+from .models import Cart, MenuItem
+
+
+class CartConflict(Exception):
+    """Another request changed the same cart rows mid-batch, the batch is retried."""
+
+
+def _increment(user, quantities):
+    # One UPDATE for all rows: quantity += n, and price follows from the new quantity
+    delta = Case(*[When(menuitem_id=menuitem_id, then=Value(quantity))
+                   for menuitem_id, quantity in quantities.items()],
+                 default=Value(0), output_field=IntegerField())
+    return Cart.objects.filter(user=user, menuitem_id__in=quantities).update(
+        quantity=F('quantity') + delta,
+        price=(F('quantity') + delta) * F('unit_price'),
+    )
+
+
+def add_to_cart(user, menuitem, quantity):
+    """
+    Adds quantity of menuitem to the user's cart with a DB-side increment, so
+    concurrent adds never lose an update. Returns True if a new row was created.
+    """
+    if _increment(user, {menuitem.id: quantity}):
+        return False
+    try:
+        with transaction.atomic():
+            Cart.objects.create(user=user, menuitem=menuitem, quantity=quantity,
+                                unit_price=menuitem.price, price=menuitem.price * quantity)
+        return True
+    except IntegrityError:
+        # A concurrent request inserted the row after our UPDATE, add on top of it
+        _increment(user, {menuitem.id: quantity})
+        return False
+
+
+def add_many_to_cart(user, quantities, attempts=3):
+    """
+    Applies {menuitem_id: quantity} to the user's cart in one transaction: one
+    price lookup, one UPDATE for rows already in the cart and one bulk INSERT
+    for the rest. Returns (created, updated) counts, or raises
+    MenuItem.DoesNotExist before writing anything if an id is unknown.
+    """
+    quantities = Counter(quantities)
+    for attempt in range(attempts):
+        try:
+            with transaction.atomic():
+                menuitems = MenuItem.objects.only('id', 'price').in_bulk(list(quantities))
+                missing = set(quantities) - set(menuitems)
+                if missing:
+                    raise MenuItem.DoesNotExist(f'Menu items not found: {sorted(missing)}')
+
+                existing = set(Cart.objects.select_for_update().filter(
+                    user=user, menuitem_id__in=quantities).values_list('menuitem_id', flat=True))
+                if existing and _increment(user, {i: quantities[i] for i in existing}) != len(existing):
+                    raise CartConflict
+                Cart.objects.bulk_create([
+                    Cart(user=user, menuitem_id=menuitem_id, quantity=quantity,
+                         unit_price=menuitems[menuitem_id].price,
+                         price=menuitems[menuitem_id].price * quantity)
+                    for menuitem_id, quantity in quantities.items() if menuitem_id not in existing
+                ])
+                return len(quantities) - len(existing), len(existing)
+        except (IntegrityError, CartConflict):
+            if attempt == attempts - 1:
+                raise
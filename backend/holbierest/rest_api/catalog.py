@@ -0,0 +1,107 @@
+import hashlib
+
+from django.core.cache import cache
+from django.db import transaction
+from django.utils.cache import patch_cache_control
+from django.utils.http import parse_etags
+from rest_framework import status
+from rest_framework.response import Response
+
+from .caching import aget_version, get_version
+
+CATALOG_VERSION_KEY = 'rest_api:catalog:version'
+CATALOG_PAGE_PREFIX = 'rest_api:catalog:page:'
+
+
+def get_catalog_version():
+    return get_version(CATALOG_VERSION_KEY)
+
+
+async def aget_catalog_version():
+    return await aget_version(CATALOG_VERSION_KEY)
+
+
+def bump_catalog_version():
+    # Called on every MenuItem/Category write, cached pages of older versions are never read again
+    try:
+        return cache.incr(CATALOG_VERSION_KEY)
+    except ValueError:
+        get_catalog_version()
+        return cache.incr(CATALOG_VERSION_KEY)
+
+
+def bump_catalog_version_on_commit():
+    # A page read between the write and the commit would otherwise be cached under the new version
+    transaction.on_commit(bump_catalog_version)
+
+
+def normalized_query(request):
+    # Empty values (e.g. "?category=&search=") are ignored by the filters, so they don't split the cache
+    params = []
+    for key in sorted(request.query_params.keys()):
+        for value in sorted(request.query_params.getlist(key)):
+            if value != '':
+                params.append((key, value))
+    return '&'.join(f'{key}={value}' for key, value in params)
+
+
+class CatalogCacheMixin:
+    """
+    Serves list pages from the cache, keyed by the catalog version and the
+    normalized query. A matching If-None-Match gets a 304 before any query runs.
+    """
+    catalog_cache_timeout = 60 * 60
+
+    def get_catalog_cache_key(self, request, version):
+        raw = '|'.join([
+            str(version),
+            request.build_absolute_uri(request.path),
+            request.accepted_renderer.format,
+            normalized_query(request),
+        ])
+        return hashlib.sha256(raw.encode()).hexdigest()
+
+    def get_catalog_etag(self, request, version):
+        digest = self.get_catalog_cache_key(request, version)
+        return digest, f'"{version}-{digest[:32]}"'
+
+    def not_modified(self, request, etag):
+        return etag in parse_etags(request.headers.get('If-None-Match', ''))
+
+    def finalize_catalog_response(self, response, etag):
+        response['ETag'] = etag
+        patch_cache_control(response, no_cache=True)
+        return response
+
+    def list(self, request, *args, **kwargs):
+        digest, etag = self.get_catalog_etag(request, get_catalog_version())
+
+        if self.not_modified(request, etag):
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            data = cache.get(CATALOG_PAGE_PREFIX + digest)
+            if data is None:
+                response = super().list(request, *args, **kwargs)
+                if response.status_code != status.HTTP_200_OK:
+                    return response
+                data = response.data
+                cache.set(CATALOG_PAGE_PREFIX + digest, data, self.catalog_cache_timeout)
+            response = Response(data)
+        return self.finalize_catalog_response(response, etag)
+
+    async def alist(self, request, *args, **kwargs):
+        # list() for AsyncReadMixin views, with the cache read and written through its async API
+        digest, etag = self.get_catalog_etag(request, await aget_catalog_version())
+
+        if self.not_modified(request, etag):
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            data = await cache.aget(CATALOG_PAGE_PREFIX + digest)
+            if data is None:
+                response = await super().alist(request, *args, **kwargs)
+                if response.status_code != status.HTTP_200_OK:
+                    return response
+                data = response.data
+                await cache.aset(CATALOG_PAGE_PREFIX + digest, data, self.catalog_cache_timeout)
+            response = Response(data)
+        return self.finalize_catalog_response(response, etag)
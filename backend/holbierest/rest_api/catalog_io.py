@@ -0,0 +1,210 @@
+import csv
+import io
+import json
+from decimal import Decimal
+from itertools import islice
+
+from asgiref.sync import sync_to_async
+from django.db import transaction
+from django.utils.text import capfirst
+from rest_framework import serializers
+
+from .models import Category, MenuItem
+
+FORMATS = ('csv', 'jsonl')
+COLUMNS = ['id', 'title', 'price', 'featured', 'category', 'category_title']
+
+
+class CatalogRowSerializer(serializers.Serializer):
+    """One menu item row. The category is given by slug and created if it doesn't exist yet."""
+    id = serializers.IntegerField(required=False, allow_null=True, min_value=1)
+    title = serializers.CharField(max_length=255)
+    price = serializers.DecimalField(max_digits=6, decimal_places=2, min_value=Decimal(0))
+    featured = serializers.BooleanField(default=False)
+    category = serializers.SlugField(max_length=50)
+    category_title = serializers.CharField(max_length=255, required=False, allow_blank=True)
+
+    def to_internal_value(self, data):
+        # Empty CSV cells mean "not given"
+        data = {key: value for key, value in data.items() if key in self.fields and value not in ('', None)}
+        return super().to_internal_value(data)
+
+
+def read_rows(stream, file_format):
+    """Yields (line number, row dict or None) from a text stream, None for lines that can't be parsed."""
+    if file_format == 'csv':
+        reader = csv.DictReader(stream)
+        for row in reader:
+            yield reader.line_num, row
+        return
+    for line_num, line in enumerate(stream, start=1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError:
+            row = None
+        yield line_num, row if isinstance(row, dict) else None
+
+
+def _upsert_categories(rows):
+    slugs = {row['category'] for row in rows}
+    titles = {row['category']: row['category_title'] for row in rows if row.get('category_title')}
+    existing = {}
+    # Slugs aren't unique in the table, the oldest category with a slug is the one imports update
+    for category in Category.objects.filter(slug__in=slugs).order_by('-id'):
+        existing[category.slug] = category
+    changed = []
+    for slug, title in titles.items():
+        category = existing.get(slug)
+        if category is not None and category.title != title:
+            category.title = title
+            changed.append(category)
+    if changed:
+        Category.objects.bulk_update(changed, ['title'])
+    new = [Category(slug=slug, title=titles.get(slug) or capfirst(slug.replace('-', ' ')))
+           for slug in slugs - existing.keys()]
+    if new:
+        for category in Category.objects.bulk_create(new):
+            existing[category.slug] = category
+    return existing, len(new)
+
+
+def _import_batch(batch, result):
+    rows = []
+    for line_num, data in batch:
+        if data is None:
+            result['errors'].append({'line': line_num, 'errors': {'row': ['Not a valid row.']}})
+            continue
+        serializer = CatalogRowSerializer(data=data)
+        if serializer.is_valid():
+            rows.append((line_num, serializer.validated_data))
+        else:
+            result['errors'].append({'line': line_num, 'errors': serializer.errors})
+    if not rows:
+        return
+
+    with transaction.atomic():
+        categories, created = _upsert_categories([row for _, row in rows])
+        result['categories_created'] += created
+
+        ids = {row['id'] for _, row in rows if row.get('id')}
+        by_id = MenuItem.objects.in_bulk(ids) if ids else {}
+        # Rows without an id update the item with the same title in the same category
+        keys = {(categories[row['category']].id, row['title']) for _, row in rows if not row.get('id')}
+        by_key = {}
+        if keys:
+            candidates = MenuItem.objects.filter(category_id__in={key[0] for key in keys},
+                                                 title__in={key[1] for key in keys}).order_by('-id')
+            by_key = {(item.category_id, item.title): item for item in candidates}
+
+        new, changed = {}, {}
+        for line_num, row in rows:
+            category = categories[row['category']]
+            if row.get('id'):
+                item = by_id.get(row['id'])
+                if item is None:
+                    result['errors'].append({'line': line_num, 'errors': {'id': [f"No menu item with id {row['id']}."]}})
+                    continue
+            else:
+                key = (category.id, row['title'])
+                item = by_key.get(key) or new.get(key)
+                if item is None:
+                    item = new[key] = MenuItem(title=row['title'], category=category, featured=False)
+            item.title = row['title']
+            item.price = row['price']
+            item.featured = row['featured']
+            item.category = category
+            if item.pk is not None:
+                changed[item.pk] = item
+
+        if new:
+            MenuItem.objects.bulk_create(new.values())
+        if changed:
+            MenuItem.objects.bulk_update(changed.values(), ['title', 'price', 'featured', 'category'])
+    result['created'] += len(new)
+    result['updated'] += len(changed)
+
+
+def import_catalog(stream, file_format, batch_size=500):
+    """
+    Upserts categories and menu items from CSV or JSON lines, batch_size rows
+    at a time with one transaction per batch. Rows that don't validate are
+    reported by line number and skipped, the rest of their batch is still
+    written. Imported items keep the default image; run build_image_variants
+    after adding images.
+    """
+    result = {'created': 0, 'updated': 0, 'categories_created': 0, 'errors': []}
+    rows = read_rows(stream, file_format)
+    while batch := list(islice(rows, batch_size)):
+        _import_batch(batch, result)
+    result['errors'].sort(key=lambda error: error['line'])
+    return result
+
+
+class _Echo:
+    def write(self, value):
+        return value
+
+
+def _export_rows():
+    return (MenuItem.objects.order_by('id')
+            .values_list('id', 'title', 'price', 'featured', 'category__slug', 'category__title'))
+
+
+def _export_encoder(file_format):
+    """Returns the header line (None for JSON lines) and a function encoding one row."""
+    if file_format == 'csv':
+        writer = csv.writer(_Echo())
+        return writer.writerow(COLUMNS), writer.writerow
+
+    def encode(row):
+        data = dict(zip(COLUMNS, row))
+        data['price'] = str(data['price'])
+        return json.dumps(data) + '\n'
+    return None, encode
+
+
+def export_catalog(file_format, chunk_size=500):
+    """Yields the menu as CSV or JSON lines, in the columns import_catalog reads, a chunk of rows at a time."""
+    header, encode = _export_encoder(file_format)
+    if header is not None:
+        yield header
+    for row in _export_rows().iterator(chunk_size=chunk_size):
+        yield encode(row)
+
+
+async def aexport_catalog(file_format, chunk_size=500):
+    """
+    export_catalog() for responses served under ASGI, which only stream
+    async iterators and would otherwise read the whole export into memory
+    first. Rows are read chunk_size at a time past the last id, each chunk
+    in a worker thread, and yielded as one string per chunk.
+    """
+    header, encode = _export_encoder(file_format)
+    lines = [header] if header is not None else []
+    last_id = 0
+    while True:
+        rows = await sync_to_async(list)(_export_rows().filter(id__gt=last_id)[:chunk_size])
+        if not rows:
+            break
+        last_id = rows[-1][0]
+        lines.extend(encode(row) for row in rows)
+        yield ''.join(lines)
+        lines = []
+    if lines:
+        yield ''.join(lines)
+
+
+def detect_format(name, default=None):
+    name = (name or '').lower()
+    if name.endswith('.csv'):
+        return 'csv'
+    if name.endswith(('.jsonl', '.ndjson')):
+        return 'jsonl'
+    return default
+
+
+def text_stream(binary):
+    # utf-8-sig drops the byte order mark spreadsheet exports start with
+    return io.TextIOWrapper(binary, encoding='utf-8-sig', newline='')
@@ -0,0 +1,138 @@
+import heapq
+import threading
+from collections import defaultdict
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, Q
+
+from .caching import get_version
+from .events import publish_order_event
+from .models import Order
+from .roles import DELIVERY_CREW
+
+# Orders a crew member is still working on
+ACTIVE_STATUSES = ('PENDING', 'READY')
+
+DISPATCH_VERSION_KEY = 'rest_api:dispatch:version'
+
+
+class Dispatcher:
+    """
+    A min-heap of (active orders, crew id) for picking the least-loaded crew
+    member without a query. The heap is process-local: every change to crew
+    load bumps a shared version number, and a process that sees a version it
+    did not produce itself rebuilds the heap from the DB before its next pick.
+    Stale heap entries are skipped lazily when popped.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version = None
+        self._load = {}
+        self._heap = []
+
+    def _rebuild(self):
+        User = get_user_model()
+        rows = (User.objects.filter(groups__name=DELIVERY_CREW, is_active=True).values_list('id')
+                .annotate(load=Count('delivery_crew', filter=Q(delivery_crew__status__in=ACTIVE_STATUSES))))
+        self._load = dict(rows)
+        self._heap = [(load, crew_id) for crew_id, load in self._load.items()]
+        heapq.heapify(self._heap)
+
+    def _sync(self):
+        version = get_version(DISPATCH_VERSION_KEY)
+        if version != self._version:
+            self._rebuild()
+            self._version = version
+
+    def _push(self, crew_id, delta):
+        if crew_id in self._load:
+            self._load[crew_id] += delta
+            heapq.heappush(self._heap, (self._load[crew_id], crew_id))
+
+    def _pop_least_loaded(self):
+        while self._heap:
+            load, crew_id = self._heap[0]
+            if self._load.get(crew_id) == load:
+                return crew_id
+            heapq.heappop(self._heap)
+        return None
+
+    def least_loaded(self):
+        """The id of the crew member with the fewest active orders, or None without crew."""
+        with self._lock:
+            self._sync()
+            return self._pop_least_loaded()
+
+    def plan(self, count):
+        """Spreads count new orders over the crew, returns the crew ids in order of assignment."""
+        with self._lock:
+            self._sync()
+            # A scratch heap: the real load only changes once the assignment is committed
+            heap = [(load, crew_id) for crew_id, load in self._load.items()]
+            heapq.heapify(heap)
+            picks = []
+            for _ in range(count if heap else 0):
+                load, crew_id = heapq.heappop(heap)
+                picks.append(crew_id)
+                heapq.heappush(heap, (load + 1, crew_id))
+            return picks
+
+    def apply(self, deltas):
+        """Records committed load changes ({crew_id: delta}) and announces them to other processes."""
+        with self._lock:
+            try:
+                version = cache.incr(DISPATCH_VERSION_KEY)
+            except ValueError:
+                version = None
+            if version is not None and self._version is not None and version == self._version + 1:
+                for crew_id, delta in deltas.items():
+                    self._push(crew_id, delta)
+                self._version = version
+            else:
+                # Someone else changed the load in between, rebuild on the next pick
+                self._version = None
+
+    def invalidate(self):
+        with self._lock:
+            try:
+                cache.incr(DISPATCH_VERSION_KEY)
+            except ValueError:
+                pass
+            self._version = None
+
+
+dispatcher = Dispatcher()
+
+
+def record_load_change(deltas):
+    deltas = {crew_id: delta for crew_id, delta in deltas.items() if crew_id is not None and delta}
+    if deltas:
+        transaction.on_commit(lambda: dispatcher.apply(deltas))
+
+
+def dispatch_backlog(limit=None):
+    """
+    Assigns READY orders without delivery crew, oldest first, to the least
+    loaded crew members in one transaction, with one UPDATE per crew member.
+    Returns a list of (order_id, crew_id) pairs.
+    """
+    with transaction.atomic():
+        orders = (Order.objects.select_for_update()
+                  .filter(status='READY', delivery_crew__isnull=True)
+                  .order_by('date', 'id').values_list('id', 'user_id'))
+        orders = list(orders[:limit] if limit else orders)
+        assignments = list(zip([order_id for order_id, _ in orders], dispatcher.plan(len(orders))))
+        by_crew = defaultdict(list)
+        for order_id, crew_id in assignments:
+            by_crew[crew_id].append(order_id)
+        for crew_id, crew_orders in by_crew.items():
+            Order.objects.filter(pk__in=crew_orders).update(delivery_crew_id=crew_id)
+        # A queryset update sends no post_save, so the load change is recorded here
+        record_load_change({crew_id: len(crew_orders) for crew_id, crew_orders in by_crew.items()})
+        for (order_id, user_id), (_, crew_id) in zip(orders, assignments):
+            publish_order_event('order.updated', order_id, user_id, 'READY', crew_id,
+                                previous={'status': 'READY', 'delivery_crew': None})
+    return assignments
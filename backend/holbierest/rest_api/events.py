@@ -0,0 +1,184 @@
+import asyncio
+import contextlib
+import itertools
+import json
+import logging
+import sqlite3
+import threading
+import time
+from collections import deque
+
+from django.conf import settings
+from django.db import transaction
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+_broker = {'config': None, 'instance': None}
+_broker_lock = threading.Lock()
+
+
+class InProcessBroker:
+    """
+    Fans order events out to the streams of this process. A short history is
+    kept so a reconnecting client can resume from its Last-Event-ID. A client
+    too slow to keep up with its queue is disconnected and resumes from there.
+    """
+
+    def __init__(self, history=1000, queue_size=256):
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+        self._history = deque(maxlen=history)
+        self._queue_size = queue_size
+        self._subscribers = set()
+
+    def publish(self, payload):
+        # Called from sync views, which run outside the event loops of the streams
+        with self._lock:
+            event = (next(self._ids), payload)
+            self._history.append(event)
+            subscribers = list(self._subscribers)
+        for loop, queue in subscribers:
+            loop.call_soon_threadsafe(self._deliver, queue, event)
+
+    @staticmethod
+    def _deliver(queue, event):
+        if queue.full():
+            while not queue.empty():
+                queue.get_nowait()
+            event = None
+        queue.put_nowait(event)
+
+    async def subscribe(self, last_event_id=None):
+        queue = asyncio.Queue(maxsize=self._queue_size)
+        subscriber = (asyncio.get_running_loop(), queue)
+        with self._lock:
+            missed = [event for event in self._history
+                      if last_event_id is not None and event[0] > last_event_id]
+            self._subscribers.add(subscriber)
+        try:
+            for event in missed:
+                yield event
+            while True:
+                event = await queue.get()
+                if event is None:
+                    return
+                yield event
+        finally:
+            with self._lock:
+                self._subscribers.discard(subscriber)
+
+
+class SQLiteBroker:
+    """
+    A stand-in for a shared broker when several workers serve the API: events
+    are appended to a table in a local SQLite file, and each stream polls it
+    for rows past the last id it has seen. Rows older than retention_seconds
+    are trimmed on publish.
+    """
+
+    def __init__(self, path, poll_interval=0.5, retention_seconds=300):
+        self.path = str(path)
+        self.poll_interval = poll_interval
+        self.retention_seconds = retention_seconds
+        self._local = threading.local()
+
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('CREATE TABLE IF NOT EXISTS order_events '
+                               '(id INTEGER PRIMARY KEY AUTOINCREMENT, created REAL NOT NULL, payload TEXT NOT NULL)')
+            self._local.connection = connection
+        return connection
+
+    def publish(self, payload):
+        connection = self._connection()
+        now = time.time()
+        connection.execute('INSERT INTO order_events (created, payload) VALUES (?, ?)', (now, json.dumps(payload)))
+        connection.execute('DELETE FROM order_events WHERE created < ?', (now - self.retention_seconds,))
+
+    def _last_id(self):
+        return self._connection().execute('SELECT COALESCE(MAX(id), 0) FROM order_events').fetchone()[0]
+
+    def _fetch(self, after):
+        rows = self._connection().execute(
+            'SELECT id, payload FROM order_events WHERE id > ? ORDER BY id LIMIT 500', (after,)).fetchall()
+        return [(event_id, json.loads(payload)) for event_id, payload in rows]
+
+    async def subscribe(self, last_event_id=None):
+        after = last_event_id if last_event_id is not None else await asyncio.to_thread(self._last_id)
+        while True:
+            events = await asyncio.to_thread(self._fetch, after)
+            for event in events:
+                after = event[0]
+                yield event
+            if not events:
+                await asyncio.sleep(self.poll_interval)
+
+
+def get_broker():
+    config = settings.ORDER_EVENTS
+    with _broker_lock:
+        if _broker['config'] is not config:
+            broker_class = import_string(config['BROKER'])
+            _broker['instance'] = broker_class(**config.get('OPTIONS', {}))
+            _broker['config'] = config
+        return _broker['instance']
+
+
+def _publish(payload):
+    try:
+        get_broker().publish(payload)
+    except Exception:
+        # Streams are best effort, the order change itself is already committed
+        logger.exception('Publishing %s for order %s failed', payload['type'], payload['order']['id'])
+
+
+def publish_order_event(event_type, order_id, user_id, status, delivery_crew_id, previous=None):
+    """Queues an order event for the streams, sent once the current transaction commits."""
+    payload = {
+        'type': event_type,
+        'order': {'id': order_id, 'user': user_id, 'status': status, 'delivery_crew': delivery_crew_id},
+    }
+    if previous is not None:
+        payload['previous'] = previous
+    transaction.on_commit(lambda: _publish(payload))
+
+
+def is_visible(payload, user_id, sees_all):
+    """Managers see every order, customers their own and delivery crew the orders assigned to or taken from them."""
+    if sees_all:
+        return True
+    order = payload['order']
+    previous = payload.get('previous') or {}
+    return user_id in (order['user'], order['delivery_crew'], previous.get('delivery_crew'))
+
+
+async def stream(events, user_id, sees_all, keepalive):
+    """The text/event-stream body: visible events, with a comment line whenever it's been quiet for keepalive seconds."""
+    yield 'retry: 3000\n\n'
+    pending = None
+    try:
+        while True:
+            if pending is None:
+                pending = asyncio.ensure_future(anext(events))
+            done, _ = await asyncio.wait({pending}, timeout=keepalive)
+            if not done:
+                yield ': keepalive\n\n'
+                continue
+            try:
+                event_id, payload = pending.result()
+            except StopAsyncIteration:
+                return
+            finally:
+                pending = None
+            if is_visible(payload, user_id, sees_all):
+                yield f"id: {event_id}\nevent: {payload['type']}\ndata: {json.dumps(payload)}\n\n"
+    finally:
+        if pending is not None:
+            pending.cancel()
+            with contextlib.suppress(asyncio.CancelledError, StopAsyncIteration):
+                await pending
+        await events.aclose()
@@ -0,0 +1,133 @@
+import functools
+import hashlib
+import json
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.response import Response
+from rest_framework.utils.encoders import JSONEncoder
+
+from .models import IdempotencyKey
+
+HEADER = 'Idempotency-Key'
+
+_last_purge = {'at': 0.0}
+_purge_lock = threading.Lock()
+
+
+def _config():
+    return {'TTL_SECONDS': 24 * 60 * 60, 'LEASE_SECONDS': 60, 'WAIT_SECONDS': 10, 'PURGE_INTERVAL_SECONDS': 60,
+            **getattr(settings, 'IDEMPOTENCY', {})}
+
+
+def _fingerprint(request):
+    data = request.data
+    if hasattr(data, 'lists'):
+        data = dict(data.lists())
+    body = json.dumps(data, sort_keys=True, cls=JSONEncoder)
+    return hashlib.sha256(f'{request.method} {request.path}\n{body}'.encode()).hexdigest()
+
+
+def purge_expired_keys(force=False):
+    """Deletes expired keys, at most once per PURGE_INTERVAL_SECONDS per process unless forced."""
+    with _purge_lock:
+        now = time.monotonic()
+        if not force and now - _last_purge['at'] < _config()['PURGE_INTERVAL_SECONDS']:
+            return 0
+        _last_purge['at'] = now
+    return IdempotencyKey.objects.filter(expires_at__lt=timezone.now()).delete()[0]
+
+
+def _claim(user, key, fingerprint):
+    """
+    Inserts the key as in progress, leased for LEASE_SECONDS so the claim of
+    a worker that died mid-request can be taken over. Returns (True, the new
+    row) if this request got it, else (False, the existing row).
+    """
+    purge_expired_keys()
+    while True:
+        try:
+            with transaction.atomic():
+                record = IdempotencyKey.objects.create(
+                    user=user, key=key, fingerprint=fingerprint,
+                    expires_at=timezone.now() + timedelta(seconds=_config()['LEASE_SECONDS']))
+            return True, record
+        except IntegrityError:
+            # Gone again if the first request failed in between, then it's claimed on the next try
+            record = IdempotencyKey.objects.filter(user=user, key=key).first()
+            if record is not None:
+                return False, record
+
+
+def _replay(record):
+    response = Response(record.response_body, status=record.status_code)
+    response['Idempotent-Replayed'] = 'true'
+    return response
+
+
+def idempotent(view_method):
+    """
+    Makes a POST handler safe to retry: a request with an Idempotency-Key
+    header runs once per user and key, and later requests with the same key
+    get the stored response back. A duplicate that arrives while the first
+    one is still running waits for its result. Server errors aren't stored,
+    so the request can be retried. Requests without the header run as before.
+    """
+
+    @functools.wraps(view_method)
+    def wrapper(self, request, *args, **kwargs):
+        key = request.headers.get(HEADER)
+        if not key:
+            return view_method(self, request, *args, **kwargs)
+        if len(key) > 255:
+            return Response({"message": f"{HEADER} must be at most 255 characters."}, status=status.HTTP_400_BAD_REQUEST)
+
+        fingerprint = _fingerprint(request)
+        deadline = time.monotonic() + _config()['WAIT_SECONDS']
+        delay = 0.05
+        claimed, record = _claim(request.user, key, fingerprint)
+        while not claimed:
+            # A stored response past its TTL, or the lease of a request that never finished
+            if record.expires_at <= timezone.now():
+                IdempotencyKey.objects.filter(pk=record.pk, expires_at=record.expires_at).delete()
+                claimed, record = _claim(request.user, key, fingerprint)
+                continue
+            if record.fingerprint != fingerprint:
+                return Response({"message": f"This {HEADER} was already used for a different request."},
+                                status=status.HTTP_422_UNPROCESSABLE_ENTITY)
+            if record.status_code is not None:
+                return _replay(record)
+            if time.monotonic() >= deadline:
+                return Response({"message": f"A request with this {HEADER} is still in progress."},
+                                status=status.HTTP_409_CONFLICT)
+            # The first request is still running, check again shortly
+            time.sleep(delay)
+            delay = min(delay * 2, 0.5)
+            current = IdempotencyKey.objects.filter(pk=record.pk).first()
+            if current is None:
+                claimed, record = _claim(request.user, key, fingerprint)
+            else:
+                record = current
+
+        # By pk: if this request outlived its lease, the key may belong to a retry by now
+        claim = IdempotencyKey.objects.filter(pk=record.pk, status_code__isnull=True)
+        try:
+            response = view_method(self, request, *args, **kwargs)
+        except BaseException:
+            claim.delete()
+            raise
+        if response.status_code >= 500:
+            claim.delete()
+        else:
+            # Stored as the renderer would encode it, so a replay is identical to the first response
+            body = json.loads(json.dumps(response.data, cls=JSONEncoder))
+            claim.update(status_code=response.status_code, response_body=body,
+                         expires_at=timezone.now() + timedelta(seconds=_config()['TTL_SECONDS']))
+        return response
+
+    return wrapper
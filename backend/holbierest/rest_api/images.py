@@ -0,0 +1,144 @@
+import atexit
+import hashlib
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+from pathlib import Path
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import close_old_connections
+from PIL import Image, ImageOps
+
+logger = logging.getLogger(__name__)
+
+DERIVED_DIR = 'menu_images/derived'
+THUMBNAIL_SIZE = (160, 160)
+RESPONSIVE_WIDTHS = (320, 640, 1024)
+FORMATS = {
+    'webp': ('WEBP', {'quality': 80, 'method': 4}),
+    'jpeg': ('JPEG', {'quality': 82, 'optimize': True, 'progressive': True}),
+}
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _save(image, name, media_root, fmt):
+    path = Path(media_root) / name
+    if path.exists():
+        # Content-hashed names: an existing file already holds these bytes
+        return
+    path.parent.mkdir(parents=True, exist_ok=True)
+    pil_format, options = FORMATS[fmt]
+    tmp_path = path.with_name(f'.{path.name}.{os.getpid()}.tmp')
+    image.save(tmp_path, pil_format, **options)
+    os.replace(tmp_path, path)
+
+
+def build_variants(source_name, media_root):
+    """
+    Writes the thumbnail and responsive variants of one uploaded image and
+    returns their manifest, or None if the file is missing or isn't an image
+    Pillow can decode. Runs in a worker process, so it only touches Pillow
+    and the filesystem, never the ORM.
+    """
+    try:
+        with open(Path(media_root) / source_name, 'rb') as f:
+            data = f.read()
+        # UnidentifiedImageError and truncated files are OSErrors
+        image = ImageOps.exif_transpose(Image.open(BytesIO(data))).convert('RGB')
+    except (OSError, Image.DecompressionBombError):
+        return None
+
+    digest = hashlib.sha256(data).hexdigest()[:16]
+
+    manifest = {'source': source_name, 'thumbnail': {}, 'srcset': {fmt: [] for fmt in FORMATS}}
+    thumbnail = ImageOps.fit(image, THUMBNAIL_SIZE, Image.LANCZOS)
+    for fmt in FORMATS:
+        name = f'{DERIVED_DIR}/{digest}-thumb.{fmt}'
+        _save(thumbnail, name, media_root, fmt)
+        manifest['thumbnail'][fmt] = name
+
+    # Never upscale: widths past the original collapse into one full-size variant
+    widths = sorted({min(width, image.width) for width in RESPONSIVE_WIDTHS})
+    for width in widths:
+        resized = image.resize((width, round(image.height * width / image.width)), Image.LANCZOS)
+        for fmt in FORMATS:
+            name = f'{DERIVED_DIR}/{digest}-{width}w.{fmt}'
+            _save(resized, name, media_root, fmt)
+            manifest['srcset'][fmt].append([width, name])
+    return manifest
+
+
+def get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            # Spawned rather than forked: a fork of the threaded server copies its locks in whatever state
+            # other threads left them. Workers only import this module, build_variants needs no app setup.
+            _executor = ProcessPoolExecutor(max_workers=settings.MENU_IMAGE_WORKERS,
+                                            mp_context=multiprocessing.get_context('spawn'))
+            atexit.register(shutdown_executor)
+        return _executor
+
+
+def shutdown_executor():
+    """Stops the pool, letting running builds finish. Queued ones are dropped, build_image_variants redoes them."""
+    global _executor
+    with _executor_lock:
+        executor, _executor = _executor, None
+    if executor is not None:
+        atexit.unregister(shutdown_executor)
+        executor.shutdown(wait=True, cancel_futures=True)
+
+
+def store_variants(menu_item_id, source_name, manifest):
+    from .models import MenuItem
+
+    if manifest is None:
+        logger.warning('Menu item %s: image %s not found or unreadable, no variants built', menu_item_id, source_name)
+        # Remember the miss so later saves of the item don't retry the same file
+        manifest = {'source': source_name, 'missing': True}
+    # Only if the item still points at the image the variants were built from
+    MenuItem.objects.filter(pk=menu_item_id, image=source_name).update(image_variants=manifest)
+
+
+def schedule_variants(menu_item_id, source_name):
+    """Builds an item's image variants in the process pool, outside the request thread."""
+    media_root = str(settings.MEDIA_ROOT)
+    if not settings.MENU_IMAGE_ASYNC:
+        store_variants(menu_item_id, source_name, build_variants(source_name, media_root))
+        return
+
+    def done(future):
+        if future.cancelled():
+            return
+        # Runs on the executor's management thread, which has its own DB connection
+        close_old_connections()
+        try:
+            store_variants(menu_item_id, source_name, future.result())
+        except Exception:
+            logger.exception('Menu item %s: building variants of %s failed', menu_item_id, source_name)
+        finally:
+            close_old_connections()
+
+    get_executor().submit(build_variants, source_name, media_root).add_done_callback(done)
+
+
+def variant_urls(manifest, request=None):
+    """The thumbnail URLs and srcset strings the serializer exposes, or None without variants."""
+    if not manifest or manifest.get('missing'):
+        return None
+
+    def url(name):
+        location = default_storage.url(name)
+        return request.build_absolute_uri(location) if request is not None else location
+
+    result = {'thumbnail': {fmt: url(name) for fmt, name in manifest['thumbnail'].items()}}
+    for fmt, entries in manifest['srcset'].items():
+        result[fmt] = ', '.join(f'{url(name)} {width}w' for width, name in entries)
+    return result
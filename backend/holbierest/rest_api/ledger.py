@@ -0,0 +1,95 @@
+from collections import defaultdict
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import F, Sum
+
+from .authentication import invalidate_user_tokens
+from .money import cents
+from .models import BalanceEntry
+
+ZERO = Decimal('0.00')
+
+
+def post_entries(entries):
+    """
+    Appends BalanceEntry rows (unsaved instances) to the ledger and moves the
+    users' cached balances by the same amounts, with one UPDATE per user that
+    adds to the stored value instead of writing back what was read.
+    """
+    entries = [entry for entry in entries if entry.bonus or entry.tip]
+    if not entries:
+        return
+    for entry in entries:
+        entry.bonus = cents(entry.bonus)
+        entry.tip = cents(entry.tip)
+    totals = defaultdict(lambda: [ZERO, ZERO])
+    for entry in entries:
+        totals[entry.user_id][0] += entry.bonus
+        totals[entry.user_id][1] += entry.tip
+
+    User = get_user_model()
+    with transaction.atomic():
+        BalanceEntry.objects.bulk_create(entries)
+        for user_id, (bonus, tip) in totals.items():
+            User.objects.filter(pk=user_id).update(bonus_earned=F('bonus_earned') + bonus, tip=F('tip') + tip)
+        # A queryset update sends no post_save, so the cached users are dropped here
+        transaction.on_commit(lambda: invalidate_user_tokens(list(totals)))
+
+
+def record_checkout(user_id, order_id, bonus_earned, bonus_redeemed, tip):
+    post_entries([
+        BalanceEntry(user_id=user_id, order_id=order_id, kind=BalanceEntry.BONUS_EARNED, bonus=bonus_earned),
+        BalanceEntry(user_id=user_id, order_id=order_id, kind=BalanceEntry.BONUS_REDEEMED, bonus=-bonus_redeemed),
+        BalanceEntry(user_id=user_id, order_id=order_id, kind=BalanceEntry.TIP_ADDED, tip=tip),
+    ])
+
+
+def transfer_tip(order_id, customer_id, crew_id):
+    """Moves the customer's whole tip balance to the delivery crew member. Returns the amount moved."""
+    User = get_user_model()
+    with transaction.atomic():
+        tip = User.objects.select_for_update().filter(pk=customer_id).values_list('tip', flat=True).first()
+        tip = cents(tip)
+        if tip <= 0:
+            return ZERO
+        post_entries([
+            BalanceEntry(user_id=customer_id, order_id=order_id, kind=BalanceEntry.TIP_SENT, tip=-tip),
+            BalanceEntry(user_id=crew_id, order_id=order_id, kind=BalanceEntry.TIP_RECEIVED, tip=tip),
+        ])
+    return tip
+
+
+def reconcile_balances(chunk_size=1000, dry_run=False, stdout=None):
+    """
+    Recomputes bonus_earned and tip from the ledger for every user, chunk
+    by chunk, and writes back the ones that drifted with bulk_update.
+    Returns the number of users whose balances differed.
+    """
+    User = get_user_model()
+    drifted = 0
+    last_id = 0
+    while True:
+        with transaction.atomic():
+            users = list(User.objects.select_for_update().filter(id__gt=last_id).order_by('id')
+                         .only('id', 'bonus_earned', 'tip')[:chunk_size])
+            if not users:
+                break
+            last_id = users[-1].id
+            sums = {user_id: (bonus, tip) for user_id, bonus, tip in
+                    BalanceEntry.objects.filter(user_id__in=[user.id for user in users]).values_list('user_id')
+                    .annotate(bonus=Sum('bonus'), tip=Sum('tip')).order_by()}
+            changed = []
+            for user in users:
+                bonus, tip = (cents(value) for value in sums.get(user.id, (0, 0)))
+                if user.bonus_earned != bonus or user.tip != tip:
+                    if stdout:
+                        stdout.write(f'User {user.id}: bonus {user.bonus_earned} -> {bonus}, tip {user.tip} -> {tip}\n')
+                    user.bonus_earned, user.tip = bonus, tip
+                    changed.append(user)
+            if changed and not dry_run:
+                User.objects.bulk_update(changed, ['bonus_earned', 'tip'])
+                transaction.on_commit(lambda ids=[user.id for user in changed]: invalidate_user_tokens(ids))
+            drifted += len(changed)
+    return drifted
@@ -0,0 +1,48 @@
+"""
+HTTP client side of benchmark_async_reads. Standard library only, so it runs
+in a spawned process of its own without setting up Django and doesn't share
+the GIL with the server it measures.
+"""
+import http.client
+import threading
+import time
+
+
+def drive(host, port, paths, concurrency):
+    """
+    GETs every path once over concurrency keep-alive connections. Returns
+    (latencies in ms, {status: count}, wall seconds); requests that failed
+    to get any response are counted under status 0.
+    """
+    latencies = []
+    statuses = {}
+    lock = threading.Lock()
+
+    def work(chunk):
+        connection = http.client.HTTPConnection(host, port, timeout=60)
+        try:
+            for path in chunk:
+                started = time.perf_counter()
+                try:
+                    connection.request('GET', path, headers={'Accept': 'application/json'})
+                    response = connection.getresponse()
+                    response.read()
+                    status = response.status
+                except (OSError, http.client.HTTPException):
+                    connection.close()
+                    connection = http.client.HTTPConnection(host, port, timeout=60)
+                    status = 0
+                elapsed = time.perf_counter() - started
+                with lock:
+                    latencies.append(elapsed * 1000)
+                    statuses[status] = statuses.get(status, 0) + 1
+        finally:
+            connection.close()
+
+    threads = [threading.Thread(target=work, args=(paths[i::concurrency],)) for i in range(concurrency)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return latencies, statuses, time.perf_counter() - started
@@ -0,0 +1,21 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from rest_api.archive import archive_after_days, archive_orders
+
+
+class Command(BaseCommand):
+    help = ('Move delivered and cancelled orders older than ORDER_ARCHIVE["AFTER_DAYS"], with their items, '
+            'into the archive tables. /api/orders reads them back for date ranges that reach that far.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, help='Archive finished orders older than this many days.')
+        parser.add_argument('--chunk-size', type=int, default=500, help='Orders moved per transaction.')
+
+    def handle(self, *args, **options):
+        days = options['days'] if options['days'] is not None else archive_after_days()
+        older_than = timezone.now() - timedelta(days=days)
+        moved = archive_orders(older_than, chunk_size=options['chunk_size'], stdout=self.stdout)
+        self.stdout.write(self.style.SUCCESS(f'Archived {moved} orders placed before {older_than:%Y-%m-%d %H:%M}.'))
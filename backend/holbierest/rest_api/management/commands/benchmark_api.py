@@ -0,0 +1,71 @@
+import os
+import tempfile
+
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+from rest_api import benchmark, testing
+
+
+class Command(BaseCommand):
+    help = ('Seed a throwaway database and benchmark every API route with concurrent clients. '
+            'Reports p50/p95/p99 latency, throughput and SQL queries per endpoint.')
+
+    def add_arguments(self, parser):
+        dataset = parser.add_argument_group('dataset')
+        dataset.add_argument('--menu-items', type=int, default=2000)
+        dataset.add_argument('--categories', type=int, default=20)
+        dataset.add_argument('--users', type=int, default=2000)
+        dataset.add_argument('--orders', type=int, default=5000)
+        dataset.add_argument('--items-per-order', type=int, default=4)
+        dataset.add_argument('--reviews', type=int, default=5000)
+        dataset.add_argument('--reservations', type=int, default=2000)
+
+        parser.add_argument('--requests', type=int, default=200, help='Requests per endpoint.')
+        parser.add_argument('--concurrency', type=int, default=8, help='Concurrent clients per endpoint.')
+        parser.add_argument('--endpoint', action='append', dest='endpoints',
+                            help='Only run this endpoint, can be repeated. Names as in rest_api.benchmark.ROUTES.')
+        parser.add_argument('--output', default='benchmark-results.json', help='Where to write the results.')
+        parser.add_argument('--baseline', help='Results file to compare against.')
+        parser.add_argument('--max-regression', type=float, default=0.2,
+                            help='Allowed p95 growth over the baseline, as a fraction (default 0.2).')
+        parser.add_argument('--database-file', help='SQLite file for the benchmark database (default: a temp file).')
+        parser.add_argument('--keepdb', action='store_true', help='Keep the seeded database for the next run.')
+
+    def handle(self, *args, **options):
+        known = {route.name for route in benchmark.ROUTES}
+        unknown = set(options['endpoints'] or []) - known
+        if unknown:
+            raise CommandError(f"Unknown endpoints: {', '.join(sorted(unknown))}")
+
+        # Seed into a separate database file so the clients' threads share it and real data is untouched
+        db_file = options['database_file'] or os.path.join(tempfile.gettempdir(), 'holbierest-benchmark.sqlite3')
+        connection.settings_dict.setdefault('TEST', {})['NAME'] = db_file
+        # So are the cache and throttle files of the running app
+        with testing.scratch_stores():
+            setup_test_environment(debug=False)
+            old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, keepdb=options['keepdb'])
+            try:
+                cache.clear()
+                data = benchmark.seed(
+                    menu_items=options['menu_items'], categories=options['categories'], users=options['users'],
+                    orders=options['orders'], items_per_order=options['items_per_order'],
+                    reviews=options['reviews'], reservations=options['reservations'], stdout=self.stdout,
+                )
+                with benchmark.unthrottled():
+                    results = benchmark.run(data, requests=options['requests'], concurrency=options['concurrency'],
+                                            only=options['endpoints'], stdout=self.stdout)
+            finally:
+                connection.creation.destroy_test_db(old_name, verbosity=0, keepdb=options['keepdb'])
+                teardown_test_environment()
+
+        benchmark.save(results, options['output'])
+        self.stdout.write(f"Results written to {options['output']}")
+
+        if options['baseline']:
+            regressions = benchmark.compare(results, benchmark.load(options['baseline']), options['max_regression'])
+            if regressions:
+                raise CommandError('Regressions against baseline:\n  ' + '\n  '.join(regressions))
+            self.stdout.write(self.style.SUCCESS('No regressions against baseline.'))
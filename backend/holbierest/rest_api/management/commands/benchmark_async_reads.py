@@ -0,0 +1,61 @@
+import importlib.util
+import os
+import tempfile
+
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+from rest_api import benchmark, testing
+
+
+class Command(BaseCommand):
+    help = ('Seed a throwaway database and compare the sync and async views of the public catalog and review '
+            'reads under uvicorn with many concurrent anonymous clients. Needs uvicorn installed.')
+
+    def add_arguments(self, parser):
+        dataset = parser.add_argument_group('dataset')
+        dataset.add_argument('--menu-items', type=int, default=2000)
+        dataset.add_argument('--categories', type=int, default=20)
+        dataset.add_argument('--users', type=int, default=500)
+        dataset.add_argument('--reviews', type=int, default=5000)
+
+        parser.add_argument('--requests', type=int, default=1000, help='Requests per endpoint and view type.')
+        parser.add_argument('--concurrency', type=int, default=64, help='Concurrent client connections.')
+        parser.add_argument('--endpoint', action='append', dest='endpoints',
+                            help='Only run this endpoint, can be repeated. Names as in rest_api.benchmark.READ_PATHS.')
+        parser.add_argument('--output', default='benchmark-async-reads.json', help='Where to write the results.')
+        parser.add_argument('--database-file', help='SQLite file for the benchmark database (default: a temp file).')
+        parser.add_argument('--keepdb', action='store_true', help='Keep the seeded database for the next run.')
+
+    def handle(self, *args, **options):
+        if importlib.util.find_spec('uvicorn') is None:
+            raise CommandError('This benchmark serves the app with uvicorn: pip install -r backend/requirements-benchmark.txt')
+        unknown = set(options['endpoints'] or []) - set(benchmark.READ_PATHS)
+        if unknown:
+            raise CommandError(f"Unknown endpoints: {', '.join(sorted(unknown))}")
+
+        db_file = options['database_file'] or os.path.join(tempfile.gettempdir(), 'holbierest-benchmark-reads.sqlite3')
+        connection.settings_dict.setdefault('TEST', {})['NAME'] = db_file
+        # The cache and throttle files of the running app are left alone too
+        with testing.scratch_stores():
+            setup_test_environment(debug=False)
+            old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, keepdb=options['keepdb'])
+            try:
+                cache.clear()
+                data = benchmark.seed(
+                    menu_items=options['menu_items'], categories=options['categories'], users=options['users'],
+                    orders=0, reviews=options['reviews'], reservations=0, stdout=self.stdout,
+                )
+                # The server threads open their own connections to the seeded file
+                connection.close()
+                results = benchmark.run_async_reads(data, requests=options['requests'],
+                                                    concurrency=options['concurrency'],
+                                                    only=options['endpoints'], stdout=self.stdout)
+            finally:
+                connection.creation.destroy_test_db(old_name, verbosity=0, keepdb=options['keepdb'])
+                teardown_test_environment()
+
+        benchmark.save(results, options['output'])
+        self.stdout.write(self.style.SUCCESS(f"Results written to {options['output']}"))
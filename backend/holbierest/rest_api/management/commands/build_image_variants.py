@@ -0,0 +1,49 @@
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from rest_api.images import build_variants
+from rest_api.models import MenuItem
+
+
+class Command(BaseCommand):
+    help = 'Build thumbnail and responsive WebP/JPEG variants for existing menu item images in parallel.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=settings.MENU_IMAGE_WORKERS)
+        parser.add_argument('--force', action='store_true', help='Rebuild items that already have variants.')
+
+    def handle(self, *args, **options):
+        items = list(MenuItem.objects.only('id', 'image', 'image_variants'))
+        if not options['force']:
+            items = [item for item in items
+                     if item.image_variants.get('source') != item.image.name or item.image_variants.get('missing')]
+
+        # Several items often share one upload (e.g. the default image), build it once
+        names = sorted({item.image.name for item in items if item.image.name})
+        media_root = str(settings.MEDIA_ROOT)
+        manifests = {}
+        with ProcessPoolExecutor(max_workers=options['workers']) as pool:
+            futures = {name: pool.submit(build_variants, name, media_root) for name in names}
+            for name, future in futures.items():
+                # One bad image must not cost the variants of all the others
+                try:
+                    manifests[name] = future.result()
+                except Exception as exc:
+                    self.stderr.write(f'Image {name!r}: building variants failed: {exc!r}')
+
+        updated = []
+        for item in items:
+            manifest = manifests.get(item.image.name)
+            if manifest is None:
+                self.stderr.write(f'Menu item {item.id}: image {item.image.name!r} not found or unreadable, skipped.')
+                continue
+            item.image_variants = manifest
+            updated.append(item)
+        with transaction.atomic():
+            MenuItem.objects.bulk_update(updated, ['image_variants'], batch_size=500)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Built variants for {len(names)} images, updated {len(updated)} menu items.'))
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from rest_api.catalog_io import FORMATS, detect_format, export_catalog
+
+
+class Command(BaseCommand):
+    help = 'Write the menu as CSV or JSON lines, in the columns import_catalog reads.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', nargs='?', help='Output file, stdout when left out.')
+        parser.add_argument('--format', choices=FORMATS, help='Defaults to the file extension, or csv.')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        file_format = options['format'] or detect_format(path, default='csv')
+        if path is None:
+            for chunk in export_catalog(file_format):
+                self.stdout.write(chunk, ending='')
+            return
+        try:
+            with open(path, 'w', encoding='utf-8', newline='') as output:
+                output.writelines(export_catalog(file_format))
+        except OSError as exc:
+            raise CommandError(f'Could not write {path}: {exc}')
+        self.stdout.write(self.style.SUCCESS(f'Exported the menu to {path}.'))
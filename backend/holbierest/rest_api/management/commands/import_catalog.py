@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from rest_api.catalog_io import FORMATS, detect_format, import_catalog
+
+
+class Command(BaseCommand):
+    help = 'Upsert categories and menu items from a CSV or JSON lines file, as written by export_catalog.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='File to import.')
+        parser.add_argument('--format', choices=FORMATS, help='Defaults to the file extension.')
+        parser.add_argument('--batch-size', type=int, default=500, help='Rows written per transaction.')
+
+    def handle(self, *args, **options):
+        file_format = options['format'] or detect_format(options['path'])
+        if file_format is None:
+            raise CommandError('Pass --format, the file extension is neither .csv nor .jsonl.')
+        try:
+            with open(options['path'], encoding='utf-8-sig', newline='') as stream:
+                result = import_catalog(stream, file_format, batch_size=options['batch_size'])
+        except (OSError, UnicodeDecodeError) as exc:
+            raise CommandError(f'Could not read {options["path"]}: {exc}')
+
+        for error in result['errors']:
+            self.stderr.write(f"Line {error['line']}: {error['errors']}")
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported menu: {result['created']} items created, {result['updated']} updated, "
+            f"{result['categories_created']} categories created, {len(result['errors'])} rows skipped."))
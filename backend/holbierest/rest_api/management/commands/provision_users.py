@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from rest_api.provisioning import FORMATS, provision_users, read_users
+
+
+class Command(BaseCommand):
+    help = ('Create users, and their Manager or Delivery Crew membership, from a JSON or CSV file. '
+            'Usernames that already exist are skipped, so the command can be rerun.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='users.json style list, or CSV with username,password,email,...,groups columns.')
+        parser.add_argument('--format', choices=FORMATS, help='Defaults to the file extension.')
+        parser.add_argument('--workers', type=int, help='Processes hashing passwords, defaults to the number of CPUs.')
+        parser.add_argument('--batch-size', type=int, default=500, help='Rows per INSERT.')
+        parser.add_argument('--skip-validation', action='store_true',
+                            help="Don't run AUTH_PASSWORD_VALIDATORS, e.g. for benchmark datasets.")
+
+    def handle(self, *args, **options):
+        path = options['path']
+        file_format = options['format'] or ('csv' if path.lower().endswith('.csv') else 'json')
+        try:
+            records = read_users(path, file_format)
+        except (OSError, UnicodeDecodeError, ValueError) as exc:
+            raise CommandError(f'Could not read {path}: {exc}')
+
+        result = provision_users(records, workers=options['workers'], batch_size=options['batch_size'],
+                                 validate=not options['skip_validation'])
+        for username, errors in result['errors']:
+            self.stderr.write(f"{username or '(no username)'}: {' '.join(errors)}")
+        self.stdout.write(self.style.SUCCESS(
+            f"Provisioned users: {result['created']} created, {result['skipped']} already existed, "
+            f"{len(result['errors'])} rejected."))
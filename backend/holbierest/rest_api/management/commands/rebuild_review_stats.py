@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from rest_api.ratings import rebuild_rating_stats
+
+
+class Command(BaseCommand):
+    help = 'Recompute the denormalized review stats (count, average, histogram) of every menu item.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            count = rebuild_rating_stats(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt review stats for {count} menu items.'))
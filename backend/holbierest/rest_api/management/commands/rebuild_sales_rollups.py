@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from rest_api.analytics import rebuild_sales_rollups
+
+
+class Command(BaseCommand):
+    help = 'Recompute the daily sales rollups behind /api/analytics/sales from the order history.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=1000, help='Orders read per query.')
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            days, lines = rebuild_sales_rollups(chunk_size=options['chunk_size'], stdout=self.stdout)
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt sales rollups: {days} days, {lines} menu item rows.'))
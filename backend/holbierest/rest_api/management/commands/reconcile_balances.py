@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from rest_api.ledger import reconcile_balances
+
+
+class Command(BaseCommand):
+    help = 'Recompute every user\'s bonus_earned and tip from the balance ledger and fix the ones that drifted.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=1000, help='Users checked per transaction.')
+        parser.add_argument('--dry-run', action='store_true', help='Only report the users whose balances differ.')
+
+    def handle(self, *args, **options):
+        drifted = reconcile_balances(chunk_size=options['chunk_size'], dry_run=options['dry_run'], stdout=self.stdout)
+        action = 'would be fixed' if options['dry_run'] else 'fixed'
+        self.stdout.write(self.style.SUCCESS(f'Reconciled balances: {drifted} users {action}.'))
@@ -0,0 +1,120 @@
+import contextvars
+import json
+import logging
+import random
+import time
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connection
+from rest_framework import serializers
+
+logger = logging.getLogger('rest_api.profiling')
+
+_current_profile = contextvars.ContextVar('rest_api_request_profile', default=None)
+
+
+class RequestProfile:
+
+    def __init__(self, slowest):
+        self.slowest = slowest
+        self.query_count = 0
+        self.query_time = 0.0
+        self.queries = []  # (duration, sql), only the slowest few are kept
+        self.serialize_time = 0.0
+        self.serializing = False
+
+    def record_query(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = time.perf_counter() - started
+            self.query_count += 1
+            self.query_time += duration
+            self.queries.append((duration, sql))
+            if len(self.queries) > self.slowest:
+                self.queries.remove(min(self.queries))
+
+
+def _timed_data(prop):
+    def data(self):
+        profile = _current_profile.get()
+        # Nested serializers run inside the outer .data, only the outermost call is timed
+        if profile is None or profile.serializing:
+            return prop.fget(self)
+        profile.serializing = True
+        started = time.perf_counter()
+        try:
+            return prop.fget(self)
+        finally:
+            profile.serialize_time += time.perf_counter() - started
+            profile.serializing = False
+    data._profiled = True
+    return property(data)
+
+
+def _install_serializer_timing():
+    for cls in (serializers.Serializer, serializers.ListSerializer):
+        prop = cls.__dict__['data']
+        if not getattr(prop.fget, '_profiled', False):
+            cls.data = _timed_data(prop)
+
+
+class RequestProfilingMiddleware:
+    """
+    Opt-in per-request profiling, configured by settings.REQUEST_PROFILING.
+    Adds a Server-Timing header to every response: total time, SQL time and
+    count, DRF serialization (serializer.data) and the view without
+    serialization. A JSON log line with the slowest queries goes to the
+    rest_api.profiling logger for a sample of requests and every slow one.
+    """
+
+    def __init__(self, get_response):
+        config = getattr(settings, 'REQUEST_PROFILING', {})
+        if not config.get('ENABLED', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.sample_rate = config.get('SAMPLE_RATE', 0.01)
+        self.slow_request_ms = config.get('SLOW_REQUEST_MS', 500)
+        self.slowest_queries = config.get('SLOWEST_QUERIES', 3)
+        _install_serializer_timing()
+
+    def __call__(self, request):
+        profile = RequestProfile(self.slowest_queries)
+        token = _current_profile.set(profile)
+        started = time.perf_counter()
+        try:
+            with connection.execute_wrapper(profile.record_query):
+                response = self.get_response(request)
+        finally:
+            _current_profile.reset(token)
+        total_ms = (time.perf_counter() - started) * 1000
+
+        db_ms = profile.query_time * 1000
+        serialize_ms = profile.serialize_time * 1000
+        response['Server-Timing'] = ', '.join([
+            f'total;dur={total_ms:.1f}',
+            f'db;dur={db_ms:.1f};desc="{profile.query_count} queries"',
+            f'serialize;dur={serialize_ms:.1f}',
+            f'view;dur={total_ms - serialize_ms:.1f};desc="excl. serialization"',
+        ])
+
+        slow = total_ms >= self.slow_request_ms
+        if slow or random.random() < self.sample_rate:
+            logger.info(json.dumps({
+                'method': request.method,
+                'path': request.get_full_path(),
+                'status': response.status_code,
+                'slow': slow,
+                'total_ms': round(total_ms, 1),
+                'view_ms': round(total_ms - serialize_ms, 1),
+                'serialize_ms': round(serialize_ms, 1),
+                'db_ms': round(db_ms, 1),
+                'queries': profile.query_count,
+                'slowest_queries': [
+                    {'ms': round(duration * 1000, 1), 'sql': sql[:500]}
+                    for duration, sql in sorted(profile.queries, reverse=True)
+                ],
+            }))
+        return response
@@ -0,0 +1,70 @@
+from django.db import migrations
+
+# SQLite FTS5 index over menu item and category titles. The triggers keep it in
+# sync for every write path (API, admin, bulk updates, raw SQL). Other database
+# backends skip it and MenuItemSearchFilter falls back to icontains lookups.
+
+FORWARD_SQL = [
+    """
+    CREATE VIRTUAL TABLE rest_api_menuitem_fts USING fts5(
+        title, category_title, tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3'
+    )
+    """,
+    """
+    INSERT INTO rest_api_menuitem_fts (rowid, title, category_title)
+    SELECT m.id, m.title, c.title
+    FROM rest_api_menuitem m JOIN rest_api_category c ON c.id = m.category_id
+    """,
+    """
+    CREATE TRIGGER rest_api_menuitem_fts_insert AFTER INSERT ON rest_api_menuitem BEGIN
+        INSERT INTO rest_api_menuitem_fts (rowid, title, category_title)
+        SELECT new.id, new.title, title FROM rest_api_category WHERE id = new.category_id;
+    END
+    """,
+    """
+    CREATE TRIGGER rest_api_menuitem_fts_update AFTER UPDATE OF title, category_id ON rest_api_menuitem BEGIN
+        DELETE FROM rest_api_menuitem_fts WHERE rowid = old.id;
+        INSERT INTO rest_api_menuitem_fts (rowid, title, category_title)
+        SELECT new.id, new.title, title FROM rest_api_category WHERE id = new.category_id;
+    END
+    """,
+    """
+    CREATE TRIGGER rest_api_menuitem_fts_delete AFTER DELETE ON rest_api_menuitem BEGIN
+        DELETE FROM rest_api_menuitem_fts WHERE rowid = old.id;
+    END
+    """,
+    """
+    CREATE TRIGGER rest_api_category_fts_update AFTER UPDATE OF title ON rest_api_category BEGIN
+        UPDATE rest_api_menuitem_fts SET category_title = new.title
+        WHERE rowid IN (SELECT id FROM rest_api_menuitem WHERE category_id = new.id);
+    END
+    """,
+]
+
+REVERSE_SQL = [
+    'DROP TRIGGER IF EXISTS rest_api_category_fts_update',
+    'DROP TRIGGER IF EXISTS rest_api_menuitem_fts_delete',
+    'DROP TRIGGER IF EXISTS rest_api_menuitem_fts_update',
+    'DROP TRIGGER IF EXISTS rest_api_menuitem_fts_insert',
+    'DROP TABLE IF EXISTS rest_api_menuitem_fts',
+]
+
+
+def run_sqlite(statements):
+    def run(apps, schema_editor):
+        if schema_editor.connection.vendor != 'sqlite':
+            return
+        for statement in statements:
+            schema_editor.execute(statement)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rest_api', '0002_sitesettings'),
+    ]
+
+    operations = [
+        migrations.RunPython(run_sqlite(FORWARD_SQL), run_sqlite(REVERSE_SQL)),
+    ]
@@ -0,0 +1,84 @@
+# Generated by Django 5.1.1 on 2026-10-18 11:12
+
+from django.db import migrations, models
+from django.db.models import Count, Q, Sum
+
+SEARCH_TRIGGERS = (
+    'rest_api_menuitem_fts_insert',
+    'rest_api_menuitem_fts_update',
+    'rest_api_menuitem_fts_delete',
+    'rest_api_category_fts_update',
+)
+
+
+def drop_search_triggers(apps, schema_editor):
+    # SQLite won't rebuild the menu item table for the new columns while the FTS triggers
+    # from 0003 point at it. rest_api.search reinstalls them after every migrate.
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for name in SEARCH_TRIGGERS:
+        schema_editor.execute(f'DROP TRIGGER IF EXISTS {name}')
+
+
+def compute_rating_stats(apps, schema_editor):
+    MenuItem = apps.get_model('rest_api', 'MenuItem')
+    Review = apps.get_model('rest_api', 'Review')
+    histogram = {f'rating_{rating}': Count('id', filter=Q(rating=rating)) for rating in range(1, 6)}
+    rows = (Review.objects.order_by().values('menu_item_id')
+            .annotate(rating_count=Count('id'), rating_sum=Sum('rating'), **histogram))
+    for row in rows:
+        menu_item_id = row.pop('menu_item_id')
+        row['rating_average'] = row['rating_sum'] / row['rating_count']
+        MenuItem.objects.filter(pk=menu_item_id).update(**row)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rest_api', '0003_menuitem_search_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(drop_search_triggers, migrations.RunPython.noop),
+        migrations.AddField(
+            model_name='menuitem',
+            name='rating_1',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='menuitem',
+            name='rating_2',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='menuitem',
+            name='rating_3',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='menuitem',
+            name='rating_4',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='menuitem',
+            name='rating_5',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='menuitem',
+            name='rating_average',
+            field=models.FloatField(db_index=True, default=0),
+        ),
+        migrations.AddField(
+            model_name='menuitem',
+            name='rating_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='menuitem',
+            name='rating_sum',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(compute_rating_stats, migrations.RunPython.noop),
+    ]
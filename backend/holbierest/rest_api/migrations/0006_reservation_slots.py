@@ -0,0 +1,77 @@
+# Generated by Django 5.1.1 on 2026-10-18 11:25
+
+import datetime
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def assign_reservation_slots(apps, schema_editor):
+    SiteSettings = apps.get_model('rest_api', 'SiteSettings')
+    ReservationSlot = apps.get_model('rest_api', 'ReservationSlot')
+    Reservation = apps.get_model('rest_api', 'Reservation')
+    site_settings = SiteSettings.objects.filter(id=1).first() or SiteSettings()
+    opening = site_settings.opening_time.hour * 60 + site_settings.opening_time.minute
+    length = site_settings.reservation_slot_minutes
+
+    # Existing reservations keep their time even outside opening hours or past capacity
+    slots = {}
+    reservations = list(Reservation.objects.all())
+    for reservation in reservations:
+        minutes = reservation.time.hour * 60 + reservation.time.minute
+        start = max(opening + (minutes - opening) // length * length, 0)
+        key = (reservation.date, datetime.time(start // 60, start % 60))
+        slot = slots.get(key)
+        if slot is None:
+            slot = slots[key] = ReservationSlot.objects.create(date=key[0], start_time=key[1])
+        slot.booked_guests += reservation.number_of_guests
+        reservation.slot = slot
+    ReservationSlot.objects.bulk_update(slots.values(), ['booked_guests'], batch_size=500)
+    Reservation.objects.bulk_update(reservations, ['slot'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rest_api', '0005_menuitem_image_variants'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='sitesettings',
+            name='closing_time',
+            field=models.TimeField(default=datetime.time(22, 0)),
+        ),
+        migrations.AddField(
+            model_name='sitesettings',
+            name='opening_time',
+            field=models.TimeField(default=datetime.time(10, 0)),
+        ),
+        migrations.AddField(
+            model_name='sitesettings',
+            name='reservation_slot_capacity',
+            field=models.PositiveIntegerField(default=40),
+        ),
+        migrations.AddField(
+            model_name='sitesettings',
+            name='reservation_slot_minutes',
+            field=models.PositiveSmallIntegerField(default=30),
+        ),
+        migrations.CreateModel(
+            name='ReservationSlot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('start_time', models.TimeField()),
+                ('booked_guests', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('date', 'start_time'), name='unique_reservation_slot')],
+            },
+        ),
+        migrations.AddField(
+            model_name='reservation',
+            name='slot',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='reservations', to='rest_api.reservationslot'),
+        ),
+        migrations.RunPython(assign_reservation_slots, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,81 @@
+# Generated by Django 5.1.1 on 2026-10-18 11:38
+
+import django.db.models.deletion
+from collections import defaultdict
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def build_sales_rollups(apps, schema_editor):
+    # Same as rest_api.analytics.rebuild_sales_rollups, on the historical models
+    Order = apps.get_model('rest_api', 'Order')
+    OrderItem = apps.get_model('rest_api', 'OrderItem')
+    DailySales = apps.get_model('rest_api', 'DailySales')
+    DailyItemSales = apps.get_model('rest_api', 'DailyItemSales')
+    days = defaultdict(lambda: [0, Decimal(0)])
+    lines = {}
+    order_days = {}
+    for order_id, date, total in Order.objects.exclude(status='CANCELLED').values_list('id', 'date', 'total').iterator():
+        order_days[order_id] = day = timezone.localdate(date)
+        days[day][0] += 1
+        days[day][1] += total
+    items = OrderItem.objects.values_list('order_id', 'menuitem_id', 'menuitem__category_id', 'quantity', 'price')
+    for order_id, menuitem_id, category_id, quantity, price in items.iterator():
+        if order_id in order_days:
+            line = lines.setdefault((order_days[order_id], menuitem_id), [category_id, 0, Decimal(0)])
+            line[1] += quantity
+            line[2] += price
+
+    def periods(day):
+        return {'date': day, 'week': day - timedelta(days=day.weekday()), 'month': day.replace(day=1)}
+
+    DailySales.objects.bulk_create(
+        [DailySales(**periods(day), order_count=count, revenue=revenue) for day, (count, revenue) in days.items()],
+        batch_size=500)
+    DailyItemSales.objects.bulk_create(
+        [DailyItemSales(**periods(day), menuitem_id=menuitem_id, category_id=category_id,
+                        quantity=quantity, revenue=revenue)
+         for (day, menuitem_id), (category_id, quantity, revenue) in lines.items()],
+        batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rest_api', '0007_composite_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailySales',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(unique=True)),
+                ('week', models.DateField()),
+                ('month', models.DateField()),
+                ('order_count', models.PositiveIntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='DailyItemSales',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('week', models.DateField()),
+                ('month', models.DateField()),
+                ('quantity', models.PositiveIntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('category', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='rest_api.category')),
+                ('menuitem', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='rest_api.menuitem')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['date', 'category'], name='itemsales_date_category_idx')],
+                'unique_together': {('date', 'menuitem')},
+            },
+        ),
+        migrations.RunPython(build_sales_rollups, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 5.1.1 on 2026-10-18 12:40
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Q
+
+
+def open_balances(apps, schema_editor):
+    # The balances so far become each user's first ledger entry
+    CustomUser = apps.get_model('rest_api', 'CustomUser')
+    BalanceEntry = apps.get_model('rest_api', 'BalanceEntry')
+    users = CustomUser.objects.filter(~Q(bonus_earned=0) | ~Q(tip=0)).values_list('id', 'bonus_earned', 'tip')
+    BalanceEntry.objects.bulk_create(
+        (BalanceEntry(user_id=user_id, kind='OPENING', bonus=bonus, tip=tip) for user_id, bonus, tip in users.iterator()),
+        batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rest_api', '0010_idempotency_keys'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BalanceEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('OPENING', 'Opening balance'), ('BONUS_EARNED', 'Bonus earned'), ('BONUS_REDEEMED', 'Bonus redeemed'), ('TIP_ADDED', 'Tip added'), ('TIP_SENT', 'Tip sent to delivery crew'), ('TIP_RECEIVED', 'Tip received')], max_length=20)),
+                ('bonus', models.DecimalField(decimal_places=2, default=0, max_digits=10)),
+                ('tip', models.DecimalField(decimal_places=2, default=0, max_digits=10)),
+                ('order_id', models.BigIntegerField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='balance_entries', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user', 'created_at'], name='balanceentry_user_created_idx')],
+            },
+        ),
+        migrations.RunPython(open_balances, migrations.RunPython.noop),
+    ]
@@ -1,9 +1,18 @@
+import datetime
+
 from django.db import models
 from django.conf import settings
 from django.contrib.auth.models import AbstractUser
 
+from .catalog import bump_catalog_version_on_commit
+
 class SiteSettings(models.Model):
     bonus_percentage = models.DecimalField(max_digits=4, decimal_places=2, default=2.0)  # Default to 2%
+    # Reservations are booked into fixed slots starting at opening_time
+    opening_time = models.TimeField(default=datetime.time(10, 0))
+    closing_time = models.TimeField(default=datetime.time(22, 0))
+    reservation_slot_minutes = models.PositiveSmallIntegerField(default=30)
+    reservation_slot_capacity = models.PositiveIntegerField(default=40)  # Guests seated per slot
     class Meta:
         verbose_name = "Site Setting"
         verbose_name_plural = "Site Settings"
@@ -21,9 +30,35 @@ class CustomUser(AbstractUser):
     def __str__(self):
         return self.username
 
+class CatalogQuerySet(models.QuerySet):
+    # Bulk writes skip the model signals, so they bump the catalog version themselves
+
+    def update(self, **kwargs):
+        rows = super().update(**kwargs)
+        bump_catalog_version_on_commit()
+        return rows
+
+    def delete(self):
+        result = super().delete()
+        bump_catalog_version_on_commit()
+        return result
+
+    def bulk_create(self, objs, *args, **kwargs):
+        objs = super().bulk_create(objs, *args, **kwargs)
+        bump_catalog_version_on_commit()
+        return objs
+
+    def bulk_update(self, objs, fields, *args, **kwargs):
+        rows = super().bulk_update(objs, fields, *args, **kwargs)
+        bump_catalog_version_on_commit()
+        return rows
+
+
 class Category(models.Model):
     slug = models.SlugField()
     title = models.CharField(max_length=255, db_index=True)
+
+    objects = CatalogQuerySet.as_manager()
     
     def __str__(self):
         return self.title
@@ -35,9 +70,27 @@ class MenuItem(models.Model):
     featured = models.BooleanField(db_index=True)
     category = models.ForeignKey(Category, on_delete=models.PROTECT)
     image = models.ImageField(upload_to='menu_images/', default='default_image.jpg')
+    # Thumbnail and responsive variants of image, written by rest_api.images
+    image_variants = models.JSONField(default=dict, blank=True, editable=False)
+
+    # Review stats, maintained incrementally by rest_api.ratings
+    rating_count = models.PositiveIntegerField(default=0)
+    rating_sum = models.PositiveIntegerField(default=0)
+    rating_average = models.FloatField(default=0, db_index=True)
+    rating_1 = models.PositiveIntegerField(default=0)
+    rating_2 = models.PositiveIntegerField(default=0)
+    rating_3 = models.PositiveIntegerField(default=0)
+    rating_4 = models.PositiveIntegerField(default=0)
+    rating_5 = models.PositiveIntegerField(default=0)
+
+    objects = CatalogQuerySet.as_manager()
     
     class Meta:
         ordering = ['category']
+        indexes = [
+            # Cursor pagination over (category, price, id)
+            models.Index(fields=['category', 'price'], name='menuitem_category_price_idx'),
+        ]
         
     def __str__(self):
         return self.title
@@ -50,6 +103,11 @@ class Review(models.Model):
     comment = models.TextField(blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['menu_item', 'created_at'], name='review_item_created_idx'),
+        ]
+
     def __str__(self):
         return f'Review for {self.menu_item} by {self.user}'
 
@@ -62,7 +120,8 @@ class Cart(models.Model):
     price = models.DecimalField(max_digits=6, decimal_places=2)
 
     class Meta:
-        unique_together = ('menuitem', 'user')
+        # User first: every cart query filters on the user, most of them on the menu item as well
+        unique_together = ('user', 'menuitem')
         
     def __str__(self):
         return f'{self.menuitem.title} - user: {self.user.username}'
@@ -81,6 +140,16 @@ class Order(models.Model):
     status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='PENDING')
     total = models.DecimalField(max_digits=6, decimal_places=2, default=0)
     date = models.DateTimeField(auto_now_add=True)  # Use DateTimeField
+
+    class Meta:
+        # Ascending indexes: SQLite walks them backwards for ORDER BY date DESC, id DESC
+        indexes = [
+            models.Index(fields=['date'], name='order_date_idx'),
+            models.Index(fields=['user', 'date'], name='order_user_date_idx'),
+            models.Index(fields=['delivery_crew', 'date'], name='order_crew_date_idx'),
+            # Crew load counts by status, and the dispatch backlog is READY orders without crew by date
+            models.Index(fields=['delivery_crew', 'status', 'date'], name='order_crew_status_date_idx'),
+        ]
     
     def __str__(self):
         return f'username:{self.user.username} order_id{self.id}'
@@ -101,13 +170,158 @@ class OrderItem(models.Model):
     
     from django.db import models
 
+
+class ArchivedOrder(models.Model):
+    # A finished order moved out of Order by the archive_orders command, keeping its id.
+    # Same field names as Order, so OrderSerializer renders both.
+    id = models.BigIntegerField(primary_key=True)
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='archived_orders')
+    delivery_crew = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, related_name='archived_deliveries', null=True)
+    status = models.CharField(max_length=10, choices=Order.STATUS_CHOICES)
+    total = models.DecimalField(max_digits=6, decimal_places=2, default=0)
+    date = models.DateTimeField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['date'], name='archivedorder_date_idx'),
+            models.Index(fields=['user', 'date'], name='archivedorder_user_date_idx'),
+            models.Index(fields=['delivery_crew', 'date'], name='archivedorder_crew_date_idx'),
+        ]
+
+    def __str__(self):
+        return f"username:{self.user.username} archived order_id{self.id}"
+
+
+class ArchivedOrderItem(models.Model):
+    order = models.ForeignKey(ArchivedOrder, on_delete=models.CASCADE, related_name='order')
+    menuitem = models.ForeignKey(MenuItem, on_delete=models.CASCADE)
+    quantity = models.SmallIntegerField()
+    price = models.DecimalField(max_digits=6, decimal_places=2)
+
+    class Meta:
+        unique_together = ('order', 'menuitem')
+
+    def __str__(self):
+        return f'{self.menuitem_id} - archived order_id:{self.order_id}'
+
+
+class BalanceEntry(models.Model):
+    # One change to a user's bonus or tip balance. CustomUser.bonus_earned and tip are the
+    # running sums of these, kept up to date by rest_api.ledger in the same transaction.
+    OPENING = 'OPENING'
+    BONUS_EARNED = 'BONUS_EARNED'
+    BONUS_REDEEMED = 'BONUS_REDEEMED'
+    TIP_ADDED = 'TIP_ADDED'
+    TIP_SENT = 'TIP_SENT'
+    TIP_RECEIVED = 'TIP_RECEIVED'
+    KIND_CHOICES = [
+        (OPENING, 'Opening balance'),
+        (BONUS_EARNED, 'Bonus earned'),
+        (BONUS_REDEEMED, 'Bonus redeemed'),
+        (TIP_ADDED, 'Tip added'),
+        (TIP_SENT, 'Tip sent to delivery crew'),
+        (TIP_RECEIVED, 'Tip received'),
+    ]
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='balance_entries')
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    bonus = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    tip = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    # Not a foreign key, so entries keep pointing at orders after they are archived
+    order_id = models.BigIntegerField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'created_at'], name='balanceentry_user_created_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} for user {self.user_id}: bonus {self.bonus}, tip {self.tip}"
+
+
+class IdempotencyKey(models.Model):
+    # A client's Idempotency-Key for a POST and the response it got, replayed to retries until expires_at.
+    # status_code is null while the first request is still running, expires_at is then the end of its lease.
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='idempotency_keys')
+    key = models.CharField(max_length=255)
+    fingerprint = models.CharField(max_length=64)  # Method, path and body of the first request
+    status_code = models.PositiveSmallIntegerField(null=True, blank=True)
+    response_body = models.JSONField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField(db_index=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'key'], name='unique_idempotency_key'),
+        ]
+
+    def __str__(self):
+        return f"{self.key} ({self.status_code or 'in progress'})"
+
+
+class DailySales(models.Model):
+    # Rollup of the orders placed on a (local) day, cancelled orders excluded.
+    # week and month hold the first day of the day's week/month, to group reports by them.
+    date = models.DateField(unique=True)
+    week = models.DateField()
+    month = models.DateField()
+    order_count = models.PositiveIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+
+    def __str__(self):
+        return f"{self.date}: {self.order_count} orders, {self.revenue} revenue"
+
+
+class DailyItemSales(models.Model):
+    date = models.DateField()
+    week = models.DateField()
+    month = models.DateField()
+    menuitem = models.ForeignKey(MenuItem, on_delete=models.CASCADE)
+    # The item's category when it was sold
+    category = models.ForeignKey(Category, on_delete=models.CASCADE)
+    quantity = models.PositiveIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+
+    class Meta:
+        unique_together = ('date', 'menuitem')
+        indexes = [
+            models.Index(fields=['date', 'category'], name='itemsales_date_category_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.date}: {self.quantity} x {self.menuitem_id}"
+
+
+class ReservationSlot(models.Model):
+    date = models.DateField()
+    start_time = models.TimeField()
+    booked_guests = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['date', 'start_time'], name='unique_reservation_slot'),
+        ]
+
+    def __str__(self):
+        return f"{self.date} {self.start_time}: {self.booked_guests} guests booked"
+
+
 class Reservation(models.Model):
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, null=True, related_name='reservations')
+    slot = models.ForeignKey(ReservationSlot, on_delete=models.PROTECT, null=True, blank=True, editable=False, related_name='reservations')
     date = models.DateField()
     time = models.TimeField()
     phone_number = models.CharField(max_length=15)
     number_of_guests = models.PositiveIntegerField()
     message = models.TextField(blank=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['date', 'time'], name='reservation_date_time_idx'),
+            models.Index(fields=['user', 'date', 'time'], name='reservation_user_date_idx'),
+        ]
+
     def __str__(self):
         return f"Reservation on {self.date} at {self.time} for {self.number_of_guests} guests"
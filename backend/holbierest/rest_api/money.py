@@ -0,0 +1,8 @@
+from decimal import ROUND_HALF_UP, Decimal
+
+CENTS = Decimal('0.01')
+
+
+def cents(value):
+    """Rounds an amount to cents. SQLite sums decimals as floats, so aggregates come back with float noise."""
+    return Decimal(value or 0).quantize(CENTS, rounding=ROUND_HALF_UP)
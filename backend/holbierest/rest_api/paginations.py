@@ -1,7 +1,157 @@
+import base64
+import json
+
+from asgiref.sync import sync_to_async
+from django.core.paginator import InvalidPage
+from django.db.models import Q
 from rest_framework import pagination
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+async def apaginate_page_number(paginator, queryset, request, view=None):
+    """
+    PageNumberPagination.paginate_queryset for async views: the same page
+    numbers, page size and errors, with the count and the page's rows read
+    through the async ORM.
+    """
+    paginator.request = request
+    page_size = paginator.get_page_size(request)
+    if not page_size:
+        return None
+
+    django_paginator = paginator.django_paginator_class(queryset, page_size)
+    django_paginator.count = await queryset.acount()
+    page_number = paginator.get_page_number(request, django_paginator)
+    try:
+        paginator.page = django_paginator.page(page_number)
+    except InvalidPage as exc:
+        raise NotFound(paginator.invalid_page_message.format(page_number=page_number, message=str(exc)))
+    if django_paginator.num_pages > 1 and paginator.template is not None:
+        paginator.display_page_controls = True
+
+    paginator.page.object_list = [obj async for obj in paginator.page.object_list]
+    return list(paginator.page)
+
+
+async def apaginate_queryset(paginator, queryset, request, view=None):
+    if hasattr(paginator, 'apaginate_queryset'):
+        return await paginator.apaginate_queryset(queryset, request, view)
+    if isinstance(paginator, pagination.PageNumberPagination):
+        return await apaginate_page_number(paginator, queryset, request, view)
+    return await sync_to_async(paginator.paginate_queryset)(queryset, request, view)
+
 
 class CustomPagination(pagination.PageNumberPagination):
     page_size = 8
     page_size_query_param = 'page_size'
     max_page_size = 40
-    page_query_param = 'p'
\ No newline at end of file
+    page_query_param = 'p'
+
+
+class KeysetPagination(pagination.PageNumberPagination):
+    """
+    Page-number pagination by default. Clients opt in to keyset pagination per
+    request with ?pagination=cursor, then follow the "next" link, which seeks
+    past the last row on the view's keyset_ordering instead of using OFFSET.
+    The ordering must end with a unique field, e.g. ('-date', '-id'). In that
+    mode ?ordering= may only flip the direction of the keyset; any other
+    ordering is rejected with 400 rather than silently ignored.
+    """
+    mode_query_param = 'pagination'
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.keyset_mode = self.is_keyset_request(request)
+        if not self.keyset_mode:
+            return super().paginate_queryset(queryset, request, view)
+        return self.set_keyset_page(list(self.keyset_queryset(queryset, request, view)))
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        self.keyset_mode = self.is_keyset_request(request)
+        if not self.keyset_mode:
+            return await apaginate_page_number(self, queryset, request, view)
+        return self.set_keyset_page([obj async for obj in self.keyset_queryset(queryset, request, view)])
+
+    def is_keyset_request(self, request):
+        return (request.query_params.get(self.mode_query_param) == 'cursor'
+                or self.cursor_query_param in request.query_params)
+
+    def keyset_queryset(self, queryset, request, view):
+        # One row past the page tells whether there is a next one
+        self.request = request
+        self.ordering = self.get_keyset_ordering(request, view)
+        self.keyset_page_size = self.get_page_size(request)
+
+        queryset = queryset.order_by(*self.ordering)
+        position = self.decode_cursor(request, queryset.model)
+        if position is not None:
+            queryset = queryset.filter(self.seek_filter(position))
+        return queryset[:self.keyset_page_size + 1]
+
+    def set_keyset_page(self, results):
+        self.has_next = len(results) > self.keyset_page_size
+        self.page = results[:self.keyset_page_size]
+        return self.page
+
+    def get_paginated_response(self, data):
+        if not self.keyset_mode:
+            return super().get_paginated_response(data)
+        return Response({
+            'next': self.get_next_link(),
+            'results': data,
+        })
+
+    def get_next_link(self):
+        if not self.keyset_mode:
+            return super().get_next_link()
+        if not self.has_next:
+            return None
+        last = self.page[-1]
+        values = [getattr(last, field.lstrip('-')) for field in self.ordering]
+        url = self.request.build_absolute_uri()
+        url = replace_query_param(url, self.mode_query_param, 'cursor')
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(values))
+
+    def get_keyset_ordering(self, request, view):
+        ordering = list(getattr(view, 'keyset_ordering', ('id',)))
+        requested = [field.strip() for field in request.query_params.get('ordering', '').split(',') if field.strip()]
+        if not requested:
+            return ordering
+        # An ?ordering= on the leading keyset field picks the direction for the whole key
+        prefix = '-' if requested[0].startswith('-') else ''
+        directed = [prefix + field.lstrip('-') for field in ordering]
+        if requested != directed[:len(requested)]:
+            keys = ', '.join(f"'{field}'" for field in (directed[0].lstrip('-'), '-' + directed[0].lstrip('-')))
+            raise ValidationError({'ordering': [f'Cursor pagination can only be ordered by {keys}.']})
+        return directed
+
+    def seek_filter(self, position):
+        # (a, b, c) > (x, y, z)  ==  a > x  OR  (a = x AND b > y)  OR  (a = x AND b = y AND c > z)
+        condition = Q()
+        equal = {}
+        for field, value in zip(self.ordering, position):
+            name = field.lstrip('-')
+            lookup = 'lt' if field.startswith('-') else 'gt'
+            condition |= Q(**equal, **{f'{name}__{lookup}': value})
+            equal[name] = value
+        return condition
+
+    def encode_cursor(self, values):
+        raw = json.dumps([str(value) for value in values])
+        return base64.urlsafe_b64encode(raw.encode()).decode()
+
+    def decode_cursor(self, request, model):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            values = json.loads(base64.urlsafe_b64decode(encoded.encode()).decode())
+            fields = [model._meta.get_field(field.lstrip('-')) for field in self.ordering]
+            if len(values) != len(fields):
+                raise ValueError
+            return [field.to_python(value) for field, value in zip(fields, values)]
+        except Exception:
+            raise NotFound(self.invalid_cursor_message)
@@ -1,5 +1,7 @@
 from rest_framework import permissions
 
+from .roles import is_delivery_crew, is_manager
+
 
 class IsManagerMemberOrAdmin(permissions.BasePermission):
 
@@ -8,12 +10,12 @@ class IsManagerMemberOrAdmin(permissions.BasePermission):
         if request.user and request.user.is_superuser:
             return True
         
-        if request.user and request.user.groups.filter(name="Manager").exists():
+        if request.user and is_manager(request.user):
             return True
         
 class IsDeliveryCrew(permissions.BasePermission):
 
     def has_permission(self, request, view):
         
-        if request.user and request.user.groups.filter(name="Delivery crew").exists():
+        if request.user and is_delivery_crew(request.user):
             return True
@@ -0,0 +1,144 @@
+import csv
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import Group
+from django.contrib.auth.password_validation import validate_password
+from django.core.exceptions import ValidationError
+from django.db import transaction
+
+from .dispatch import dispatcher
+from .roles import DELIVERY_CREW, MANAGER
+
+FORMATS = ('json', 'csv')
+FIELDS = ('username', 'email', 'first_name', 'last_name', 'phone_number', 'address')
+# Groups a file may create if they don't exist yet, other group names must exist already
+ROLE_GROUPS = (MANAGER, DELIVERY_CREW)
+
+
+def read_users(path, file_format):
+    """
+    Reads user records from a JSON list (like users.json) or a CSV file with
+    a header row. Groups are a list in JSON and separated by ";" in CSV.
+    """
+    with open(path, encoding='utf-8-sig', newline='') as stream:
+        if file_format == 'json':
+            records = json.load(stream)
+        else:
+            records = list(csv.DictReader(stream))
+    for record in records:
+        groups = record.get('groups') or []
+        if isinstance(groups, str):
+            groups = [name.strip() for name in groups.split(';') if name.strip()]
+        record['groups'] = groups
+    return records
+
+
+def _setup_worker():
+    # Spawned workers start without the app registry, forked ones already have it
+    import django
+    django.setup()
+
+
+def _hash(args):
+    password, attributes, validate = args
+    if validate:
+        try:
+            validate_password(password, get_user_model()(**attributes))
+        except ValidationError as exc:
+            return None, exc.messages
+    return make_password(password), None
+
+
+def _check(record, groups):
+    User = get_user_model()
+    errors = [f'{name} is required.' for name in ('username', 'password') if not record.get(name)]
+    for name in ('username', 'email'):
+        if record.get(name):
+            try:
+                User._meta.get_field(name).run_validators(record[name])
+            except ValidationError as exc:
+                errors.extend(f'{name}: {message}' for message in exc.messages)
+    unknown = [name for name in record['groups'] if name not in groups and name not in ROLE_GROUPS]
+    if unknown:
+        errors.append(f"Unknown groups: {', '.join(unknown)}.")
+    return errors
+
+
+def _existing_usernames(usernames, chunk_size=500):
+    User = get_user_model()
+    existing = set()
+    for start in range(0, len(usernames), chunk_size):
+        chunk = usernames[start:start + chunk_size]
+        existing.update(User.objects.filter(username__in=chunk).values_list('username', flat=True))
+    return existing
+
+
+def provision_users(records, workers=None, batch_size=500, validate=True):
+    """
+    Creates the users in records that don't exist yet, with their group
+    memberships. Passwords are validated and hashed in a process pool, users
+    and group links are written with bulk inserts in one transaction.
+    Returns the counts of created and skipped users and the errors of
+    records that were rejected, as (username, messages) pairs.
+    """
+    User = get_user_model()
+    groups = dict(Group.objects.values_list('name', 'id'))
+    result = {'created': 0, 'skipped': 0, 'errors': []}
+
+    existing = _existing_usernames([record.get('username') for record in records if record.get('username')])
+    new, seen = [], set()
+    for record in records:
+        username = record.get('username')
+        if username in existing or username in seen:
+            result['skipped'] += 1
+            continue
+        errors = _check(record, groups)
+        if errors:
+            result['errors'].append((username, errors))
+            continue
+        seen.add(username)
+        new.append(record)
+
+    # PBKDF2 is the slow part, so it is spread over the cores
+    jobs = [(record['password'], {name: record.get(name) or '' for name in FIELDS}, validate) for record in new]
+    workers = workers or os.cpu_count() or 1
+    if workers > 1 and len(jobs) > 1:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_setup_worker) as pool:
+            hashes = list(pool.map(_hash, jobs, chunksize=max(1, len(jobs) // (workers * 4))))
+    else:
+        hashes = [_hash(job) for job in jobs]
+
+    users, memberships = [], []
+    for record, (password, errors) in zip(new, hashes):
+        if errors:
+            result['errors'].append((record['username'], errors))
+            continue
+        attributes = {name: record[name] for name in FIELDS if record.get(name)}
+        users.append(User(**attributes, password=password))
+        memberships.extend((record['username'], name) for name in record['groups'])
+
+    with transaction.atomic():
+        for name in {name for _, name in memberships} - groups.keys():
+            groups[name] = Group.objects.create(name=name).id
+        User.objects.bulk_create(users, batch_size=batch_size)
+        ids = {}
+        for start in range(0, len(users), batch_size):
+            chunk = [user.username for user in users[start:start + batch_size]]
+            ids.update(User.objects.filter(username__in=chunk).values_list('username', 'id'))
+        # Bulk inserts send no m2m_changed; new users have no cached roles to drop
+        field = User.groups.field
+        Membership = User.groups.through
+        Membership.objects.bulk_create(
+            [Membership(**{f'{field.m2m_field_name()}_id': ids[username],
+                           f'{field.m2m_reverse_field_name()}_id': groups[name]})
+             for username, name in memberships],
+            batch_size=batch_size)
+        if any(name == DELIVERY_CREW for _, name in memberships):
+            transaction.on_commit(dispatcher.invalidate)
+
+    result['created'] = len(users)
+    return result
@@ -0,0 +1,72 @@
+from django.db.models import Case, Count, F, FloatField, Q, Sum, Value, When
+from django.db.models.functions import Cast
+
+from .models import MenuItem, Review
+
+RATINGS = range(1, 6)
+HISTOGRAM_FIELDS = [f'rating_{rating}' for rating in RATINGS]
+
+
+def apply_rating_change(menu_item_id, added=None, removed=None):
+    """
+    Adjusts a menu item's review stats for one review being added, removed or
+    re-rated, in a single UPDATE built from F() expressions.
+    """
+    count_delta = (added is not None) - (removed is not None)
+    sum_delta = (added or 0) - (removed or 0)
+    count = F('rating_count') + count_delta
+    total = F('rating_sum') + sum_delta
+
+    changes = {
+        'rating_count': count,
+        'rating_sum': total,
+        # Right-hand sides see the old row, so the average uses the new count and sum directly
+        'rating_average': Case(
+            When(rating_count=-count_delta, then=Value(0.0)),
+            default=Cast(total, FloatField()) / Cast(count, FloatField()),
+            output_field=FloatField(),
+        ),
+    }
+    histogram = {}
+    if added is not None:
+        histogram[added] = histogram.get(added, 0) + 1
+    if removed is not None:
+        histogram[removed] = histogram.get(removed, 0) - 1
+    for rating, delta in histogram.items():
+        if delta:
+            changes[f'rating_{rating}'] = F(f'rating_{rating}') + delta
+
+    MenuItem.objects.filter(pk=menu_item_id).update(**changes)
+
+
+def compute_rating_stats():
+    """Yields (menu_item_id, stats) for every menu item that has reviews."""
+    aggregates = {f'rating_{rating}': Count('id', filter=Q(rating=rating)) for rating in RATINGS}
+    rows = (Review.objects.order_by().values('menu_item_id')
+            .annotate(rating_count=Count('id'), rating_sum=Sum('rating'), **aggregates))
+    for row in rows.iterator():
+        menu_item_id = row.pop('menu_item_id')
+        row['rating_average'] = row['rating_sum'] / row['rating_count']
+        yield menu_item_id, row
+
+
+def rebuild_rating_stats(batch_size=500):
+    """Recomputes every menu item's review stats from the Review table. Returns the number of items updated."""
+    fields = ['rating_count', 'rating_sum', 'rating_average'] + HISTOGRAM_FIELDS
+    stats = dict(compute_rating_stats())
+    empty = dict.fromkeys(fields, 0)
+
+    count = 0
+    batch = []
+    for item in MenuItem.objects.only('id').iterator(chunk_size=batch_size):
+        for field, value in stats.get(item.id, empty).items():
+            setattr(item, field, value)
+        batch.append(item)
+        if len(batch) == batch_size:
+            MenuItem.objects.bulk_update(batch, fields)
+            count += len(batch)
+            batch = []
+    if batch:
+        MenuItem.objects.bulk_update(batch, fields)
+        count += len(batch)
+    return count
@@ -0,0 +1,91 @@
+import datetime
+
+from django.db.models import F
+
+from .models import ReservationSlot
+from .sitesettings import get_site_settings
+
+
+class SlotUnavailable(Exception):
+    """The requested slot is outside opening hours or has too few free seats."""
+
+
+def _minutes(value):
+    return value.hour * 60 + value.minute
+
+
+def _time(minutes):
+    return datetime.time(minutes // 60, minutes % 60)
+
+
+def slot_times(site_settings=None):
+    """The start times of the day's slots, from opening_time up to closing_time."""
+    site_settings = site_settings or get_site_settings()
+    length = site_settings.reservation_slot_minutes
+    opening, closing = _minutes(site_settings.opening_time), _minutes(site_settings.closing_time)
+    return [_time(start) for start in range(opening, closing, length)]
+
+
+def slot_start(time, site_settings=None):
+    """The start of the slot a reservation time falls into."""
+    site_settings = site_settings or get_site_settings()
+    opening, closing = _minutes(site_settings.opening_time), _minutes(site_settings.closing_time)
+    minutes = _minutes(time)
+    if not opening <= minutes < closing:
+        raise SlotUnavailable(
+            f'Reservations are taken between {site_settings.opening_time:%H:%M} and {site_settings.closing_time:%H:%M}.')
+    length = site_settings.reservation_slot_minutes
+    return _time(opening + (minutes - opening) // length * length)
+
+
+def book(date, time, guests):
+    """
+    Books guests into the slot of date/time and returns the slot. The
+    increment is a conditional UPDATE, so concurrent bookings can never push a
+    slot past its capacity. Call inside a transaction with the reservation save.
+    """
+    site_settings = get_site_settings()
+    start = slot_start(time, site_settings)
+    capacity = site_settings.reservation_slot_capacity
+    if guests > capacity:
+        raise SlotUnavailable(f'At most {capacity} guests can be seated per slot.')
+
+    slot, created = ReservationSlot.objects.get_or_create(
+        date=date, start_time=start, defaults={'booked_guests': guests})
+    if not created:
+        booked = ReservationSlot.objects.filter(pk=slot.pk, booked_guests__lte=capacity - guests).update(
+            booked_guests=F('booked_guests') + guests)
+        if not booked:
+            raise SlotUnavailable(f'Not enough free seats at {start:%H:%M} on {date}.')
+    return slot
+
+
+def release(slot_id, guests):
+    if slot_id is not None:
+        ReservationSlot.objects.filter(pk=slot_id, booked_guests__gte=guests).update(
+            booked_guests=F('booked_guests') - guests)
+
+
+def availability(date_from, date_to):
+    """
+    Free seats for every slot between date_from and date_to (inclusive), read
+    with one range query over the (date, start_time) index.
+    """
+    site_settings = get_site_settings()
+    capacity = site_settings.reservation_slot_capacity
+    booked = {
+        (date, start): guests for date, start, guests in
+        ReservationSlot.objects.filter(date__range=(date_from, date_to))
+        .values_list('date', 'start_time', 'booked_guests')
+    }
+    times = slot_times(site_settings)
+    days = []
+    date = date_from
+    while date <= date_to:
+        slots = []
+        for start in times:
+            guests = booked.get((date, start), 0)
+            slots.append({'time': start.strftime('%H:%M'), 'booked': guests, 'free': max(capacity - guests, 0)})
+        days.append({'date': date.isoformat(), 'slots': slots})
+        date += datetime.timedelta(days=1)
+    return {'slot_minutes': site_settings.reservation_slot_minutes, 'capacity': capacity, 'days': days}
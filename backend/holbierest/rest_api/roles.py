@@ -0,0 +1,56 @@
+from django.core.cache import cache
+
+MANAGER = 'Manager'
+DELIVERY_CREW = 'Delivery Crew'
+
+ROLES_KEY_PREFIX = 'rest_api:roles:'
+ROLES_GENERATION_KEY = 'rest_api:roles:generation'
+ROLES_TIMEOUT = 60 * 60
+
+
+def _roles_key(user_id):
+    # Renaming or deleting a group bumps the generation, which drops every cached role set at once
+    generation = cache.get_or_set(ROLES_GENERATION_KEY, 1, timeout=None)
+    return f'{ROLES_KEY_PREFIX}{generation}:{user_id}'
+
+
+def get_roles(user):
+    """
+    Returns the names of the user's groups. They are resolved once per request
+    (memoized on the user instance) and shared across requests through the cache.
+    """
+    if not user or not user.is_authenticated:
+        return frozenset()
+    roles = getattr(user, '_rest_api_roles', None)
+    if roles is None:
+        key = _roles_key(user.pk)
+        roles = cache.get(key)
+        if roles is None:
+            roles = frozenset(user.groups.values_list('name', flat=True))
+            cache.set(key, roles, ROLES_TIMEOUT)
+        user._rest_api_roles = roles
+    return roles
+
+
+def is_manager(user):
+    return MANAGER in get_roles(user)
+
+
+def is_delivery_crew(user):
+    return DELIVERY_CREW in get_roles(user)
+
+
+def is_customer(user):
+    # Customers are users without any group
+    return not get_roles(user)
+
+
+def invalidate_roles(user_ids):
+    cache.delete_many([_roles_key(user_id) for user_id in user_ids])
+
+
+def invalidate_all_roles():
+    try:
+        cache.incr(ROLES_GENERATION_KEY)
+    except ValueError:
+        cache.set(ROLES_GENERATION_KEY, 2, timeout=None)
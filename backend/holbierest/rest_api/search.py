@@ -0,0 +1,102 @@
+import re
+
+from django.db import connection, connections
+from django.db.models.expressions import RawSQL
+from rest_framework.filters import SearchFilter
+
+MENU_SEARCH_TABLE = 'rest_api_menuitem_fts'
+
+# Keep the index in sync for every write path (API, admin, bulk updates, raw SQL).
+# SQLite refuses to rebuild a table other triggers point at, and migrations
+# rebuild tables for most schema changes, so the triggers are dropped before
+# migrate runs and reinstalled afterwards.
+SEARCH_TRIGGERS = {
+    'rest_api_menuitem_fts_insert': """
+        CREATE TRIGGER IF NOT EXISTS rest_api_menuitem_fts_insert AFTER INSERT ON rest_api_menuitem BEGIN
+            INSERT INTO rest_api_menuitem_fts (rowid, title, category_title)
+            SELECT new.id, new.title, title FROM rest_api_category WHERE id = new.category_id;
+        END
+    """,
+    'rest_api_menuitem_fts_update': """
+        CREATE TRIGGER IF NOT EXISTS rest_api_menuitem_fts_update
+        AFTER UPDATE OF title, category_id ON rest_api_menuitem BEGIN
+            DELETE FROM rest_api_menuitem_fts WHERE rowid = old.id;
+            INSERT INTO rest_api_menuitem_fts (rowid, title, category_title)
+            SELECT new.id, new.title, title FROM rest_api_category WHERE id = new.category_id;
+        END
+    """,
+    'rest_api_menuitem_fts_delete': """
+        CREATE TRIGGER IF NOT EXISTS rest_api_menuitem_fts_delete AFTER DELETE ON rest_api_menuitem BEGIN
+            DELETE FROM rest_api_menuitem_fts WHERE rowid = old.id;
+        END
+    """,
+    'rest_api_category_fts_update': """
+        CREATE TRIGGER IF NOT EXISTS rest_api_category_fts_update AFTER UPDATE OF title ON rest_api_category BEGIN
+            UPDATE rest_api_menuitem_fts SET category_title = new.title
+            WHERE rowid IN (SELECT id FROM rest_api_menuitem WHERE category_id = new.id);
+        END
+    """,
+}
+
+
+def drop_search_triggers(using='default'):
+    connection = connections[using]
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        for name in SEARCH_TRIGGERS:
+            cursor.execute(f'DROP TRIGGER IF EXISTS {name}')
+
+
+def install_search_index(using='default'):
+    """Installs the sync triggers and reindexes every menu item."""
+    connection = connections[using]
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        if MENU_SEARCH_TABLE not in connection.introspection.table_names(cursor):
+            return
+        for sql in SEARCH_TRIGGERS.values():
+            cursor.execute(sql)
+        cursor.execute(f'DELETE FROM {MENU_SEARCH_TABLE}')
+        cursor.execute(
+            f'INSERT INTO {MENU_SEARCH_TABLE} (rowid, title, category_title) '
+            'SELECT m.id, m.title, c.title FROM rest_api_menuitem m '
+            'JOIN rest_api_category c ON c.id = m.category_id'
+        )
+
+
+class MenuItemSearchFilter(SearchFilter):
+    """
+    Full-text ?search= for menu items, backed by the FTS5 index from
+    migration 0003. Every word is matched as a prefix (so partial words from
+    the search box match), all words must match, and results are ranked by
+    BM25 with title hits weighted above category hits. An explicit ?ordering=
+    still wins because OrderingFilter runs afterwards.
+    """
+    title_weight = 10.0
+    category_weight = 2.0
+
+    def get_match_expression(self, request, view):
+        tokens = []
+        for term in self.get_search_terms(request):
+            tokens += re.findall(r'\w+', term)
+        return ' '.join(f'"{token}"*' for token in tokens)
+
+    def filter_queryset(self, request, queryset, view):
+        if connection.vendor != 'sqlite':
+            return super().filter_queryset(request, queryset, view)
+
+        match = self.get_match_expression(request, view)
+        if not match:
+            return queryset
+
+        table = MENU_SEARCH_TABLE
+        model_table = queryset.model._meta.db_table
+        matching_ids = RawSQL(f'SELECT rowid FROM {table} WHERE {table} MATCH %s', (match,))
+        rank = RawSQL(
+            f'SELECT bm25({table}, %s, %s) FROM {table} '
+            f'WHERE {table} MATCH %s AND {table}.rowid = {model_table}.id',
+            (self.title_weight, self.category_weight, match),
+        )
+        return queryset.filter(id__in=matching_ids).annotate(search_rank=rank).order_by('search_rank', 'id')
@@ -3,6 +3,7 @@ from djoser.serializers import UserSerializer as DjoserUserSerializer
 from django.contrib.auth import get_user_model
 from decimal import Decimal
 
+from .images import variant_urls
 from .models import Category, MenuItem, Cart, Order, OrderItem, Reservation, Review, CustomUser
 
 
@@ -24,10 +25,22 @@ class MenuItemSerializer(serializers.ModelSerializer):
     category = serializers.PrimaryKeyRelatedField(
         queryset=Category.objects.all()
     )
+    rating = serializers.SerializerMethodField()
+    image_srcset = serializers.SerializerMethodField()
     # category = CategorySerializer(read_only=True)
     class Meta:
         model = MenuItem
-        fields = ['id', 'title', 'price', 'category', 'featured', 'image']
+        fields = ['id', 'title', 'price', 'category', 'featured', 'image', 'image_srcset', 'rating']
+
+    def get_image_srcset(self, obj):
+        return variant_urls(obj.image_variants, self.context.get('request'))
+
+    def get_rating(self, obj):
+        return {
+            'average': round(obj.rating_average, 2),
+            'count': obj.rating_count,
+            'histogram': {rating: getattr(obj, f'rating_{rating}') for rating in range(1, 6)},
+        }
 
 
 class CartSerializer(serializers.ModelSerializer):
@@ -0,0 +1,158 @@
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import Group
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_init, post_migrate, post_save, pre_migrate
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from .authentication import invalidate_user_tokens, token_cache
+from .catalog import bump_catalog_version_on_commit
+from .models import Category, MenuItem, Order, Reservation, Review, SiteSettings
+from .dispatch import ACTIVE_STATUSES, dispatcher, record_load_change
+from .images import schedule_variants
+from .ratings import apply_rating_change
+from .reservations import release
+from .search import drop_search_triggers, install_search_index
+from .roles import invalidate_all_roles, invalidate_roles
+from .sitesettings import invalidate_site_settings
+
+User = get_user_model()
+
+
+@receiver([post_save, post_delete], sender=Category)
+@receiver([post_save, post_delete], sender=MenuItem)
+def invalidate_catalog(sender, **kwargs):
+    bump_catalog_version_on_commit()
+
+
+@receiver(post_save, sender=MenuItem)
+def build_image_variants(sender, instance, raw=False, **kwargs):
+    name = instance.image.name
+    if raw or not name or instance.image_variants.get('source') == name:
+        return
+    transaction.on_commit(lambda: schedule_variants(instance.pk, name))
+
+
+@receiver(pre_migrate)
+def remove_search_triggers(sender, using, **kwargs):
+    if sender.name == 'rest_api':
+        drop_search_triggers(using)
+
+
+@receiver(post_migrate)
+def restore_search_index(sender, using, **kwargs):
+    if sender.name == 'rest_api':
+        install_search_index(using)
+
+
+@receiver(m2m_changed, sender=User.groups.through)
+def invalidate_group_membership(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if not reverse:
+        # user.groups.add(...) / admin user form
+        instance.__dict__.pop('_rest_api_roles', None)
+        user_ids = [instance.pk]
+    elif action == 'post_clear':
+        user_ids = None
+    else:
+        # group.user_set.add(...) as in GroupViewSet and DeliveryCrewViewSet
+        user_ids = list(pk_set)
+
+    # Only once committed, or another worker could cache the old membership again in between
+    def invalidate():
+        if user_ids is None:
+            invalidate_all_roles()
+        else:
+            invalidate_roles(user_ids)
+        # The set of delivery crew may have changed
+        dispatcher.invalidate()
+    transaction.on_commit(invalidate)
+
+
+@receiver(post_save, sender=User)
+def invalidate_cached_user(sender, instance, created, raw=False, **kwargs):
+    # Password changes, deactivation and balance updates must not be served from the token cache
+    if not created and not raw:
+        transaction.on_commit(lambda: invalidate_user_tokens([instance.pk]))
+
+
+@receiver(post_delete, sender=Token)
+def invalidate_cached_token(sender, instance, **kwargs):
+    # token/logout, and tokens deleted along with their user. The key is the pk, which delete() clears
+    key = instance.key
+    transaction.on_commit(lambda: token_cache.invalidate([key]))
+
+
+@receiver([post_save, post_delete], sender=Group)
+def invalidate_group(sender, **kwargs):
+    transaction.on_commit(invalidate_all_roles)
+    transaction.on_commit(dispatcher.invalidate)
+
+
+@receiver([post_save, post_delete], sender=SiteSettings)
+def reload_site_settings(sender, **kwargs):
+    # Once committed, or a worker could reload the old row and keep it under the new version
+    transaction.on_commit(invalidate_site_settings)
+
+
+@receiver(post_init, sender=Review)
+def remember_review_rating(sender, instance, **kwargs):
+    # What the stored row counts towards, so edits can move it between items and stars
+    # Read from __dict__ so deferred fields don't trigger a query per loaded review
+    if instance.pk is None:
+        instance._counted_rating = None
+    else:
+        instance._counted_rating = (instance.__dict__.get('menu_item_id'), instance.__dict__.get('rating'))
+
+
+@receiver(post_save, sender=Review)
+def count_review(sender, instance, created, **kwargs):
+    counted = instance._counted_rating
+    current = (instance.menu_item_id, instance.rating)
+    if counted == current or (counted is not None and None in counted):
+        return
+    if counted is None:
+        apply_rating_change(instance.menu_item_id, added=instance.rating)
+    elif counted[0] == instance.menu_item_id:
+        apply_rating_change(instance.menu_item_id, added=instance.rating, removed=counted[1])
+    else:
+        apply_rating_change(counted[0], removed=counted[1])
+        apply_rating_change(instance.menu_item_id, added=instance.rating)
+    instance._counted_rating = current
+
+
+@receiver(post_delete, sender=Review)
+def uncount_review(sender, instance, **kwargs):
+    if instance._counted_rating is not None:
+        menu_item_id, rating = instance._counted_rating
+        apply_rating_change(menu_item_id, removed=rating)
+
+
+@receiver(post_delete, sender=Reservation)
+def release_reservation_slot(sender, instance, **kwargs):
+    # Also covers reservations deleted along with their user
+    release(instance.slot_id, instance.number_of_guests)
+
+
+@receiver(post_init, sender=Order)
+def remember_order_load(sender, instance, **kwargs):
+    # The crew member the stored row counts as active load for, if any
+    state = instance.__dict__
+    if instance.pk is not None and state.get('status') in ACTIVE_STATUSES:
+        instance._counted_crew = state.get('delivery_crew_id')
+    else:
+        instance._counted_crew = None
+
+
+@receiver(post_save, sender=Order)
+def update_crew_load(sender, instance, raw=False, **kwargs):
+    current = instance.delivery_crew_id if instance.status in ACTIVE_STATUSES else None
+    if not raw and current != instance._counted_crew:
+        record_load_change({instance._counted_crew: -1, current: 1})
+    instance._counted_crew = current
+
+
+@receiver(post_delete, sender=Order)
+def remove_crew_load(sender, instance, **kwargs):
+    record_load_change({instance._counted_crew: -1})
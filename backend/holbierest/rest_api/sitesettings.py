@@ -0,0 +1,39 @@
+import threading
+import time
+from decimal import Decimal
+
+from django.core.cache import cache
+
+from .caching import get_version
+from .models import SiteSettings
+
+SITE_SETTINGS_VERSION_KEY = 'rest_api:sitesettings:version'
+# Edits that bypass the signals (queryset.update(), the shell) show up at the latest after this
+SITE_SETTINGS_TIMEOUT = 5 * 60
+
+_lock = threading.Lock()
+_loaded = {'version': None, 'settings': None}
+
+
+def get_site_settings():
+    """
+    Returns the SiteSettings singleton from a process-local copy. Each call
+    only compares the copy against a version number in the shared cache,
+    which changes once a save or delete of the row commits and also expires
+    after SITE_SETTINGS_TIMEOUT seconds; either way each worker reloads the
+    row on its next call. Treat the returned instance as read-only.
+    """
+    version = get_version(SITE_SETTINGS_VERSION_KEY, SITE_SETTINGS_TIMEOUT)
+
+    if _loaded['version'] != version:
+        with _lock:
+            if _loaded['version'] != version:
+                _loaded['settings'], created = SiteSettings.objects.get_or_create(
+                    id=1, defaults={'bonus_percentage': Decimal('2.0')})
+                # Creating the row bumped the version through post_save
+                _loaded['version'] = cache.get(SITE_SETTINGS_VERSION_KEY) if created else version
+    return _loaded['settings']
+
+
+def invalidate_site_settings():
+    cache.set(SITE_SETTINGS_VERSION_KEY, time.time_ns(), SITE_SETTINGS_TIMEOUT)
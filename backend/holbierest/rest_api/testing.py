@@ -0,0 +1,36 @@
+import contextlib
+import os
+import tempfile
+
+from django.conf import settings
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+
+@contextlib.contextmanager
+def scratch_stores():
+    """
+    Points the shared cache and the throttle buckets at files in a temporary
+    directory, so test and benchmark runs never read or clear the ones the
+    running app uses.
+    """
+    with tempfile.TemporaryDirectory() as directory:
+        overrides = {'THROTTLE_STORE': {**settings.THROTTLE_STORE, 'PATH': os.path.join(directory, 'throttle.sqlite3')}}
+        default = settings.CACHES['default']
+        if default['BACKEND'] == 'rest_api.caching.SQLiteCache':
+            overrides['CACHES'] = {**settings.CACHES,
+                                   'default': {**default, 'LOCATION': os.path.join(directory, 'cache.sqlite3')}}
+        with override_settings(**overrides):
+            yield directory
+
+
+class TestRunner(DiscoverRunner):
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self._stores = contextlib.ExitStack()
+        self._stores.enter_context(scratch_stores())
+
+    def teardown_test_environment(self, **kwargs):
+        self._stores.close()
+        super().teardown_test_environment(**kwargs)
@@ -1,3 +1,1371 @@
-from django.test import TestCase
+import asyncio
+import datetime
+import functools
+import json
+import os
+import shutil
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+from io import BytesIO, StringIO
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import Group
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.test import AsyncRequestFactory, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from PIL import Image
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APITestCase, force_authenticate
+
+from .models import ArchivedOrder, ArchivedOrderItem, BalanceEntry, Cart, Category, DailyItemSales, IdempotencyKey, MenuItem, Order, OrderItem, Reservation, Review, SiteSettings
+from . import images
+from .analytics import record_order
+from .catalog_io import aexport_catalog
+from .authentication import TokenCache, _cache_key, invalidate_user_tokens, token_cache_stats
+from .views import CategoriesView, MenuExportView, MenuItemsView, ReviewListCreateView, SingleMenuItemView
+from .events import InProcessBroker, SQLiteBroker
+from .ledger import post_entries
+from .sitesettings import SITE_SETTINGS_VERSION_KEY, get_site_settings
+
+User = get_user_model()
+
+
+class CatalogCacheTests(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.category = Category.objects.create(slug='drinks', title='Drinks')
+        MenuItem.objects.create(title='Cola', price=Decimal('2.00'), featured=False, category=self.category)
+
+    def test_if_none_match_returns_304_without_queries(self):
+        response = self.client.get('/api/menu-items', {'category': self.category.id, 'page': 1})
+        etag = response['ETag']
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/menu-items', {'category': self.category.id, 'page': 1},
+                                       HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(len(queries), 0)
+
+    def test_empty_params_share_a_cache_entry(self):
+        first = self.client.get('/api/menu-items?category=&search=&page=1')
+        second = self.client.get('/api/menu-items?page=1')
+        self.assertEqual(first['ETag'], second['ETag'])
+
+    def test_writes_invalidate_cached_pages(self):
+        etag = self.client.get('/api/categories')['ETag']
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Category.objects.create(slug='desserts', title='Desserts')
+            # The version only moves once the write is committed
+            self.assertEqual(self.client.get('/api/categories')['ETag'], etag)
+        response = self.client.get('/api/categories', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['count'], 2)
+
+        etag = response['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            MenuItem.objects.filter(category=self.category).update(price=Decimal('2.50'))
+        self.assertNotEqual(self.client.get('/api/categories')['ETag'], etag)
+
+
+class KeysetPaginationTests(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='customer', password='pass')
+        self.client.force_authenticate(self.user)
+        self.orders = [Order.objects.create(user=self.user, total=Decimal('10.00')) for _ in range(14)]
+
+    def test_cursor_pages_walk_every_order_once(self):
+        url = '/api/orders?pagination=cursor&ordering=-date'
+        seen = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertNotIn('count', response.data)
+            seen += [order['id'] for order in response.data['results']]
+            url = response.data['next']
+        expected = sorted(self.orders, key=lambda order: (order.date, order.id), reverse=True)
+        self.assertEqual(seen, [order.id for order in expected])
+
+    def test_page_number_mode_is_the_default(self):
+        response = self.client.get('/api/orders', {'page': 2, 'ordering': '-date'})
+        self.assertEqual(response.data['count'], 14)
+        self.assertEqual(len(response.data['results']), 6)
+
+    def test_invalid_cursor_is_rejected(self):
+        response = self.client.get('/api/orders', {'cursor': 'garbage'})
+        self.assertEqual(response.status_code, 404)
+
+    def test_cursor_mode_rejects_orderings_off_the_keyset(self):
+        response = self.client.get('/api/orders', {'pagination': 'cursor', 'ordering': 'date'})
+        self.assertEqual(response.status_code, 200)
+        ids = [order['id'] for order in response.data['results']]
+        self.assertEqual(ids, [order.id for order in self.orders[:len(ids)]])
+        for url, ordering in (('/api/orders', 'total'), ('/api/orders', '-date,total'),
+                              ('/api/menu-items', '-price'), ('/api/menu-items', 'rating_average')):
+            response = self.client.get(url, {'pagination': 'cursor', 'ordering': ordering})
+            self.assertEqual(response.status_code, 400, (url, ordering))
+            self.assertIn('ordering', response.data)
+        # Page-number mode still takes them
+        self.assertEqual(self.client.get('/api/menu-items', {'ordering': '-price'}).status_code, 200)
+
+
+class CheckoutTests(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='customer', password='pass', bonus_earned=Decimal('5.00'))
+        self.client.force_authenticate(self.user)
+        category = Category.objects.create(slug='mains', title='Mains')
+        self.items = [
+            MenuItem.objects.create(title=f'Dish {i}', price=Decimal('10.00'), featured=False, category=category)
+            for i in range(10)
+        ]
+
+    def fill_cart(self, count):
+        for item in self.items[:count]:
+            Cart.objects.create(user=self.user, menuitem=item, quantity=2,
+                                unit_price=item.price, price=item.price * 2)
+
+    def test_checkout_moves_cart_into_order_and_updates_balances(self):
+        self.fill_cart(3)
+        response = self.client.post('/api/orders', {'bonus_used': '5.00', 'tip': '3.00'})
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['total_after_bonus'], Decimal('55.00'))
+        self.assertEqual(len(response.data['orderitem']), 3)
+
+        order = Order.objects.get()
+        self.assertEqual(order.total, Decimal('60.00'))
+        self.assertEqual(OrderItem.objects.filter(order=order).count(), 3)
+        self.assertFalse(Cart.objects.filter(user=self.user).exists())
+
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.bonus_earned, Decimal('1.10'))  # 2% of 55.00
+        self.assertEqual(self.user.tip, Decimal('3.00'))
+
+    def test_checkout_total_is_kept_in_cents(self):
+        for item, price in zip(self.items, ['12.34', '7.11', '3.33']):
+            Cart.objects.create(user=self.user, menuitem=item, quantity=1, unit_price=price, price=price)
+        response = self.client.post('/api/orders')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(Order.objects.get().total, Decimal('22.78'))
+
+    def test_checkout_rejects_more_bonus_than_available(self):
+        self.fill_cart(1)
+        response = self.client.post('/api/orders', {'bonus_used': '6.00'})
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Order.objects.exists())
+
+    def test_checkout_inserts_order_items_in_one_statement(self):
+        self.fill_cart(10)
+        with CaptureQueriesContext(connection) as queries:
+            self.client.post('/api/orders')
+        inserts = [q for q in queries if q['sql'].startswith('INSERT INTO "rest_api_orderitem"')]
+        self.assertEqual(len(inserts), 1)
+        self.assertEqual(OrderItem.objects.count(), 10)
+
+    def test_checkout_query_count_does_not_grow_with_cart(self):
+        get_site_settings()
+        self.fill_cart(2)
+        with CaptureQueriesContext(connection) as small:
+            self.client.post('/api/orders')
+        self.user.refresh_from_db()
+        self.fill_cart(10)
+        with CaptureQueriesContext(connection) as large:
+            self.client.post('/api/orders')
+        self.assertEqual(len(small), len(large))
+
+
+class ListQueryCountTests(APITestCase):
+    """Each list endpoint loads its page with a fixed number of queries, whatever the page holds."""
+
+    def setUp(self):
+        cache.clear()
+        self.manager = User.objects.create_user(username='manager', password='pass')
+        self.manager.groups.add(Group.objects.create(name='Manager'))
+        self.customer = User.objects.create_user(username='customer', password='pass')
+        self.customer.groups.add(Group.objects.create(name='Regulars'))
+        category = Category.objects.create(slug='mains', title='Mains')
+        self.items = [
+            MenuItem.objects.create(title=f'Dish {i}', price=Decimal('10.00'), featured=False, category=category)
+            for i in range(6)
+        ]
+
+    def add_orders(self, count):
+        for _ in range(count):
+            order = Order.objects.create(user=self.customer, total=Decimal('30.00'))
+            for item in self.items[:3]:
+                OrderItem.objects.create(order=order, menuitem=item, quantity=1, price=item.price)
+
+    def count_queries(self, url, user=None):
+        self.client.force_authenticate(user)
+        self.client.get(url)  # Warm the per-user caches so only the page itself is counted
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def test_orders(self):
+        self.add_orders(1)
+        one = self.count_queries('/api/orders', self.manager)
+        self.add_orders(5)
+        self.assertEqual(self.count_queries('/api/orders', self.manager), one)
+
+    def test_reviews(self):
+        item = self.items[0]
+        Review.objects.create(user=self.customer, menu_item=item, rating=5)
+        one = self.count_queries(f'/api/menu-items/{item.id}/reviews')
+        for rating in range(1, 6):
+            Review.objects.create(user=self.manager, menu_item=item, rating=rating)
+        self.assertEqual(self.count_queries(f'/api/menu-items/{item.id}/reviews'), one)
+
+    def test_cart(self):
+        Cart.objects.create(user=self.customer, menuitem=self.items[0], quantity=1, unit_price=10, price=10)
+        one = self.count_queries('/api/cart/menu-items', self.customer)
+        for item in self.items[1:]:
+            Cart.objects.create(user=self.customer, menuitem=item, quantity=1, unit_price=10, price=10)
+        self.assertEqual(self.count_queries('/api/cart/menu-items', self.customer), one)
+
+
+class RoleCacheTests(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.manager = User.objects.create_user(username='manager', password='pass')
+        self.manager.groups.add(Group.objects.create(name='Manager'))
+        self.courier = User.objects.create_user(username='courier', password='pass')
+        Group.objects.create(name='Delivery Crew')
+
+    def get_as(self, user, url):
+        # A fresh instance per request, like the authentication backends produce
+        self.client.force_authenticate(User.objects.get(pk=user.pk))
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(url)
+        return [q['sql'] for q in queries if 'auth_group' in q['sql']]
+
+    def test_roles_are_resolved_once_and_shared_between_requests(self):
+        self.assertEqual(len(self.get_as(self.manager, '/api/reservations')), 1)
+        self.assertEqual(self.get_as(self.manager, '/api/reservations'), [])
+
+    def test_membership_changes_invalidate_cached_roles(self):
+        self.get_as(self.courier, '/api/orders')
+        self.client.force_authenticate(self.manager)
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            response = self.client.post('/api/groups/delivery-crew/users', {'username': 'courier'})
+            self.assertEqual(response.status_code, 200)
+            # The cached roles stay until the membership is committed
+            self.assertEqual(self.get_as(self.courier, '/api/reservations'), [])
+        self.assertEqual(len(callbacks), 1)
+
+        order = Order.objects.create(user=self.manager, delivery_crew=self.courier, total=Decimal('5.00'))
+        self.client.force_authenticate(User.objects.get(pk=self.courier.pk))
+        response = self.client.get('/api/orders')
+        self.assertEqual([o['id'] for o in response.data['results']], [order.id])
+
+
+class SiteSettingsTests(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+
+    def test_settings_are_read_once_until_changed(self):
+        self.assertEqual(get_site_settings().bonus_percentage, Decimal('2.0'))
+        with CaptureQueriesContext(connection) as queries:
+            get_site_settings()
+        self.assertEqual(len(queries), 0)
+
+        settings = SiteSettings.objects.get(id=1)
+        settings.bonus_percentage = Decimal('5.00')
+        with self.captureOnCommitCallbacks(execute=True):
+            settings.save()
+            self.assertEqual(get_site_settings().bonus_percentage, Decimal('2.0'))
+        self.assertEqual(get_site_settings().bonus_percentage, Decimal('5.00'))
+
+        # Edits without signals are picked up once the version expires
+        SiteSettings.objects.filter(id=1).update(bonus_percentage=Decimal('3.00'))
+        self.assertEqual(get_site_settings().bonus_percentage, Decimal('5.00'))
+        cache.delete(SITE_SETTINGS_VERSION_KEY)
+        self.assertEqual(get_site_settings().bonus_percentage, Decimal('3.00'))
+
+
+class MenuSearchTests(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        grill = Category.objects.create(slug='grill', title='Grill')
+        drinks = Category.objects.create(slug='drinks', title='Drinks')
+        self.adana = MenuItem.objects.create(title='Adana Kebab', price=Decimal('12.00'), featured=False, category=grill)
+        self.chicken = MenuItem.objects.create(title='Chicken Kebab', price=Decimal('9.00'), featured=False, category=grill)
+        self.grilled_corn = MenuItem.objects.create(title='Corn', price=Decimal('3.00'), featured=False, category=grill)
+        self.cola = MenuItem.objects.create(title='Cola', price=Decimal('2.00'), featured=False, category=drinks)
+
+    def search(self, **params):
+        response = self.client.get('/api/menu-items', params)
+        self.assertEqual(response.status_code, 200)
+        return [item['id'] for item in response.data['results']]
+
+    def test_prefix_matching_over_titles_and_categories(self):
+        self.assertCountEqual(self.search(search='keb'), [self.adana.id, self.chicken.id])
+        self.assertCountEqual(self.search(search='dri'), [self.cola.id])
+
+    def test_title_hits_rank_above_category_hits(self):
+        self.grilled_corn.title = 'Grilled Corn'
+        self.grilled_corn.save()
+        self.assertEqual(self.search(search='grill')[0], self.grilled_corn.id)
+
+    def test_composes_with_menu_item_filters(self):
+        self.assertEqual(self.search(search='kebab', price_max='10'), [self.chicken.id])
+
+    def test_index_follows_writes(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            Category.objects.filter(slug='drinks').update(title='Beverages')
+        self.assertEqual(self.search(search='bever'), [self.cola.id])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.cola.delete()
+        self.assertEqual(self.search(search='bever'), [])
+
+
+class ReviewStatsTests(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='critic', password='pass')
+        category = Category.objects.create(slug='mains', title='Mains')
+        self.soup = MenuItem.objects.create(title='Soup', price=Decimal('4.00'), featured=False, category=category)
+        self.stew = MenuItem.objects.create(title='Stew', price=Decimal('6.00'), featured=False, category=category)
+
+    def stats(self, item):
+        return self.client.get(f'/api/menu-items/{item.id}').data['rating']
+
+    def test_stats_follow_review_create_edit_and_delete(self):
+        self.client.force_authenticate(self.user)
+        self.client.post(f'/api/menu-items/{self.soup.id}/reviews', {'menu_item': self.soup.id, 'rating': 5})
+        review = Review.objects.create(user=self.user, menu_item=self.soup, rating=2)
+        self.assertEqual(self.stats(self.soup), {'average': 3.5, 'count': 2, 'histogram': {1: 0, 2: 1, 3: 0, 4: 0, 5: 1}})
+
+        review.rating = 4
+        review.save()
+        self.assertEqual(self.stats(self.soup)['average'], 4.5)
+
+        review.menu_item = self.stew
+        review.save()
+        self.assertEqual(self.stats(self.soup)['count'], 1)
+        self.assertEqual(self.stats(self.stew)['histogram'][4], 1)
+
+        review.delete()
+        self.assertEqual(self.stats(self.stew), {'average': 0, 'count': 0, 'histogram': {1: 0, 2: 0, 3: 0, 4: 0, 5: 0}})
+
+    def test_menu_orders_by_rating_and_rebuild_matches(self):
+        Review.objects.create(user=self.user, menu_item=self.stew, rating=5)
+        Review.objects.create(user=self.user, menu_item=self.soup, rating=3)
+        response = self.client.get('/api/menu-items', {'ordering': '-rating_average'})
+        self.assertEqual([item['id'] for item in response.data['results']], [self.stew.id, self.soup.id])
+
+        before = list(MenuItem.objects.order_by('id').values())
+        MenuItem.objects.update(rating_count=0, rating_sum=0, rating_average=0, rating_5=0)
+        call_command('rebuild_review_stats', stdout=StringIO())
+        self.assertEqual(list(MenuItem.objects.order_by('id').values()), before)
+
+
+class ImageVariantTests(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        self.settings_override = override_settings(MEDIA_ROOT=self.media_root, MENU_IMAGE_ASYNC=False)
+        self.settings_override.enable()
+        self.addCleanup(self.settings_override.disable)
+        self.category = Category.objects.create(slug='mains', title='Mains')
+
+    def upload(self, name, size):
+        buffer = BytesIO()
+        Image.new('RGB', size, 'orange').save(buffer, 'JPEG')
+        return SimpleUploadedFile(name, buffer.getvalue(), content_type='image/jpeg')
+
+    def test_upload_builds_hashed_variants_and_srcset(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            item = MenuItem.objects.create(title='Pide', price=Decimal('7.00'), featured=False,
+                                           category=self.category, image=self.upload('pide.jpg', (800, 600)))
+
+        srcset = self.client.get(f'/api/menu-items/{item.id}').data['image_srcset']
+        self.assertRegex(srcset['thumbnail']['webp'], r'/media/menu_images/derived/[0-9a-f]{16}-thumb\.webp$')
+        self.assertEqual([entry.split()[-1] for entry in srcset['webp'].split(', ')], ['320w', '640w', '800w'])
+
+        item.refresh_from_db()
+        thumbnail = Image.open(os.path.join(self.media_root, item.image_variants['thumbnail']['jpeg']))
+        self.assertEqual(thumbnail.size, (160, 160))
+
+    def test_missing_image_is_remembered(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            item = MenuItem.objects.create(title='Dolma', price=Decimal('5.00'), featured=False,
+                                           category=self.category, image='menu_images/gone.jpg')
+        item.refresh_from_db()
+        self.assertEqual(item.image_variants, {'source': 'menu_images/gone.jpg', 'missing': True})
+        self.assertIsNone(self.client.get(f'/api/menu-items/{item.id}').data['image_srcset'])
+
+    def test_pool_spawns_its_workers_and_shuts_down(self):
+        # Saved without running the on-commit build
+        item = MenuItem.objects.create(title='Pide', price=Decimal('7.00'), featured=False,
+                                       category=self.category, image=self.upload('pide.jpg', (400, 300)))
+        self.addCleanup(images.shutdown_executor)
+        executor = images.get_executor()
+        self.assertEqual(executor._mp_context.get_start_method(), 'spawn')
+        manifest = executor.submit(images.build_variants, item.image.name, self.media_root).result(timeout=60)
+        self.assertEqual(manifest['source'], item.image.name)
+        images.shutdown_executor()
+        self.assertIsNone(images._executor)
+
+    def test_backfill_command_shares_work_between_items_with_one_image(self):
+        image = self.upload('cola.jpg', (300, 300))
+        first = MenuItem.objects.create(title='Cola', price=Decimal('2.00'), featured=False,
+                                        category=self.category, image=image)
+        MenuItem.objects.create(title='Cola Zero', price=Decimal('2.00'), featured=False,
+                                category=self.category, image=first.image.name)
+
+        out = StringIO()
+        call_command('build_image_variants', workers=1, stdout=out)
+        self.assertIn('Built variants for 1 images, updated 2 menu items.', out.getvalue())
+        self.assertEqual(len({item.image_variants['source'] for item in MenuItem.objects.all()}), 1)
+
+    def test_backfill_skips_unreadable_images_and_keeps_the_rest(self):
+        good = MenuItem.objects.create(title='Lahmacun', price=Decimal('6.00'), featured=False,
+                                       category=self.category, image=self.upload('lahmacun.jpg', (200, 200)))
+        broken = MenuItem.objects.create(title='Kofte', price=Decimal('8.00'), featured=False, category=self.category,
+                                         image=SimpleUploadedFile('kofte.jpg', b'not an image', content_type='image/jpeg'))
+
+        out, err = StringIO(), StringIO()
+        call_command('build_image_variants', workers=1, stdout=out, stderr=err)
+        self.assertIn(f"Menu item {broken.id}: image '{broken.image.name}' not found or unreadable", err.getvalue())
+        self.assertIn('updated 1 menu items', out.getvalue())
+        good.refresh_from_db()
+        self.assertEqual(good.image_variants['source'], good.image.name)
+
+        # Saving the item records the bad file instead of failing in the pool
+        with self.captureOnCommitCallbacks(execute=True):
+            broken.save()
+        broken.refresh_from_db()
+        self.assertEqual(broken.image_variants, {'source': broken.image.name, 'missing': True})
+
+
+class CartUpsertTests(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='customer', password='pass')
+        self.client.force_authenticate(self.user)
+        category = Category.objects.create(slug='mains', title='Mains')
+        self.items = [
+            MenuItem.objects.create(title=f'Dish {i}', price=Decimal('4.00'), featured=False, category=category)
+            for i in range(5)
+        ]
+
+    def cart(self):
+        return {c.menuitem_id: (c.quantity, c.price) for c in Cart.objects.filter(user=self.user)}
+
+    def test_repeated_adds_increment_in_place(self):
+        item = self.items[0]
+        self.assertEqual(self.client.post('/api/cart/menu-items', {'menuitem_id': item.id}).status_code, 201)
+        self.assertEqual(self.client.post('/api/cart/menu-items',
+                                          {'menuitem_id': item.id, 'quantity': 2}).status_code, 200)
+        self.assertEqual(self.cart(), {item.id: (3, Decimal('12.00'))})
+
+    def test_batch_adds_and_increments_in_one_transaction(self):
+        first, second, third = self.items[:3]
+        Cart.objects.create(user=self.user, menuitem=first, quantity=1, unit_price=4, price=4)
+        payload = {'items': [{'menuitem_id': first.id, 'quantity': 2},
+                             {'menuitem_id': second.id},
+                             {'menuitem_id': third.id, 'quantity': 3},
+                             {'menuitem_id': third.id, 'quantity': 1}]}
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post('/api/cart/menu-items/batch', payload, format='json')
+        self.assertEqual(response.data, {'message': 'Cart updated', 'created': 2, 'updated': 1})
+        self.assertEqual(self.cart(), {first.id: (3, Decimal('12.00')), second.id: (1, Decimal('4.00')),
+                                       third.id: (4, Decimal('16.00'))})
+        self.assertEqual(len([q for q in queries if 'rest_api_menuitem' in q['sql']]), 1)
+
+    def test_batch_with_unknown_item_changes_nothing(self):
+        payload = {'items': [{'menuitem_id': self.items[0].id}, {'menuitem_id': 9999}]}
+        response = self.client.post('/api/cart/menu-items/batch', payload, format='json')
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(self.cart(), {})
+
+
+@override_settings(REQUEST_PROFILING={'ENABLED': True, 'SAMPLE_RATE': 0, 'SLOW_REQUEST_MS': 0, 'SLOWEST_QUERIES': 2})
+class RequestProfilingTests(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        category = Category.objects.create(slug='mains', title='Mains')
+        MenuItem.objects.create(title='Soup', price=Decimal('4.00'), featured=False, category=category)
+
+    def test_server_timing_and_slow_request_log(self):
+        with self.assertLogs('rest_api.profiling', 'INFO') as logs:
+            response = self.client.get('/api/menu-items')
+        self.assertEqual(response.status_code, 200)
+        timing = response['Server-Timing']
+        for metric in ('total;dur=', 'db;dur=', 'serialize;dur=', 'view;dur='):
+            self.assertIn(metric, timing)
+
+        entry = json.loads(logs.records[0].getMessage())
+        self.assertTrue(entry['slow'])
+        self.assertEqual(entry['path'], '/api/menu-items')
+        self.assertGreater(entry['queries'], 0)
+        self.assertLessEqual(len(entry['slowest_queries']), 2)
+        self.assertIn('SELECT', entry['slowest_queries'][0]['sql'])
+
+    @override_settings(REQUEST_PROFILING={'ENABLED': False})
+    def test_disabled_by_default(self):
+        response = self.client.get('/api/menu-items')
+        self.assertNotIn('Server-Timing', response)
+
+
+class ReservationSlotTests(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        SiteSettings.objects.create(id=1, reservation_slot_minutes=60, reservation_slot_capacity=10)
+        self.customer = User.objects.create_user(username='customer', password='pass')
+        self.manager = User.objects.create_user(username='manager', password='pass')
+        self.manager.groups.add(Group.objects.create(name='Manager'))
+
+    def reserve(self, time, guests, date='2030-05-04'):
+        self.client.force_authenticate(self.customer)
+        return self.client.post('/api/reservations', {
+            'date': date, 'time': time, 'phone_number': '555', 'number_of_guests': guests})
+
+    def booked(self, date='2030-05-04', time='18:00'):
+        response = self.client.get('/api/reservations/availability', {'date_from': date, 'date_to': date})
+        slot = next(s for s in response.data['days'][0]['slots'] if s['time'] == time)
+        return slot['booked'], slot['free']
+
+    def test_bookings_share_a_slot_and_reject_overbooking(self):
+        self.assertEqual(self.reserve('18:00', 6).status_code, 201)
+        self.assertEqual(self.reserve('18:45', 4).status_code, 201)
+        response = self.reserve('18:30', 1)
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('time', response.data)
+        self.assertEqual(Reservation.objects.count(), 2)
+        self.assertEqual(self.booked(), (10, 0))
+        self.assertEqual(self.reserve('19:00', 1).status_code, 201)
+        self.assertEqual(self.reserve('23:00', 1).status_code, 400)
+
+    def test_update_and_cancel_release_seats(self):
+        self.reserve('18:00', 6)
+        reservation = Reservation.objects.get()
+        self.client.force_authenticate(self.manager)
+        response = self.client.patch(f'/api/reservations/{reservation.pk}', {'number_of_guests': 10})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.booked(), (10, 0))
+
+        response = self.client.patch(f'/api/reservations/{reservation.pk}', {'time': '20:15'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.booked(), (0, 10))
+        self.assertEqual(self.booked(time='20:00'), (10, 0))
+
+        self.assertEqual(self.reserve('18:00', 8).status_code, 201)
+        self.client.force_authenticate(self.manager)
+        response = self.client.patch(f'/api/reservations/{reservation.pk}', {'time': '18:00'})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.booked(time='20:00'), (10, 0))
+
+        self.assertEqual(self.client.delete(f'/api/reservations/{reservation.pk}').status_code, 204)
+        self.assertEqual(self.booked(time='20:00'), (0, 10))
+
+    def test_availability_covers_the_range_in_one_query(self):
+        self.reserve('12:00', 3, date='2030-05-05')
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/reservations/availability',
+                                       {'date_from': '2030-05-04', 'date_to': '2030-05-06'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(queries), 1)
+        self.assertEqual([day['date'] for day in response.data['days']], ['2030-05-04', '2030-05-05', '2030-05-06'])
+        self.assertEqual(len(response.data['days'][0]['slots']), 12)
+        self.assertEqual(self.booked('2030-05-05', '12:00'), (3, 7))
+        response = self.client.get('/api/reservations/availability', {'date_from': '2030-05-04', 'date_to': '2030-05-01'})
+        self.assertEqual(response.status_code, 400)
+        for params in ({'date_from': 'nope'}, {'date_from': '2030-05-04', 'date_to': '2030-02-30'}):
+            self.assertEqual(self.client.get('/api/reservations/availability', params).status_code, 400)
+
+
+class DispatchTests(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.manager = User.objects.create_user(username='manager', password='pass')
+        self.manager.groups.add(Group.objects.create(name='Manager'))
+        self.customer = User.objects.create_user(username='customer', password='pass')
+        crew = Group.objects.create(name='Delivery Crew')
+        self.crew = [User.objects.create_user(username=f'courier{i}', password='pass') for i in range(3)]
+        crew.user_set.add(*self.crew)
+        # Existing active load: courier0 has two orders, courier1 one, courier2 none but a delivered one
+        for courier, order_status in [(0, 'PENDING'), (0, 'READY'), (1, 'PENDING'), (2, 'DELIVERED')]:
+            Order.objects.create(user=self.customer, delivery_crew=self.crew[courier], status=order_status)
+        self.client.force_authenticate(self.manager)
+
+    def test_ready_order_goes_to_least_loaded_crew(self):
+        orders = [Order.objects.create(user=self.customer) for _ in range(3)]
+        assigned = []
+        for order in orders:
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.client.patch(f'/api/orders/{order.pk}', {'status': 'READY'})
+            self.assertEqual(response.status_code, 200)
+            assigned.append(Order.objects.get(pk=order.pk).delivery_crew_id)
+        self.assertEqual(assigned, [self.crew[2].pk, self.crew[1].pk, self.crew[2].pk])
+
+        # Delivering frees courier2 up again
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.patch(f'/api/orders/{orders[0].pk}', {'status': 'DELIVERED'})
+            self.client.patch(f'/api/orders/{orders[2].pk}', {'status': 'CANCELLED'})
+        order = Order.objects.create(user=self.customer)
+        self.client.patch(f'/api/orders/{order.pk}', {'status': 'READY'})
+        self.assertEqual(Order.objects.get(pk=order.pk).delivery_crew_id, self.crew[2].pk)
+
+    def test_backlog_is_spread_over_the_crew(self):
+        backlog = [Order.objects.create(user=self.customer, status='READY') for _ in range(7)]
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/api/orders/dispatch', {'limit': 6})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['assigned'], 6)
+        self.assertEqual([o['id'] for o in response.data['orders']], [o.pk for o in backlog[:6]])
+
+        load = {courier.pk: Order.objects.filter(delivery_crew=courier, status__in=['PENDING', 'READY']).count()
+                for courier in self.crew}
+        self.assertEqual(sorted(load.values()), [3, 3, 3])
+        self.assertEqual(Order.objects.filter(delivery_crew__isnull=True).count(), 1)
+
+        self.client.force_authenticate(self.customer)
+        self.assertEqual(self.client.post('/api/orders/dispatch').status_code, 403)
+
+    def test_crew_changes_rebuild_the_load(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.delete('/api/groups/delivery-crew/users', {'username': 'courier2'})
+        order = Order.objects.create(user=self.customer)
+        self.client.patch(f'/api/orders/{order.pk}', {'status': 'READY'})
+        self.assertEqual(Order.objects.get(pk=order.pk).delivery_crew_id, self.crew[1].pk)
+
+
+class OrderEventTests(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.manager = User.objects.create_user(username='manager', password='pass')
+        self.manager.groups.add(Group.objects.create(name='Manager'))
+        self.customer = User.objects.create_user(username='customer', password='pass')
+        self.other = User.objects.create_user(username='other', password='pass')
+        self.courier = User.objects.create_user(username='courier', password='pass')
+        self.courier.groups.add(Group.objects.create(name='Delivery Crew'))
+        self.order = Order.objects.create(user=self.customer)
+        self.tokens = {user.username: Token.objects.create(user=user).key
+                       for user in (self.manager, self.customer, self.other, self.courier)}
+        self.broker = InProcessBroker()
+        patcher = mock.patch('rest_api.views.get_broker', return_value=self.broker)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_order_changes_are_published_on_commit(self):
+        self.client.force_authenticate(self.manager)
+        with mock.patch('rest_api.events.get_broker', return_value=self.broker):
+            with self.captureOnCommitCallbacks(execute=True):
+                self.client.patch(f'/api/orders/{self.order.pk}', {'delivery_crew': self.courier.pk})
+                self.client.patch(f'/api/orders/{self.order.pk}', {'delivery_crew': self.courier.pk})
+        events = [payload for _, payload in self.broker._history]
+        self.assertEqual(len(events), 1)
+        self.assertEqual(events[0]['order'], {'id': self.order.pk, 'user': self.customer.pk,
+                                              'status': 'PENDING', 'delivery_crew': self.courier.pk})
+        self.assertEqual(events[0]['previous'], {'status': 'PENDING', 'delivery_crew': None})
+
+    async def read_events(self, username, count, **params):
+        response = await self.async_client.get(
+            '/api/orders/events', {'token': self.tokens[username], **params})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        chunks = response.streaming_content
+        try:
+            received = [await anext(chunks) for _ in range(count + 1)][1:]
+        finally:
+            await chunks.aclose()
+        return [json.loads(chunk.decode().split('data: ')[1])['order']['id'] for chunk in received]
+
+    async def test_streams_filter_by_user_and_role(self):
+        def publish(order_id, user, crew):
+            self.broker.publish({'type': 'order.updated',
+                                 'order': {'id': order_id, 'user': user.pk, 'status': 'READY', 'delivery_crew': crew}})
+        publish(1, self.customer, None)
+        publish(2, self.other, self.courier.pk)
+        publish(3, self.customer, self.courier.pk)
+
+        self.assertEqual(await self.read_events('manager', 3, last_event_id=0), [1, 2, 3])
+        self.assertEqual(await self.read_events('customer', 2, last_event_id=0), [1, 3])
+        self.assertEqual(await self.read_events('courier', 2, last_event_id=0), [2, 3])
+        # Resuming only replays what came after the last event seen
+        self.assertEqual(await self.read_events('customer', 1, last_event_id=1), [3])
+
+    async def test_stream_requires_authentication(self):
+        response = await self.async_client.get('/api/orders/events', {'token': 'nope'})
+        self.assertEqual(response.status_code, 401)
+
+    def test_stream_requires_asgi(self):
+        response = self.client.get('/api/orders/events', {'token': self.tokens['customer']})
+        self.assertEqual(response.status_code, 501)
+
+    async def test_sqlite_broker_shares_events_between_instances(self):
+        path = os.path.join(tempfile.mkdtemp(), 'events.sqlite3')
+        self.addCleanup(shutil.rmtree, os.path.dirname(path))
+        publisher, subscriber = SQLiteBroker(path), SQLiteBroker(path, poll_interval=0.01)
+        events = subscriber.subscribe()
+        receiving = asyncio.ensure_future(anext(events))
+        await asyncio.sleep(0.05)
+        await asyncio.to_thread(publisher.publish, {'type': 'order.created', 'order': {'id': 7}})
+        event_id, payload = await asyncio.wait_for(receiving, 5)
+        await events.aclose()
+        self.assertEqual(payload['order']['id'], 7)
+
+
+class QueryPlanTests(APITestCase):
+    """Every query behind the list endpoints must read from an index, without full table scans or sorts."""
+
+    def setUp(self):
+        cache.clear()
+        self.manager = User.objects.create_user(username='manager', password='pass')
+        self.manager.groups.add(Group.objects.create(name='Manager'))
+        self.courier = User.objects.create_user(username='courier', password='pass')
+        self.courier.groups.add(Group.objects.create(name='Delivery Crew'))
+        self.customer = User.objects.create_user(username='customer', password='pass')
+        category = Category.objects.create(slug='mains', title='Mains')
+        self.item = MenuItem.objects.create(title='Soup', price=Decimal('4.00'), featured=False, category=category)
+        Cart.objects.create(user=self.customer, menuitem=self.item, quantity=1, unit_price=Decimal('4.00'), price=Decimal('4.00'))
+        order = Order.objects.create(user=self.customer, delivery_crew=self.courier, total=Decimal('4.00'))
+        OrderItem.objects.create(order=order, menuitem=self.item, quantity=1, price=Decimal('4.00'))
+        Review.objects.create(user=self.customer, menu_item=self.item, rating=4)
+        Reservation.objects.create(user=self.customer, date='2030-05-04', time='18:00', phone_number='555', number_of_guests=2)
+
+    def full_scans(self, user, method, url, data=None):
+        if user is None:
+            self.client.force_authenticate(None)
+        else:
+            # A fresh instance, so role lookups are part of the request as well
+            self.client.force_authenticate(User.objects.get(pk=user.pk))
+        with CaptureQueriesContext(connection) as queries:
+            response = getattr(self.client, method)(url, data)
+        self.assertLess(response.status_code, 400, url)
+        scans = []
+        with connection.cursor() as cursor:
+            for query in queries:
+                if not query['sql'].startswith('SELECT'):
+                    continue
+                cursor.execute(f"EXPLAIN QUERY PLAN {query['sql']}")
+                scans += [(row[3], query['sql']) for row in cursor.fetchall() if self.is_unindexed(row[3])]
+        return scans
+
+    @staticmethod
+    def is_unindexed(step):
+        # A table scan without an index, or rows sorted after the fact for ORDER BY
+        return (step.startswith('SCAN') and 'INDEX' not in step) or ('TEMP B-TREE' in step and 'ORDER BY' in step)
+
+    def test_list_endpoints_use_indexes(self):
+        endpoints = [
+            (self.customer, 'get', '/api/orders', {'ordering': '-date'}),
+            (self.customer, 'get', '/api/orders', {'pagination': 'cursor'}),
+            (self.courier, 'get', '/api/orders', {'ordering': '-date'}),
+            (self.manager, 'get', '/api/orders', {'ordering': '-date'}),
+            (self.manager, 'get', '/api/orders', {'pagination': 'cursor'}),
+            (self.manager, 'post', '/api/orders/dispatch', None),
+            (self.customer, 'get', '/api/cart/menu-items', None),
+            (self.customer, 'get', '/api/reservations', None),
+            (self.manager, 'get', '/api/reservations', {'pagination': 'cursor'}),
+            (None, 'get', '/api/reservations/availability', {'date_from': '2030-05-01', 'date_to': '2030-05-07'}),
+            (None, 'get', f'/api/menu-items/{self.item.pk}/reviews', None),
+            (None, 'get', f'/api/menu-items/{self.item.pk}/reviews', {'pagination': 'cursor'}),
+            (None, 'get', '/api/menu-items', {'pagination': 'cursor', 'category': self.item.category_id}),
+        ]
+        for user, method, url, data in endpoints:
+            with self.subTest(url=url, data=data, user=user and user.username):
+                self.assertEqual(self.full_scans(user, method, url, data), [])
+
+
+class SalesAnalyticsTests(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.manager = User.objects.create_user(username='manager', password='pass')
+        self.manager.groups.add(Group.objects.create(name='Manager'))
+        self.customer = User.objects.create_user(username='customer', password='pass')
+        mains = Category.objects.create(slug='mains', title='Mains')
+        drinks = Category.objects.create(slug='drinks', title='Drinks')
+        self.steak = MenuItem.objects.create(title='Steak', price=Decimal('20.00'), featured=False, category=mains)
+        self.tea = MenuItem.objects.create(title='Tea', price=Decimal('2.50'), featured=False, category=drinks)
+
+    def checkout(self, *lines):
+        for item, quantity in lines:
+            Cart.objects.create(user=self.customer, menuitem=item, quantity=quantity,
+                                unit_price=item.price, price=item.price * quantity)
+        self.client.force_authenticate(self.customer)
+        response = self.client.post('/api/orders')
+        self.assertEqual(response.status_code, 201)
+        return response.data['id']
+
+    def report(self, **params):
+        self.client.force_authenticate(self.manager)
+        today = timezone.localdate().isoformat()
+        response = self.client.get('/api/analytics/sales', {'date_from': today, 'date_to': today, **params})
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_checkout_and_cancel_update_the_rollups(self):
+        self.checkout((self.steak, 1), (self.tea, 2))
+        order_id = self.checkout((self.tea, 4))
+        report = self.report()
+        self.assertEqual((report['orders'], report['revenue'], report['average_ticket']),
+                         (2, Decimal('35.00'), Decimal('17.50')))
+        day = report['periods'][0]
+        self.assertEqual([(i['title'], i['quantity'], i['revenue']) for i in day['top_menu_items']],
+                         [('Steak', 1, Decimal('20.00')), ('Tea', 6, Decimal('15.00'))])
+        self.assertEqual([c['title'] for c in day['top_categories']], ['Mains', 'Drinks'])
+
+        self.client.force_authenticate(self.manager)
+        self.client.patch(f'/api/orders/{order_id}', {'status': 'CANCELLED'})
+        report = self.report(top=1)
+        self.assertEqual((report['orders'], report['revenue']), (1, Decimal('25.00')))
+        self.assertEqual([i['quantity'] for i in report['periods'][0]['top_menu_items']], [1])
+
+        # Rebuilding from the order history gives the same rollups
+        rollups = sorted(DailyItemSales.objects.values_list('date', 'menuitem_id', 'quantity', 'revenue'))
+        call_command('rebuild_sales_rollups', chunk_size=1, stdout=StringIO())
+        self.assertEqual(sorted(DailyItemSales.objects.values_list('date', 'menuitem_id', 'quantity', 'revenue')),
+                         [row for row in rollups if row[2]])
+
+    def test_weeks_and_months_group_daily_rollups(self):
+        noon = datetime.time(12, tzinfo=timezone.get_current_timezone())
+        # Friday and Saturday of one week, Monday of the next
+        for day, total in [(31, '15.00'), (31, '15.00'), (1, '10.00'), (3, '5.00')]:
+            date = datetime.datetime.combine(datetime.date(2030, 5 if day == 31 else 6, day), noon)
+            record_order(date, Decimal(total), [(self.tea.pk, 1, Decimal(total))])
+        self.client.force_authenticate(self.manager)
+        response = self.client.get('/api/analytics/sales', {'period': 'week', 'date_from': '2030-05-29', 'date_to': '2030-06-09'})
+        self.assertEqual([(p['start'], p['orders'], p['revenue']) for p in response.data['periods']],
+                         [(datetime.date(2030, 5, 27), 3, Decimal('40.00')), (datetime.date(2030, 6, 3), 1, Decimal('5.00'))])
+        response = self.client.get('/api/analytics/sales', {'period': 'month', 'date_from': '2030-05-01', 'date_to': '2030-06-30'})
+        self.assertEqual([p['orders'] for p in response.data['periods']], [2, 2])
+
+        # Malformed dates are rejected rather than replaced by the default range
+        for params in ({'date_from': 'garbage'}, {'date_to': '2030-13-01'}, {'date_to': '30/06/2030'}):
+            self.assertEqual(self.client.get('/api/analytics/sales', params).status_code, 400)
+
+        self.client.force_authenticate(self.customer)
+        self.assertEqual(self.client.get('/api/analytics/sales').status_code, 403)
+
+
+class CatalogImportExportTests(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.manager = User.objects.create_user(username='manager', password='pass')
+        self.manager.groups.add(Group.objects.create(name='Manager'))
+        self.drinks = Category.objects.create(slug='drinks', title='Drinks')
+        self.tea = MenuItem.objects.create(title='Tea', price=Decimal('2.50'), featured=False, category=self.drinks)
+
+    def test_import_upserts_in_batches_and_reports_bad_rows(self):
+        upload = SimpleUploadedFile('menu.csv', (
+            'title,price,featured,category,category_title\n'
+            'Tea,3.00,true,drinks,Hot drinks\n'
+            'Soup,6.50,false,starters,\n'
+            'Salad,-1,false,starters,\n'
+            'Coffee,2.75,,drinks,\n'
+            ',1.00,false,drinks,\n'
+        ).encode(), content_type='text/csv')
+        self.client.force_authenticate(self.manager)
+        with mock.patch('rest_api.views.MenuImportView.batch_size', 2):
+            response = self.client.post('/api/menu-items/import', {'file': upload}, format='multipart')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.data['created'], response.data['updated'], response.data['categories_created']), (2, 1, 1))
+        self.assertEqual([(error['line'], list(error['errors'])) for error in response.data['errors']],
+                         [(4, ['price']), (6, ['title'])])
+
+        self.tea.refresh_from_db()
+        self.assertEqual((self.tea.price, self.tea.featured), (Decimal('3.00'), True))
+        self.assertEqual(Category.objects.get(slug='drinks').title, 'Hot drinks')
+        self.assertEqual(MenuItem.objects.get(title='Soup').category.title, 'Starters')
+
+        # The export reads back into the same catalog
+        response = self.client.get('/api/menu-items/export', {'file_format': 'jsonl'})
+        self.assertTrue(response.streaming)
+        rows = [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+        self.assertEqual([(row['title'], row['price'], row['category']) for row in rows],
+                         [('Tea', '3.00', 'drinks'), ('Soup', '6.50', 'starters'), ('Coffee', '2.75', 'drinks')])
+        with tempfile.NamedTemporaryFile('w', suffix='.jsonl', delete=False) as export:
+            call_command('export_catalog', export.name, stdout=StringIO())
+        self.addCleanup(os.remove, export.name)
+        call_command('import_catalog', export.name, stdout=StringIO())
+        self.assertEqual(MenuItem.objects.count(), 3)
+
+    def test_managers_only(self):
+        customer = User.objects.create_user(username='customer', password='pass')
+        self.client.force_authenticate(customer)
+        self.assertEqual(self.client.get('/api/menu-items/export').status_code, 403)
+
+    def test_export_streams_asynchronously_under_asgi(self):
+        for i in range(5):
+            MenuItem.objects.create(title=f'Juice {i}', price=Decimal('3.00'), featured=False, category=self.drinks)
+        request = AsyncRequestFactory().get('/api/menu-items/export', {'file_format': 'csv'})
+        force_authenticate(request, self.manager)
+        with mock.patch('rest_api.views.aexport_catalog', functools.partial(aexport_catalog, chunk_size=2)):
+            response = MenuExportView.as_view()(request)
+        self.assertTrue(response.is_async)
+
+        async def read():
+            return [chunk async for chunk in response.streaming_content]
+
+        # Six rows, two per chunk, the header goes with the first
+        chunks = async_to_sync(read)()
+        self.assertEqual(len(chunks), 3)
+        lines = b''.join(chunks).decode().splitlines()
+        self.assertEqual(lines[0], 'id,title,price,featured,category,category_title')
+        self.assertEqual([line.split(',')[1] for line in lines[1:]], ['Tea'] + [f'Juice {i}' for i in range(5)])
+
+
+class ProvisionUsersTests(APITestCase):
+
+    def test_creates_users_and_groups_once(self):
+        User.objects.create_user(username='Mario', password='pass')
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False) as users:
+            users.write('username,email,password,groups\n'
+                        'Adrian,adrian@rms.com,rms@adr!x9,Manager\n'
+                        'Mario,mario@rms.com,rms@mar!x9,\n'
+                        'Sana,sana@rms.com,sana,\n'
+                        'Kamran,kamran@rms.com,rms@kam!x9,Delivery Crew;Manager\n'
+                        'John,john@rms.com,rms#jhn!x9,Waiters\n')
+        self.addCleanup(os.remove, users.name)
+
+        err = StringIO()
+        call_command('provision_users', users.name, workers=2, stdout=StringIO(), stderr=err)
+        # Sana's password is too short and too close to the username, Waiters isn't a group
+        self.assertEqual(sorted(line.split(':')[0] for line in err.getvalue().splitlines()), ['John', 'Sana'])
+        kamran = User.objects.get(username='Kamran')
+        self.assertTrue(kamran.check_password('rms@kam!x9'))
+        self.assertEqual(sorted(kamran.groups.values_list('name', flat=True)), ['Delivery Crew', 'Manager'])
+        self.assertEqual(list(User.objects.get(username='Adrian').groups.values_list('name', flat=True)), ['Manager'])
+
+        out = StringIO()
+        call_command('provision_users', users.name, workers=1, skip_validation=True, stdout=out, stderr=StringIO())
+        self.assertIn('1 created, 3 already existed, 1 rejected', out.getvalue())
+        self.assertEqual(User.objects.count(), 4)
+
+
+class CachedTokenAuthenticationTests(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='customer', password='pass')
+        self.token = Token.objects.create(user=self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+
+    def test_token_is_resolved_once(self):
+        self.assertEqual(self.client.get('/api/cart/menu-items').status_code, 200)
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.client.get('/api/cart/menu-items').status_code, 200)
+        self.assertFalse([q for q in queries.captured_queries if 'authtoken_token' in q['sql']])
+        self.assertGreaterEqual(token_cache_stats()['local_hits'], 1)
+
+    def test_password_hash_is_not_cached(self):
+        self.assertEqual(self.client.get('/api/cart/menu-items').status_code, 200)
+        version, (created, values) = cache.get(_cache_key(self.token.key))
+        self.assertIn(self.user.username, values)
+        self.assertNotIn(self.user.password, values)
+        # Views that check the password still see it
+        response = self.client.post('/auth/users/set_password/', {'current_password': 'pass', 'new_password': 'n3w-Secret!x'})
+        self.assertEqual(response.status_code, 204)
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.check_password('n3w-Secret!x'))
+
+    def test_logout_deactivation_and_balance_changes_invalidate(self):
+        self.assertEqual(self.client.get('/auth/users/me/').data['tip'], '0.00')
+        User.objects.filter(pk=self.user.pk).update(tip=Decimal('5.00'))
+        invalidate_user_tokens([self.user.pk])
+        self.assertEqual(self.client.get('/auth/users/me/').data['tip'], '5.00')
+
+        self.user.is_active = False
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.save()
+        self.assertEqual(self.client.get('/api/cart/menu-items').status_code, 401)
+        self.user.is_active = True
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.save()
+        self.assertEqual(self.client.get('/api/cart/menu-items').status_code, 200)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(self.client.post('/auth/token/logout/').status_code, 204)
+        self.assertEqual(self.client.get('/api/cart/menu-items').status_code, 401)
+
+    def test_changes_to_one_user_keep_other_users_cached(self):
+        other = User.objects.create_user(username='other', password='pass')
+        other_token = Token.objects.create(user=other)
+        self.assertEqual(self.client.get('/api/cart/menu-items').status_code, 200)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {other_token.key}')
+        self.assertEqual(self.client.get('/api/cart/menu-items').status_code, 200)
+
+        # A checkout or balance posting for one user, e.g. through the ledger
+        invalidate_user_tokens([self.user.pk])
+        local_hits = token_cache_stats().get('local_hits', 0)
+        self.assertEqual(self.client.get('/api/cart/menu-items').status_code, 200)
+        self.assertEqual(token_cache_stats()['local_hits'], local_hits + 1)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.client.get('/api/cart/menu-items').status_code, 200)
+        self.assertTrue([q for q in queries.captured_queries if 'authtoken_token' in q['sql']])
+
+    def test_revocation_reaches_other_workers(self):
+        # Another worker: its own local tier in front of the shared cache
+        other_worker = TokenCache()
+        self.assertEqual(self.client.get('/api/cart/menu-items').status_code, 200)
+        with mock.patch('rest_api.authentication.token_cache', other_worker):
+            self.assertEqual(self.client.get('/api/cart/menu-items').status_code, 200)
+            self.assertEqual(self.client.get('/api/cart/menu-items').status_code, 200)
+        self.assertEqual((other_worker.stats['shared_hits'], other_worker.stats['local_hits']), (1, 1))
+
+        self.user.is_active = False
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.save()
+        with mock.patch('rest_api.authentication.token_cache', other_worker):
+            self.assertEqual(self.client.get('/api/cart/menu-items').status_code, 401)
+        self.user.is_active = True
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.save()
+        with mock.patch('rest_api.authentication.token_cache', other_worker):
+            self.assertEqual(self.client.get('/api/cart/menu-items').status_code, 200)
+        # The logout is handled by this worker
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(self.client.post('/auth/token/logout/').status_code, 204)
+        with mock.patch('rest_api.authentication.token_cache', other_worker):
+            self.assertEqual(self.client.get('/api/cart/menu-items').status_code, 401)
+
+
+class OrderArchiveTests(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.customer = User.objects.create_user(username='customer', password='pass')
+        self.other = User.objects.create_user(username='other', password='pass')
+        category = Category.objects.create(slug='mains', title='Mains')
+        self.steak = MenuItem.objects.create(title='Steak', price=Decimal('20.00'), featured=False, category=category)
+        self.now = timezone.now()
+        self.orders = {}
+        for name, user, status, days in [('old', self.customer, 'DELIVERED', 200), ('older', self.customer, 'CANCELLED', 300),
+                                         ('old_pending', self.customer, 'PENDING', 250), ('recent', self.customer, 'DELIVERED', 5),
+                                         ('someone_elses', self.other, 'DELIVERED', 220)]:
+            order = Order.objects.create(user=user, status=status, total=Decimal('20.00'))
+            Order.objects.filter(pk=order.pk).update(date=self.now - datetime.timedelta(days=days))
+            OrderItem.objects.create(order=order, menuitem=self.steak, quantity=1, price=Decimal('20.00'))
+            self.orders[name] = order.pk
+
+    def ids(self, **params):
+        self.client.force_authenticate(self.customer)
+        response = self.client.get('/api/orders', params)
+        self.assertEqual(response.status_code, 200)
+        return [order['id'] for order in response.data['results']]
+
+    def test_archived_orders_are_read_only_for_old_ranges(self):
+        out = StringIO()
+        call_command('archive_orders', chunk_size=1, stdout=out)
+        self.assertIn('Archived 3 orders', out.getvalue())
+        self.assertEqual(sorted(ArchivedOrder.objects.values_list('id', flat=True)),
+                         sorted([self.orders['old'], self.orders['older'], self.orders['someone_elses']]))
+        self.assertEqual(ArchivedOrderItem.objects.count(), 3)
+        self.assertFalse(OrderItem.objects.filter(order_id=self.orders['old']).exists())
+
+        # Without a range, or one newer than the archive, only the hot table is read
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(sorted(self.ids()), sorted([self.orders['recent'], self.orders['old_pending']]))
+        self.assertFalse([q for q in queries.captured_queries if 'archivedorder"' in q['sql'] and 'MAX' not in q['sql']])
+        since = (self.now - datetime.timedelta(days=30)).date().isoformat()
+        self.assertEqual(self.ids(date_from=since), [self.orders['recent']])
+
+        since = (self.now - datetime.timedelta(days=365)).date().isoformat()
+        expected = [self.orders['recent'], self.orders['old'], self.orders['old_pending'], self.orders['older']]
+        self.assertEqual(self.ids(date_from=since), expected)
+        until = (self.now - datetime.timedelta(days=210)).date().isoformat()
+        self.assertEqual(self.ids(date_from=since, date_to=until), expected[2:])
+
+        # Cursor pages over both tables
+        self.client.force_authenticate(self.customer)
+        response = self.client.get('/api/orders', {'date_from': since, 'pagination': 'cursor', 'page_size': 1})
+        seen = []
+        while True:
+            seen += [order['id'] for order in response.data['results']]
+            self.assertEqual(response.data['results'][0]['orderitem'][0]['menuitem']['title'], 'Steak')
+            if not response.data['next']:
+                break
+            response = self.client.get(response.data['next'])
+        self.assertEqual(seen, expected)
+
+        self.assertEqual(self.client.get('/api/orders', {'date_from': 'soon'}).status_code, 400)
+
+    def test_open_ranges_and_ordering_reach_the_archive(self):
+        call_command('archive_orders', stdout=StringIO())
+        until = (self.now - datetime.timedelta(days=210)).date().isoformat()
+        self.assertEqual(self.ids(date_to=until), [self.orders['old_pending'], self.orders['older']])
+        today = self.now.date().isoformat()
+        expected = [self.orders['older'], self.orders['old_pending'], self.orders['old'], self.orders['recent']]
+        self.assertEqual(self.ids(date_to=today, ordering='date'), expected)
+        self.assertEqual(self.ids(date_to=today, ordering='-date'), expected[::-1])
+
+        # Orderings on other columns are carried into the union as well
+        Order.objects.filter(pk=self.orders['recent']).update(total=Decimal('50.00'))
+        ArchivedOrder.objects.filter(pk=self.orders['older']).update(total=Decimal('5.00'), status='PENDING')
+        self.assertEqual(self.ids(date_to=today, ordering='total'),
+                         [self.orders['older'], self.orders['old'], self.orders['old_pending'], self.orders['recent']])
+        self.assertEqual(self.ids(date_to=today, ordering='-total')[0], self.orders['recent'])
+        self.assertEqual(self.ids(date_to=today, ordering='status'),
+                         [self.orders['old'], self.orders['recent'], self.orders['older'], self.orders['old_pending']])
+        self.assertEqual(len(self.ids(date_to=today, ordering='user')), 4)
+
+
+class IdempotencyTests(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.customer = User.objects.create_user(username='customer', password='pass')
+        category = Category.objects.create(slug='mains', title='Mains')
+        self.steak = MenuItem.objects.create(title='Steak', price=Decimal('20.00'), featured=False, category=category)
+        self.client.force_authenticate(self.customer)
+
+    def test_retried_checkout_is_replayed(self):
+        self.client.post('/api/cart/menu-items', {'menuitem_id': self.steak.id, 'quantity': 2}, HTTP_IDEMPOTENCY_KEY='cart-1')
+        retry = self.client.post('/api/cart/menu-items', {'menuitem_id': self.steak.id, 'quantity': 2}, HTTP_IDEMPOTENCY_KEY='cart-1')
+        self.assertEqual((retry.status_code, retry['Idempotent-Replayed']), (201, 'true'))
+        self.assertEqual(Cart.objects.get(user=self.customer).quantity, 2)
+
+        first = self.client.post('/api/orders', HTTP_IDEMPOTENCY_KEY='checkout-1')
+        retry = self.client.post('/api/orders', HTTP_IDEMPOTENCY_KEY='checkout-1')
+        self.assertEqual(first.status_code, 201)
+        self.assertEqual(retry.status_code, 201)
+        self.assertEqual(json.loads(retry.content), json.loads(first.content))
+        self.assertEqual(Order.objects.count(), 1)
+
+        # Same key, different request
+        response = self.client.post('/api/orders', {'tip': '5'}, HTTP_IDEMPOTENCY_KEY='checkout-1')
+        self.assertEqual(response.status_code, 422)
+
+    @override_settings(IDEMPOTENCY={'WAIT_SECONDS': 0.2})
+    def test_in_flight_duplicate_waits_and_expired_keys_are_purged(self):
+        from .idempotency import purge_expired_keys
+        record = IdempotencyKey.objects.create(user=self.customer, key='batch-1', fingerprint='x' * 64,
+                                               expires_at=timezone.now() + datetime.timedelta(minutes=1))
+        body = {'items': [{'menuitem_id': self.steak.id}]}
+        with mock.patch('rest_api.idempotency._fingerprint', return_value='x' * 64):
+            response = self.client.post('/api/cart/menu-items/batch', body, format='json', HTTP_IDEMPOTENCY_KEY='batch-1')
+            self.assertEqual(response.status_code, 409)
+
+            def finish(seconds):
+                IdempotencyKey.objects.filter(pk=record.pk).update(status_code=200, response_body={'message': 'Cart updated'})
+            with mock.patch('rest_api.idempotency.time.sleep', side_effect=finish):
+                response = self.client.post('/api/cart/menu-items/batch', body, format='json', HTTP_IDEMPOTENCY_KEY='batch-1')
+            self.assertEqual((response.status_code, response.data), (200, {'message': 'Cart updated'}))
+        self.assertFalse(Cart.objects.exists())
+
+        IdempotencyKey.objects.filter(pk=record.pk).update(expires_at=timezone.now() - datetime.timedelta(seconds=1))
+        self.assertEqual(purge_expired_keys(force=True), 1)
+
+    def test_claim_of_a_dead_worker_is_taken_over_after_its_lease(self):
+        body = {'menuitem_id': self.steak.id}
+        with mock.patch('rest_api.idempotency._fingerprint', return_value='x' * 64):
+            # Claimed by a request whose worker died, its lease has run out
+            stale = IdempotencyKey.objects.create(user=self.customer, key='cart-9', fingerprint='x' * 64,
+                                                  expires_at=timezone.now() - datetime.timedelta(seconds=1))
+            response = self.client.post('/api/cart/menu-items', body, HTTP_IDEMPOTENCY_KEY='cart-9')
+            self.assertEqual(response.status_code, 201)
+            self.assertFalse(IdempotencyKey.objects.filter(pk=stale.pk).exists())
+
+            # The stored response is kept for the full TTL, not the lease
+            record = IdempotencyKey.objects.get(key='cart-9')
+            self.assertEqual(record.status_code, 201)
+            self.assertGreater(record.expires_at, timezone.now() + datetime.timedelta(hours=23))
+            retry = self.client.post('/api/cart/menu-items', body, HTTP_IDEMPOTENCY_KEY='cart-9')
+            self.assertEqual(retry['Idempotent-Replayed'], 'true')
+        self.assertEqual(Cart.objects.get(user=self.customer).quantity, 1)
+
+
+class BalanceLedgerTests(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.customer = User.objects.create_user(username='customer', password='pass')
+        post_entries([BalanceEntry(user=self.customer, kind=BalanceEntry.OPENING, bonus=Decimal('5.00'))])
+        self.crew = User.objects.create_user(username='crew', password='pass')
+        self.crew.groups.add(Group.objects.create(name='Delivery Crew'))
+        self.manager = User.objects.create_user(username='manager', password='pass')
+        self.manager.groups.add(Group.objects.create(name='Manager'))
+        category = Category.objects.create(slug='mains', title='Mains')
+        steak = MenuItem.objects.create(title='Steak', price=Decimal('20.00'), featured=False, category=category)
+        Cart.objects.create(user=self.customer, menuitem=steak, quantity=3, unit_price=steak.price, price=Decimal('60.00'))
+
+    def test_checkout_and_tip_transfer_are_ledger_entries(self):
+        self.client.force_authenticate(self.customer)
+        order_id = self.client.post('/api/orders', {'bonus_used': '5.00', 'tip': '3.00'}).data['id']
+        self.client.force_authenticate(self.manager)
+        self.client.patch(f'/api/orders/{order_id}', {'status': 'READY', 'delivery_crew': self.crew.id})
+        # A second update has nothing left to transfer
+        self.client.patch(f'/api/orders/{order_id}', {'status': 'DELIVERED'})
+
+        self.assertEqual(list(BalanceEntry.objects.filter(order_id=order_id).order_by('id')
+                              .values_list('user__username', 'kind', 'bonus', 'tip')), [
+            ('customer', 'BONUS_EARNED', Decimal('1.10'), Decimal('0.00')),
+            ('customer', 'BONUS_REDEEMED', Decimal('-5.00'), Decimal('0.00')),
+            ('customer', 'TIP_ADDED', Decimal('0.00'), Decimal('3.00')),
+            ('customer', 'TIP_SENT', Decimal('0.00'), Decimal('-3.00')),
+            ('crew', 'TIP_RECEIVED', Decimal('0.00'), Decimal('3.00')),
+        ])
+        self.customer.refresh_from_db()
+        self.crew.refresh_from_db()
+        self.assertEqual((self.customer.bonus_earned, self.customer.tip, self.crew.tip),
+                         (Decimal('1.10'), Decimal('0.00'), Decimal('3.00')))
+
+        User.objects.filter(pk=self.crew.pk).update(tip=Decimal('10.00'))
+        out = StringIO()
+        call_command('reconcile_balances', chunk_size=1, stdout=out)
+        self.assertIn('1 users fixed', out.getvalue())
+        self.crew.refresh_from_db()
+        self.assertEqual(self.crew.tip, Decimal('3.00'))
+
+
+class SharedCacheTests(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+
+    def test_increments_from_several_workers_are_never_lost(self):
+        cache.set('counter', 0, timeout=None)
+
+        def bump(_):
+            # Each thread has its own connection to the file, like separate workers
+            return [cache.incr('counter') for _ in range(50)]
+
+        with ThreadPoolExecutor(max_workers=4) as pool:
+            values = [value for values in pool.map(bump, range(4)) for value in values]
+        self.assertEqual(sorted(values), list(range(1, 201)))
+        self.assertEqual(cache.get('counter'), 200)
+        with self.assertRaises(ValueError):
+            cache.incr('missing')
+
+    def test_add_and_expiry(self):
+        self.assertTrue(cache.add('key', {'a': 1}, timeout=None))
+        self.assertFalse(cache.add('key', 'other'))
+        self.assertEqual(cache.get('key'), {'a': 1})
+        cache.set('short', 'value', timeout=0)
+        self.assertIsNone(cache.get('short'))
+        self.assertTrue(cache.add('short', 'again'))
+        self.assertEqual(cache.get('short'), 'again')
+
+
+class SharedThrottleTests(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmpdir)
+        rates = {'anon': '1000/minute', 'user': '1000/minute', 'checkout': '2/hour', 'menu': '3/hour'}
+        overrides = override_settings(THROTTLE_STORE={'PATH': os.path.join(self.tmpdir, 'throttle.sqlite3')},
+                                      REST_FRAMEWORK={**settings.REST_FRAMEWORK, 'DEFAULT_THROTTLE_RATES': rates})
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        self.customer = User.objects.create_user(username='customer', password='pass')
+        category = Category.objects.create(slug='mains', title='Mains')
+        self.steak = MenuItem.objects.create(title='Steak', price=Decimal('20.00'), featured=False, category=category)
+
+    def test_scopes_have_separate_budgets(self):
+        for _ in range(3):
+            self.assertEqual(self.client.get('/api/menu-items').status_code, 200)
+        response = self.client.get(f'/api/menu-items/{self.steak.id}')
+        self.assertEqual(response.status_code, 429)
+        self.assertGreater(int(response['Retry-After']), 0)
+
+        # Checkout counts against its own budget, order reads aren't scoped
+        self.client.force_authenticate(self.customer)
+        self.assertEqual(self.client.get('/api/categories').status_code, 200)
+        for _ in range(2):
+            self.assertEqual(self.client.post('/api/orders').status_code, 400)  # Empty cart
+        self.assertEqual(self.client.post('/api/orders').status_code, 429)
+        self.assertEqual(self.client.get('/api/orders').status_code, 200)
+
+    def test_buckets_are_shared_between_store_instances(self):
+        from .throttling import TokenBucketStore
+        path = os.path.join(self.tmpdir, 'throttle.sqlite3')
+        first, second = TokenBucketStore(path), TokenBucketStore(path)
+        self.assertEqual(first.take('client', 2, 60), (True, None))
+        self.assertEqual(second.take('client', 2, 60), (True, None))
+        allowed, wait = first.take('client', 2, 60)
+        self.assertFalse(allowed)
+        self.assertAlmostEqual(wait, 30, delta=1)
+
+
+class AsyncReadTests(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.critic = User.objects.create_user(username='critic', password='pass')
+        mains = Category.objects.create(slug='mains', title='Mains')
+        drinks = Category.objects.create(slug='drinks', title='Drinks')
+        self.items = [MenuItem.objects.create(title=f'{name} {i}', price=Decimal(5 + i), featured=i % 2 == 0,
+                                              category=mains if name == 'Steak' else drinks)
+                      for i in range(8) for name in ('Steak', 'Tea')]
+        for rating in range(1, 6):
+            Review.objects.create(user=self.critic, menu_item=self.items[0], rating=rating)
+        self.factory = AsyncRequestFactory()
+
+    def read_async(self, view_class, path, data=None, **kwargs):
+        cache.clear()  # Read from the database, not the page the sync request cached
+        request = self.factory.get(path, data or {})
+        return async_to_sync(view_class.as_async_view())(request, **kwargs).render()
+
+    def test_async_reads_match_sync_views(self):
+        item = self.items[0]
+        cases = [
+            (CategoriesView, '/api/categories', {}, {}),
+            (MenuItemsView, '/api/menu-items', {'category': item.category_id, 'price_min': 6, 'ordering': '-price'}, {}),
+            (MenuItemsView, '/api/menu-items', {'search': 'ste', 'page': 2}, {}),
+            (MenuItemsView, '/api/menu-items', {'pagination': 'cursor', 'featured': 'true'}, {}),
+            (MenuItemsView, '/api/menu-items', {'page': 9}, {}),
+            (SingleMenuItemView, f'/api/menu-items/{item.id}', {}, {'pk': item.id}),
+            (SingleMenuItemView, '/api/menu-items/0', {}, {'pk': 0}),
+            (ReviewListCreateView, f'/api/menu-items/{item.id}/reviews', {'pagination': 'cursor', 'page_size': 2},
+             {'menu_item_id': item.id}),
+        ]
+        for view_class, path, data, kwargs in cases:
+            with self.subTest(path=path, data=data):
+                cache.clear()
+                expected = self.client.get(path, data)
+                response = self.read_async(view_class, path, data, **kwargs)
+                self.assertEqual(response.status_code, expected.status_code)
+                self.assertEqual(json.loads(response.content), json.loads(expected.content))
+
+        # Following the cursor gives the same next page too
+        response = self.read_async(MenuItemsView, '/api/menu-items', {'pagination': 'cursor'})
+        cursor = json.loads(response.content)['next'].split('cursor=')[1]
+        expected = self.client.get('/api/menu-items', {'cursor': cursor})
+        response = self.read_async(MenuItemsView, '/api/menu-items', {'cursor': cursor})
+        self.assertEqual(json.loads(response.content), json.loads(expected.content))
+
+    def test_writes_and_authenticated_reads_use_the_sync_view(self):
+        token = Token.objects.create(user=self.critic)
+        request = self.factory.get('/api/categories', headers={'Authorization': f'Token {token.key}'})
+        self.assertFalse(CategoriesView.reads_async(request))
+        self.assertTrue(CategoriesView.reads_async(self.factory.get('/api/categories')))
+
+        view = async_to_sync(CategoriesView.as_async_view())
+        self.assertEqual(view(request).status_code, 200)
+        response = view(self.factory.post('/api/categories', {'slug': 'desserts', 'title': 'Desserts'}))
+        self.assertEqual(response.status_code, 401)
+        response = view(self.factory.post('/api/categories', {'slug': 'desserts', 'title': 'Desserts'},
+                                          headers={'Authorization': f'Token {token.key}'}))
+        self.assertEqual(response.status_code, 201)
+        self.assertTrue(Category.objects.filter(slug='desserts').exists())
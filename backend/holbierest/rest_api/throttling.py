@@ -0,0 +1,132 @@
+import sqlite3
+import threading
+import time
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from rest_framework import throttling
+from rest_framework.settings import api_settings
+
+_store = {'path': None, 'instance': None}
+_store_lock = threading.Lock()
+
+# One statement takes a token or reports the bucket empty. SET expressions all see the row
+# as it was before the update, so "allowed" and "tokens" are computed from the same refill.
+TAKE = '''
+INSERT INTO buckets (key, tokens, updated, expires, allowed) VALUES (:key, :capacity - 1, :now, :now + :period, 1)
+ON CONFLICT (key) DO UPDATE SET
+    tokens = MIN(:capacity, tokens + (:now - updated) * :rate) - (MIN(:capacity, tokens + (:now - updated) * :rate) >= 1),
+    allowed = MIN(:capacity, tokens + (:now - updated) * :rate) >= 1,
+    updated = :now,
+    expires = :now + :period
+RETURNING allowed, tokens
+'''
+
+
+class TokenBucketStore:
+    """
+    Token buckets for the throttles in a SQLite file, so every worker on the
+    host draws from the same budget. A bucket is one small row: its tokens
+    and when they were last topped up. Rows of clients that have been idle
+    long enough to refill completely are deleted now and then.
+    """
+
+    def __init__(self, path, purge_interval=60):
+        self.path = str(path)
+        self.purge_interval = purge_interval
+        self._local = threading.local()
+        self._purged = time.time()
+
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            connection.execute('PRAGMA journal_mode=WAL')
+            # Losing the last few counter updates in a power cut is fine
+            connection.execute('PRAGMA synchronous=OFF')
+            connection.execute('CREATE TABLE IF NOT EXISTS buckets (key TEXT PRIMARY KEY, tokens REAL NOT NULL, '
+                               'updated REAL NOT NULL, expires REAL NOT NULL, allowed INTEGER NOT NULL) WITHOUT ROWID')
+            self._local.connection = connection
+        return connection
+
+    def take(self, key, capacity, period):
+        """
+        Takes a token from key's bucket, which holds capacity tokens and
+        refills completely in period seconds. Returns (allowed, seconds until
+        the next token if not).
+        """
+        connection = self._connection()
+        now = time.time()
+        rate = capacity / period
+        allowed, tokens = connection.execute(TAKE, {
+            'key': key, 'capacity': capacity, 'period': period, 'rate': rate, 'now': now,
+        }).fetchone()
+        if now - self._purged > self.purge_interval:
+            self._purged = now
+            connection.execute('DELETE FROM buckets WHERE expires < ?', (now,))
+        return bool(allowed), None if allowed else (1 - tokens) / rate
+
+
+def get_store():
+    path = getattr(settings, 'THROTTLE_STORE', {}).get('PATH')
+    if not path:
+        raise ImproperlyConfigured('THROTTLE_STORE["PATH"] must point to the file the throttles share.')
+    with _store_lock:
+        if _store['path'] != path:
+            _store['instance'] = TokenBucketStore(path)
+            _store['path'] = path
+        return _store['instance']
+
+
+class SharedThrottleMixin:
+    """
+    Keeps DRF's rate strings, scopes and client keys but counts requests in
+    the shared token buckets instead of a list of timestamps in the cache.
+    A "100/minute" rate allows bursts of 100 and refills at 100 per minute.
+    """
+
+    def get_rate(self):
+        # Read when checked rather than at import, so changed settings apply
+        try:
+            return api_settings.DEFAULT_THROTTLE_RATES[self.scope]
+        except KeyError:
+            raise ImproperlyConfigured(f"No default throttle rate set for '{self.scope}' scope")
+
+    def allow_request(self, request, view):
+        if self.rate is None:
+            return True
+        key = self.get_cache_key(request, view)
+        if key is None:
+            return True
+        allowed, self._wait = get_store().take(key, self.num_requests, self.duration)
+        return allowed
+
+    def wait(self):
+        return self._wait
+
+
+class SharedAnonRateThrottle(SharedThrottleMixin, throttling.AnonRateThrottle):
+    pass
+
+
+class SharedUserRateThrottle(SharedThrottleMixin, throttling.UserRateThrottle):
+    pass
+
+
+class SharedScopedRateThrottle(SharedThrottleMixin, throttling.ScopedRateThrottle):
+    """
+    A separate budget per view scope. throttle_scope is a scope name, or a
+    {method: scope} dict when only some methods of a view share a budget
+    (e.g. checkout is POST on the order list).
+    """
+
+    def allow_request(self, request, view):
+        scope = getattr(view, self.scope_attr, None)
+        if isinstance(scope, dict):
+            scope = scope.get(request.method)
+        if not scope:
+            return True
+        self.scope = scope
+        self.rate = self.get_rate()
+        self.num_requests, self.duration = self.parse_rate(self.rate)
+        return super().allow_request(request, view)
@@ -1,18 +1,46 @@
+import csv
+import logging
+from collections import Counter
+from datetime import timedelta
 from decimal import ROUND_HALF_UP, Decimal
 from rest_framework import generics
 from rest_framework.permissions import IsAuthenticated
-from .models import Category, MenuItem, Cart, Order, OrderItem, Reservation, Review, SiteSettings
+from .models import ArchivedOrder, Category, MenuItem, Cart, Order, OrderItem, Reservation, Review
 from .permissions import IsManagerMemberOrAdmin
 from django_filters.rest_framework import DjangoFilterBackend
-from rest_framework.filters import SearchFilter, OrderingFilter
-from rest_framework.pagination import PageNumberPagination
+from rest_framework.filters import OrderingFilter
+from .paginations import KeysetPagination
 from .filters import MenuItemFilter
+from .search import MenuItemSearchFilter
+from .analytics import record_order, sales_report
+from .archive import ARCHIVED_PREFETCH, order_history
+from .cart import add_many_to_cart, add_to_cart
+from .dispatch import dispatch_backlog, dispatcher
+from .events import get_broker, publish_order_event, stream
+from .reservations import SlotUnavailable, availability as slot_availability, book as book_slot, release as release_slot
+from .async_reads import AsyncReadMixin
+from .catalog import CatalogCacheMixin
+from .idempotency import idempotent
+from .ledger import record_checkout, transfer_tip
+from .money import cents
+from .catalog_io import FORMATS, aexport_catalog, detect_format, export_catalog, import_catalog, text_stream
+from .roles import is_customer, is_delivery_crew, is_manager
+from .sitesettings import get_site_settings
 from .serializers import CategorySerializer, MenuItemSerializer, CartSerializer, OrderSerializer, CustomUserSerializer, ReservationSerializer, ReviewSerializer
 from rest_framework.response import Response
+from rest_framework.exceptions import ValidationError
+from rest_framework.authtoken.models import Token
 
 from rest_framework.permissions import IsAdminUser
 from django.shortcuts import  get_object_or_404
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.http import JsonResponse, StreamingHttpResponse
 from django.utils import timezone
+from django.utils.dateparse import parse_date
+from django.db import transaction
+from django.db.models import Count, Prefetch, Sum, prefetch_related_objects
 
 from django.contrib.auth.models import Group
 from django.contrib.auth import get_user_model
@@ -23,10 +51,19 @@ from rest_framework import status
 # Get the custom user model
 User = get_user_model()
 
+logger = logging.getLogger(__name__)
 
-class CategoriesView(generics.ListCreateAPIView):
+# Related objects OrderSerializer walks for every order: the user's groups and each line's menu item
+ORDER_PREFETCH = (
+    'user__groups',
+    Prefetch('order', queryset=OrderItem.objects.select_related('menuitem')),
+)
+
+
+class CategoriesView(CatalogCacheMixin, AsyncReadMixin, generics.ListCreateAPIView):
     queryset = Category.objects.all()
     serializer_class = CategorySerializer
+    throttle_scope = {'GET': 'menu'}
 
     def get_permissions(self):
         permission_classes = []
@@ -35,18 +72,20 @@ class CategoriesView(generics.ListCreateAPIView):
 
         return [permission() for permission in permission_classes]
     
-class MenuItemsView(generics.ListCreateAPIView):
+class MenuItemsView(CatalogCacheMixin, AsyncReadMixin, generics.ListCreateAPIView):
     queryset = MenuItem.objects.all()
     serializer_class = MenuItemSerializer
-    pagination_class = PageNumberPagination  # Uses the global PAGE_SIZE
+    throttle_scope = {'GET': 'menu'}
+    pagination_class = KeysetPagination  # Uses the global PAGE_SIZE
+    keyset_ordering = ('category_id', 'price', 'id')
     filter_backends = [
         DjangoFilterBackend,
-        SearchFilter,
+        MenuItemSearchFilter,
         OrderingFilter
     ]
-    search_fields = ['title', 'category__title']  # Search by these fields
+    search_fields = ['title', 'category__title']  # Fallback when the FTS index is not available
     filterset_class = MenuItemFilter  # Custom filter for price range and category
-    ordering_fields = ['price']  # Enables ordering by price
+    ordering_fields = ['price', 'rating_average']  # Enables ordering by price and rating
 
     def get_permissions(self):
         permission_classes = []
@@ -56,9 +95,10 @@ class MenuItemsView(generics.ListCreateAPIView):
         return [permission() for permission in permission_classes]
 
 
-class SingleMenuItemView(generics.RetrieveUpdateDestroyAPIView):
+class SingleMenuItemView(AsyncReadMixin, generics.RetrieveUpdateDestroyAPIView):
     queryset = MenuItem.objects.all()
     serializer_class = MenuItemSerializer
+    throttle_scope = {'GET': 'menu'}
 
     def get_permissions(self):
         permission_classes = []
@@ -67,26 +107,59 @@ class SingleMenuItemView(generics.RetrieveUpdateDestroyAPIView):
 
         return [permission() for permission in permission_classes]
 
+
+class MenuImportView(generics.GenericAPIView):
+    """
+    Upserts categories and menu items from an uploaded CSV or JSON lines file
+    (multipart field "file"), in the columns /menu-items/export produces.
+    """
+    permission_classes = [IsAuthenticated, IsManagerMemberOrAdmin]
+    batch_size = 500
+
+    def post(self, request):
+        upload = request.FILES.get('file')
+        if upload is None:
+            return Response({"message": "Upload the catalog as the file field."}, status=status.HTTP_400_BAD_REQUEST)
+        file_format = request.query_params.get('file_format') or detect_format(upload.name)
+        if file_format not in FORMATS:
+            return Response({"message": "file_format must be csv or jsonl."}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            result = import_catalog(text_stream(upload), file_format, batch_size=self.batch_size)
+        except (UnicodeDecodeError, csv.Error):
+            return Response({"message": "The file is not valid UTF-8 CSV or JSON lines."}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(result)
+
+
+class MenuExportView(generics.GenericAPIView):
+    permission_classes = [IsAuthenticated, IsManagerMemberOrAdmin]
+
+    def get(self, request):
+        file_format = request.query_params.get('file_format', 'csv')
+        if file_format not in FORMATS:
+            return Response({"message": "file_format must be csv or jsonl."}, status=status.HTTP_400_BAD_REQUEST)
+        content_type = 'text/csv' if file_format == 'csv' else 'application/x-ndjson'
+        # Under ASGI the response is sent from the event loop, which only streams async iterators
+        rows = aexport_catalog(file_format) if isinstance(request._request, ASGIRequest) else export_catalog(file_format)
+        response = StreamingHttpResponse(rows, content_type=f'{content_type}; charset=utf-8')
+        response['Content-Disposition'] = f'attachment; filename="menu.{file_format}"'
+        return response
+
+
 class CartView(generics.ListCreateAPIView):
-    queryset = Cart.objects.all()
+    queryset = Cart.objects.select_related('menuitem')
     serializer_class = CartSerializer
     permission_classes = [IsAuthenticated]
 
     def get_queryset(self):
-        return Cart.objects.all().filter(user=self.request.user)
+        return super().get_queryset().filter(user=self.request.user)
 
+    @idempotent
     def post(self, request, *args, **kwargs):
-        menuitem = get_object_or_404(MenuItem, id=request.data['menuitem_id'])
+        menuitem = get_object_or_404(MenuItem.objects.only('id', 'price'), id=request.data['menuitem_id'])
         # Set quantity to 1 if not provided in the request
         quantity = int(request.data.get('quantity', 1))
-        cart_item, created = Cart.objects.get_or_create(
-            user=self.request.user, menuitem=menuitem,
-            defaults={'quantity': quantity, 'unit_price': menuitem.price, 'price': menuitem.price * quantity}
-        )
+        created = add_to_cart(self.request.user, menuitem, quantity)
         if not created:
-            cart_item.quantity += quantity
-            cart_item.price = cart_item.quantity * cart_item.unit_price
-            cart_item.save()
             return Response({'message': 'Item already exists, quantity updated'}, status.HTTP_200_OK)
 
         return Response({'message': "Item added to Cart!"}, status.HTTP_201_CREATED)
@@ -96,7 +169,36 @@ class CartView(generics.ListCreateAPIView):
         Cart.objects.all().filter(user=self.request.user).delete()
         return Response("ok")
     
-    # New method to handle PUT requests for updating quantity
+
+class CartBatchView(generics.GenericAPIView):
+    permission_classes = [IsAuthenticated]
+
+    @idempotent
+    def post(self, request, *args, **kwargs):
+        # Body: {"items": [{"menuitem_id": 1, "quantity": 2}, ...]}, applied all or nothing
+        items = request.data.get('items')
+        if not isinstance(items, list) or not items:
+            return Response({'message': 'items must be a non-empty list'}, status.HTTP_400_BAD_REQUEST)
+
+        quantities = Counter()
+        try:
+            for item in items:
+                quantity = int(item.get('quantity', 1))
+                if quantity < 1:
+                    raise ValueError
+                quantities[int(item['menuitem_id'])] += quantity
+        except (AttributeError, KeyError, TypeError, ValueError):
+            return Response({'message': 'Each item needs a menuitem_id and a positive quantity'},
+                            status.HTTP_400_BAD_REQUEST)
+
+        try:
+            created, updated = add_many_to_cart(self.request.user, quantities)
+        except MenuItem.DoesNotExist as e:
+            return Response({'message': str(e)}, status.HTTP_404_NOT_FOUND)
+        return Response({'message': 'Cart updated', 'created': created, 'updated': updated}, status.HTTP_200_OK)
+
+
+# New method to handle PUT requests for updating quantity
 class SingleCartItemView(generics.RetrieveUpdateDestroyAPIView):
     queryset = Cart.objects.all()
     serializer_class = CartSerializer
@@ -132,123 +234,130 @@ class SingleCartItemView(generics.RetrieveUpdateDestroyAPIView):
 
 
 class OrderView(generics.ListCreateAPIView):
-    queryset = Order.objects.all()
+    queryset = Order.objects.select_related('user').prefetch_related(*ORDER_PREFETCH)
     serializer_class = OrderSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = KeysetPagination
+    keyset_ordering = ('-date', '-id')
+    throttle_scope = {'POST': 'checkout'}
 
     def get_queryset(self):
+        return self.visible_orders(super().get_queryset())
+
+    def visible_orders(self, orders):
         if self.request.user.is_superuser:
-            return Order.objects.all()
-        elif self.request.user.groups.count() == 0:  # Normal customer - no group
-            return Order.objects.filter(user=self.request.user)
-        elif self.request.user.groups.filter(name='Delivery Crew').exists():  # Delivery crew
-            return Order.objects.filter(delivery_crew=self.request.user)  # Show orders assigned to them
+            return orders
+        elif is_customer(self.request.user):  # Normal customer - no group
+            return orders.filter(user=self.request.user)
+        elif is_delivery_crew(self.request.user):  # Delivery crew
+            return orders.filter(delivery_crew=self.request.user)  # Show orders assigned to them
         else:  # Other roles, e.g., managers
-            return Order.objects.all()
+            return orders
+
+    def filter_queryset(self, queryset):
+        # ?date_from=&date_to= (YYYY-MM-DD, inclusive) also reach into archived orders when the range needs them
+        queryset = super().filter_queryset(queryset)
+        dates = {}
+        for name in ('date_from', 'date_to'):
+            value = self.request.query_params.get(name)
+            try:
+                dates[name] = parse_date(value) if value else None
+            except ValueError:
+                dates[name] = None
+            if value and dates[name] is None:
+                raise ValidationError({name: ['Enter a valid YYYY-MM-DD date.']})
+        date_from, date_to = dates['date_from'], dates['date_to']
+        if date_from is None and date_to is None:
+            return queryset
+        archived = self.visible_orders(ArchivedOrder.objects.select_related('user').prefetch_related(*ARCHIVED_PREFETCH))
+        return order_history(queryset, archived, date_from, date_to)
 
     def get_bonus_percentage(self):
-        # Retrieve or create the SiteSettings instance
-        settings, created = SiteSettings.objects.get_or_create(id=1, defaults={'bonus_percentage': Decimal('2.0')})
+        settings = get_site_settings()
         return settings.bonus_percentage / Decimal('100')  # Convert to decimal percentage
 
+    @idempotent
     def create(self, request, *args, **kwargs):
-        # Ensure the cart has items
-        menuitem_count = Cart.objects.filter(user=self.request.user).count()
-        if menuitem_count == 0:
-            return Response({"message": "No items in cart"}, status=status.HTTP_400_BAD_REQUEST)
-
-        data = request.data.copy()
-        total = self.get_total_price(self.request.user)  # Get total price from the cart        
-        data['total'] = total
-        data['user'] = self.request.user.id
-        data['date'] = timezone.now()  # Set the current date and time
-
         # Optional tip provided by the user
         tip = Decimal(request.data.get('tip', Decimal('0.0')))
-        
+
         # Check if the user wants to use bonus
         bonus_used = Decimal(request.data.get('bonus_used', '0.0')).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
-        bonus_available = self.request.user.bonus_earned.quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
-
-        # Ensure bonus used is not more than the available bonus
-        if bonus_used > bonus_available:
-            print(f"Bonus used: {bonus_used}, Bonus available: {bonus_available}")
-            return Response({"message": "Insufficient bonus balance."}, status=status.HTTP_400_BAD_REQUEST)
-
-        # Apply the bonus to the total price
-        total_after_bonus = total - bonus_used       
-        if total_after_bonus < 0:
-            total_after_bonus = Decimal('0.0')  # If bonus exceeds total, set total to 0
-            bonus_used = total
-        
-        data['total_after_bonus'] = total_after_bonus  # Send the total after applying bonus
-
-        order_serializer = OrderSerializer(data=data, context={'request': request})
 
-        if order_serializer.is_valid():
+        with transaction.atomic():
+            # Lock the user row and the cart so concurrent checkouts of one user run one after another
+            user = User.objects.select_for_update().get(pk=self.request.user.pk)
+            cart = Cart.objects.filter(user=user)
+            totals = cart.aggregate(count=Count('id'), total=Sum('price'))
+
+            # Ensure the cart has items
+            if totals['count'] == 0:
+                return Response({"message": "No items in cart"}, status=status.HTTP_400_BAD_REQUEST)
+            total = cents(totals['total'])
+            items = list(cart.select_for_update().values_list('menuitem_id', 'quantity', 'price'))
+
+            # Ensure bonus used is not more than the available bonus
+            bonus_available = user.bonus_earned.quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+            if bonus_used > bonus_available:
+                logger.info('User %s: bonus used %s exceeds available %s', user.pk, bonus_used, bonus_available)
+                return Response({"message": "Insufficient bonus balance."}, status=status.HTTP_400_BAD_REQUEST)
+
+            # Apply the bonus to the total price
+            total_after_bonus = total - bonus_used
+            if total_after_bonus < 0:
+                total_after_bonus = Decimal('0.0')  # If bonus exceeds total, set total to 0
+                bonus_used = total
+
+            data = request.data.copy()
+            data['total'] = total
+            data['user'] = user.id
+            data['date'] = timezone.now()  # Set the current date and time
+            data['total_after_bonus'] = total_after_bonus  # Send the total after applying bonus
+
+            order_serializer = OrderSerializer(data=data, context={'request': request})
+            if not order_serializer.is_valid():
+                return Response(order_serializer.errors, status=status.HTTP_400_BAD_REQUEST)
             order = order_serializer.save()
 
-            # Process items from the cart and save them to the OrderItem model
-            items = Cart.objects.filter(user=self.request.user)
-            for item in items:
-                OrderItem.objects.create(
-                    order=order,
-                    menuitem=item.menuitem,
-                    price=item.price,
-                    quantity=item.quantity
-                )
-
-            # Clear the cart after the order is created
-            items.delete()
-
-            # Calculate and apply bonus for the user
-            bonus_percentage = self.get_bonus_percentage()  # Retrieve bonus percentage
-            bonus = total_after_bonus * bonus_percentage
-            self.request.user.bonus_earned += bonus
-            
-            # Deduct the bonus from the user's bonus_earned balance
-            self.request.user.bonus_earned -= bonus_used
-            
-            self.request.user.save()
-
-            # Store the customer's tip in the user's profile
-            if tip > Decimal('0.0'):
-                self.request.user.tip += tip
-                self.request.user.save()
-
-            # Include updated bonus in response
-            result = order_serializer.data
-            result['total'] = total           
-            result['bonus_used'] = bonus_used
-            result['bonus_earned'] = self.request.user.bonus_earned  # Send updated bonus to client
-            result['total_after_bonus'] = total_after_bonus  # Include total after bonus in the response
-            result['tip'] = tip  # Send the tip (stored in the customer's field)
-            return Response(result, status=status.HTTP_201_CREATED)
-
-        # If the serializer is not valid, return the error response
-        return Response(order_serializer.errors, status=status.HTTP_400_BAD_REQUEST)
-
-    def get_total_price(self, user):
-        total = Decimal('0.0')  # Use Decimal for currency calculations
-        items = Cart.objects.filter(user=user)
-        
-        for item in items:            
-            total += item.price        
-        return Decimal(total)
+            # Move the cart into the order with a single insert, then clear the cart
+            OrderItem.objects.bulk_create([
+                OrderItem(order=order, menuitem_id=menuitem_id, quantity=quantity, price=price)
+                for menuitem_id, quantity, price in items
+            ])
+            cart.delete()
+            record_order(order.date, total, items)
+            prefetch_related_objects([order], *ORDER_PREFETCH)
+
+            # Earn the bonus on what was paid, spend the bonus used and keep the tip, as ledger entries
+            bonus = total_after_bonus * self.get_bonus_percentage()
+            record_checkout(user.pk, order.id, bonus, bonus_used, max(tip, Decimal('0.0')))
+            publish_order_event('order.created', order.id, order.user_id, order.status, order.delivery_crew_id)
+
+        self.request.user.refresh_from_db(fields=['bonus_earned', 'tip'])
+
+        # Include updated bonus in response
+        result = order_serializer.data
+        result['total'] = total
+        result['bonus_used'] = bonus_used
+        result['bonus_earned'] = self.request.user.bonus_earned  # Send updated bonus to client
+        result['total_after_bonus'] = total_after_bonus  # Include total after bonus in the response
+        result['tip'] = tip  # Send the tip (stored in the customer's field)
+        return Response(result, status=status.HTTP_201_CREATED)
 
 
 class SingleOrderView(generics.RetrieveUpdateAPIView):
-    queryset = Order.objects.all()
+    queryset = Order.objects.select_related('user').prefetch_related(*ORDER_PREFETCH)
     serializer_class = OrderSerializer
     permission_classes = [IsAuthenticated]
 
     def update(self, request, *args, **kwargs):
         # Check if the user belongs to a group or is a superuser
-        if self.request.user.groups.count() == 0 and not self.request.user.is_superuser:
+        if is_customer(self.request.user) and not self.request.user.is_superuser:
             return Response({'error': 'Not authorized to update order.'}, status=status.HTTP_403_FORBIDDEN)
 
         # Retrieve the order instance
         order = self.get_object()
+        previous = {'status': order.status, 'delivery_crew': order.delivery_crew_id}
 
         # Assign delivery crew if provided
         delivery_crew_id = request.data.get('delivery_crew')
@@ -266,30 +375,127 @@ class SingleOrderView(generics.RetrieveUpdateAPIView):
             # Update the status
             order.status = new_status
 
-        # Trigger tip transfer if conditions are met
-        if new_status in ['READY', 'DELIVERED']:
-            if order.delivery_crew:  # Ensure a delivery crew is assigned
-                if order.user.tip > Decimal('0.0'):  # Check if customer has a tip
-                    # Transfer the tip
-                    order.delivery_crew.tip += order.user.tip
-                    order.user.tip = Decimal('0.0')  # Reset the customer's tip
-                    order.user.save()
-                    order.delivery_crew.save()
+        # Ready orders nobody was assigned to go to the least busy delivery crew member
+        if new_status == 'READY' and order.delivery_crew_id is None:
+            order.delivery_crew_id = dispatcher.least_loaded()
+
+        # Save the updated order, cancelling takes it out of the sales rollups (and un-cancelling back in)
+        with transaction.atomic():
+            order.save()
+            # Trigger tip transfer if conditions are met
+            if new_status in ['READY', 'DELIVERED']:
+                if order.delivery_crew_id:  # Ensure a delivery crew is assigned
+                    # Moves the customer's tip to the crew member through the ledger
+                    if not transfer_tip(order.id, order.user_id, order.delivery_crew_id):
+                        # Log or handle the case where no tip exists
+                        logger.info('Order %s has no tip to transfer.', order.id)
                 else:
-                    # Log or handle the case where no tip exists
-                    print(f"Order {order.id} has no tip to transfer.")
-            else:
-                # Log or handle the case where no delivery crew is assigned
-                print(f"Order {order.id} has no delivery crew assigned for tip transfer.")
-
-        # Save the updated order
-        order.save()
+                    # Log or handle the case where no delivery crew is assigned
+                    logger.warning('Order %s has no delivery crew assigned for tip transfer.', order.id)
+            if (previous['status'] == 'CANCELLED') != (order.status == 'CANCELLED'):
+                record_order(order.date, order.total,
+                             [(item.menuitem_id, item.quantity, item.price) for item in order.order.all()],
+                             sign=-1 if order.status == 'CANCELLED' else 1)
+        if (order.status, order.delivery_crew_id) != (previous['status'], previous['delivery_crew']):
+            publish_order_event('order.updated', order.id, order.user_id, order.status,
+                                order.delivery_crew_id, previous=previous)
 
         # Serialize and return the updated order
         serializer = self.get_serializer(order)
         return Response(serializer.data, status=status.HTTP_200_OK)
 
 
+class OrderDispatchView(generics.GenericAPIView):
+    permission_classes = [IsAuthenticated, IsManagerMemberOrAdmin]
+
+    def post(self, request):
+        # Assign the backlog of READY orders without delivery crew, optionally only the oldest `limit`
+        limit = request.data.get('limit')
+        try:
+            limit = int(limit) if limit not in (None, '') else None
+        except (TypeError, ValueError):
+            limit = 0
+        if limit is not None and limit < 1:
+            return Response({"message": "limit must be a positive integer."}, status=status.HTTP_400_BAD_REQUEST)
+
+        assignments = dispatch_backlog(limit)
+        return Response({
+            'assigned': len(assignments),
+            'orders': [{'id': order_id, 'delivery_crew': crew_id} for order_id, crew_id in assignments],
+        }, status=status.HTTP_200_OK)
+
+
+def query_date(request, name):
+    """The YYYY-MM-DD query parameter as a date, None if it's absent or empty. Raises ValueError if malformed."""
+    value = request.query_params.get(name)
+    if not value:
+        return None
+    parsed = parse_date(value)
+    if parsed is None:
+        raise ValueError(f'{name} is not a YYYY-MM-DD date')
+    return parsed
+
+
+class SalesAnalyticsView(generics.GenericAPIView):
+    permission_classes = [IsAuthenticated, IsManagerMemberOrAdmin]
+    # Longest date range per report, in days
+    max_days = {'day': 92, 'week': 371, 'month': 1096}
+
+    def get(self, request):
+        period = request.query_params.get('period', 'day')
+        if period not in self.max_days:
+            return Response({"message": "period must be one of day, week or month."}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            date_to = query_date(request, 'date_to') or timezone.localdate()
+            date_from = query_date(request, 'date_from') or date_to - timedelta(days=29)
+            top = int(request.query_params.get('top', 5))
+        except ValueError:
+            return Response({"message": "Dates must be valid YYYY-MM-DD values and top a number."},
+                            status=status.HTTP_400_BAD_REQUEST)
+        if date_to < date_from or (date_to - date_from).days >= self.max_days[period]:
+            return Response({"message": f"date_to must be on or after date_from, at most {self.max_days[period]} days apart."},
+                            status=status.HTTP_400_BAD_REQUEST)
+        return Response(sales_report(period, date_from, date_to, top=min(max(top, 1), 50)))
+
+
+async def order_events(request):
+    """
+    Server-sent events for order status and delivery crew changes, instead of
+    polling /api/orders. Authenticates with a token in the Authorization
+    header, or in ?token= since EventSource can't send headers, or the session.
+    Needs an ASGI server to hold the connection open.
+    """
+    if request.method != 'GET':
+        return JsonResponse({'detail': f'Method "{request.method}" not allowed.'}, status=status.HTTP_405_METHOD_NOT_ALLOWED)
+    if not isinstance(request, ASGIRequest):
+        return JsonResponse({'message': 'Order events are only streamed when the app runs under ASGI.'},
+                            status=status.HTTP_501_NOT_IMPLEMENTED)
+
+    key = request.GET.get('token')
+    header = request.headers.get('Authorization', '').split()
+    if len(header) == 2 and header[0].lower() == 'token':
+        key = header[1]
+    if key:
+        token = await Token.objects.select_related('user').filter(key=key, user__is_active=True).afirst()
+        user = token.user if token else None
+    else:
+        user = await request.auser()
+    if user is None or not user.is_authenticated:
+        return JsonResponse({'detail': 'Authentication credentials were not provided.'},
+                            status=status.HTTP_401_UNAUTHORIZED)
+
+    sees_all = user.is_superuser or await sync_to_async(is_manager)(user)
+    last_event_id = request.headers.get('Last-Event-ID') or request.GET.get('last_event_id')
+    last_event_id = int(last_event_id) if last_event_id and last_event_id.isdigit() else None
+    events = get_broker().subscribe(last_event_id)
+    response = StreamingHttpResponse(
+        stream(events, user.pk, sees_all, settings.ORDER_EVENTS.get('KEEPALIVE_SECONDS', 15)),
+        content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
 class GroupViewSet(viewsets.ViewSet):
     permission_classes = [IsAdminUser]
     def list(self, request):
@@ -319,7 +525,7 @@ class DeliveryCrewViewSet(viewsets.ViewSet):
     def create(self, request):
         #only for super admin and managers
         if self.request.user.is_superuser == False:
-            if self.request.user.groups.filter(name='Manager').exists() == False:
+            if is_manager(self.request.user) == False:
                 return Response({"message":"forbidden"}, status.HTTP_403_FORBIDDEN)
         
         user = get_object_or_404(User, username=request.data['username'])
@@ -330,7 +536,7 @@ class DeliveryCrewViewSet(viewsets.ViewSet):
     def destroy(self, request):
         #only for super admin and managers
         if self.request.user.is_superuser == False:
-            if self.request.user.groups.filter(name='Manager').exists() == False:
+            if is_manager(self.request.user) == False:
                 return Response({"message":"forbidden"}, status.HTTP_403_FORBIDDEN)
         user = get_object_or_404(User, username=request.data['username'])
         dc = Group.objects.get(name="Delivery Crew")
@@ -342,6 +548,8 @@ class ReservationListCreateView(generics.ListCreateAPIView):
     queryset = Reservation.objects.all()
     serializer_class = ReservationSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = KeysetPagination
+    keyset_ordering = ('date', 'time', 'id')
 
     #def get_permissions(self):
     #    # Only allow listing all reservations for admin and manager users
@@ -351,7 +559,7 @@ class ReservationListCreateView(generics.ListCreateAPIView):
 
     def get_queryset(self):
         user = self.request.user
-        if user.is_staff or user.groups.filter(name="Manager").exists():
+        if user.is_staff or is_manager(user):
             # Admins and Managers can see all reservations
             return Reservation.objects.all()
         else:
@@ -359,28 +567,66 @@ class ReservationListCreateView(generics.ListCreateAPIView):
             return Reservation.objects.filter(user=user)
 
     def perform_create(self, serializer):
-        # Automatically associate the reservation with the logged-in user
-        serializer.save(user=self.request.user)
+        data = serializer.validated_data
+        try:
+            with transaction.atomic():
+                slot = book_slot(data['date'], data['time'], data['number_of_guests'])
+                # Automatically associate the reservation with the logged-in user
+                serializer.save(user=self.request.user, slot=slot)
+        except SlotUnavailable as e:
+            raise ValidationError({'time': [str(e)]})
 
 
-class ReservationRetrieveUpdateView(generics.RetrieveUpdateAPIView):
+class ReservationRetrieveUpdateView(generics.RetrieveUpdateDestroyAPIView):
     queryset = Reservation.objects.all()
     serializer_class = ReservationSerializer
     permission_classes = [IsAuthenticated, IsManagerMemberOrAdmin]
 
     def get_queryset(self):
         user = self.request.user
-        if user.is_staff or user.groups.filter(name="Manager").exists():
+        if user.is_staff or is_manager(user):
             # Admins and Managers can access any reservation for updating
             return Reservation.objects.all()
         else:
             # Regular users shouldn't reach this view for updating
             return Reservation.objects.none()
 
-
-class ReviewListCreateView(generics.ListCreateAPIView):
-    queryset = Review.objects.all()
+    def perform_update(self, serializer):
+        reservation = serializer.instance
+        data = {field: serializer.validated_data.get(field, getattr(reservation, field))
+                for field in ('date', 'time', 'number_of_guests')}
+        try:
+            with transaction.atomic():
+                # Free the old seats first (as stored, not as loaded), so moving within a full slot still fits
+                release_slot(*Reservation.objects.select_for_update().values_list(
+                    'slot_id', 'number_of_guests').get(pk=reservation.pk))
+                slot = book_slot(data['date'], data['time'], data['number_of_guests'])
+                serializer.save(slot=slot)
+        except SlotUnavailable as e:
+            raise ValidationError({'time': [str(e)]})
+
+
+class ReservationAvailabilityView(generics.GenericAPIView):
+    permission_classes = []
+    max_days = 31
+
+    def get(self, request):
+        try:
+            date_from = query_date(request, 'date_from') or timezone.localdate()
+            date_to = query_date(request, 'date_to') or date_from + timedelta(days=6)
+        except ValueError:
+            return Response({"message": "Dates must be valid YYYY-MM-DD values."}, status=status.HTTP_400_BAD_REQUEST)
+        if date_to < date_from or (date_to - date_from).days >= self.max_days:
+            return Response({"message": f"date_to must be on or after date_from, at most {self.max_days} days apart."},
+                            status=status.HTTP_400_BAD_REQUEST)
+        return Response(slot_availability(date_from, date_to))
+
+
+class ReviewListCreateView(AsyncReadMixin, generics.ListCreateAPIView):
+    queryset = Review.objects.select_related('user').prefetch_related('user__groups')
     serializer_class = ReviewSerializer
+    pagination_class = KeysetPagination
+    keyset_ordering = ('-created_at', '-id')
     
     def get_permissions(self):
         permission_classes = []
@@ -390,7 +636,7 @@ class ReviewListCreateView(generics.ListCreateAPIView):
 
     def get_queryset(self):
         menu_item_id = self.kwargs['menu_item_id']
-        return Review.objects.filter(menu_item_id=menu_item_id)
+        return super().get_queryset().filter(menu_item_id=menu_item_id)
 
     def perform_create(self, serializer):
         serializer.save(user=self.request.user)
\ No newline at end of file